@@ -0,0 +1,117 @@
+"""
+Benchmarks for the client hot paths against the local StubServer. Every scenario is run by a single client thread
+(serial) and by several threads sharing the client (concurrent), reporting throughput and p50/p99 latency, plus the
+p50 of the network and parse stages as seen by the instrumentation hooks.
+
+    python -m benchmarks.bench_client
+    python -m benchmarks.bench_client --scenarios list_campaigns --campaigns 1000 10000 100000 --threads 8
+"""
+import argparse
+import datetime as dt
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pydoctorsender import DoctorSenderClient, MetricsCollector
+from pydoctorsender.instrumentation import LatencyHistogram
+
+from .stub_server import StubServer
+
+
+def run(client: DoctorSenderClient, name: str, call, operations: int, threads: int, method: str) -> dict:
+    """
+    Runs call operations times, spread over threads
+
+    :return: Dict with the scenario results
+    """
+    histogram = LatencyHistogram()
+    metrics = MetricsCollector()
+    client.hooks = [metrics]
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if threads == 1:
+        durations = [timed(i) for i in range(operations)]
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            durations = list(executor.map(timed, range(operations)))
+    elapsed = time.perf_counter() - start
+
+    for duration in durations:
+        histogram.record(duration)
+    return {'scenario': name,
+            'threads': threads,
+            'ops': operations,
+            'ops_per_sec': operations / elapsed,
+            'p50': histogram.percentile(50),
+            'p99': histogram.percentile(99),
+            'network_p50': metrics.histogram(method, 'network').percentile(50),
+            'parse_p50': metrics.histogram(method, 'parse').percentile(50)}
+
+
+def print_result(result: dict):
+    print(f"{result['scenario']:<32} {result['threads']:>3} thr {result['ops']:>6} ops "
+          f"{result['ops_per_sec']:>10.1f} ops/s  p50 {result['p50'] * 1000:>9.2f}ms  "
+          f"p99 {result['p99'] * 1000:>9.2f}ms  (network p50 {result['network_p50'] * 1000:.2f}ms, "
+          f"parse p50 {result['parse_p50'] * 1000:.2f}ms)")
+
+
+def scenarios(server: StubServer, args):
+    """Yields (name, callable, operations, SOAP method) tuples, reconfiguring the stub server for each size"""
+    if 'segment_count' in args.scenarios:
+        yield 'segment_count', lambda client: client.segment_count(123), args.operations, 'dsGetSegmentCount'
+
+    if 'list_campaigns' in args.scenarios:
+        for size in args.campaigns:
+            server.configure(campaigns=size)
+            operations = max(1, args.operations * 1000 // size)
+            yield (f'list_campaigns[{size}]',
+                   lambda client: client.list_campaigns('id > 0', ['name', 'subject'], get_statistics=True),
+                   operations, 'dsCampaignGetAll')
+
+    if 'get_unsubscribers' in args.scenarios:
+        server.configure(unsubscribers=args.unsubscribers)
+        start, end = args.start, args.end
+        yield (f'get_unsubscribers[{args.unsubscribers}]',
+               lambda client: client.get_unsubscribers('example_list', start, end),
+               args.large_operations, 'dsUsersListGetUnsubscribes')
+
+    if 'create_campaign' in args.scenarios:
+        html = '<html><body>' + '<p>Lorem ipsum dolor sit amet</p>' * (args.html_kb * 1024 // 31) + '</body></html>'
+        plain = 'Lorem ipsum dolor sit amet\n' * (args.html_kb * 1024 // 27)
+        yield (f'create_campaign[{args.html_kb}kB]',
+               lambda client: client.create_campaign('name', 'subject', 'Example', 'news@example.com',
+                                                     'reply@example.com', html, plain, template_id=1),
+               max(1, args.operations // 10), 'dsCampaignNew')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DoctorSenderClient against a local stub server')
+    parser.add_argument('--scenarios', nargs='+',
+                        default=['segment_count', 'list_campaigns', 'get_unsubscribers', 'create_campaign'])
+    parser.add_argument('--operations', type=int, default=200, help='operations for small payload scenarios')
+    parser.add_argument('--large-operations', type=int, default=2, help='operations for the 1M row scenario')
+    parser.add_argument('--campaigns', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--unsubscribers', type=int, default=1000000)
+    parser.add_argument('--html-kb', type=int, default=512)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated server latency in seconds')
+    args = parser.parse_args(argv)
+    args.start, args.end = dt.datetime(2020, 1, 1), dt.datetime(2020, 2, 1)
+
+    server = StubServer(latency=args.latency)
+    url = server.start()
+    try:
+        client = DoctorSenderClient('bench@example.com', 'token', url=url)
+        for name, call, operations, method in scenarios(server, args):
+            for threads in (1, args.threads):
+                print_result(run(client, name, lambda: call(client), operations, threads, method))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
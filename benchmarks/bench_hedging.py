@@ -0,0 +1,60 @@
+"""
+Tail latency benchmark for request hedging: segment_count against the local StubServer with every --slow-every-th
+response delayed by --slow-latency, once without and once with a HedgingPolicy. Reports p50/p99 and the share of
+extra requests the hedges cost.
+
+    python -m benchmarks.bench_hedging --operations 2000 --latency 0.005 --slow-every 33 --slow-latency 0.3
+"""
+import argparse
+import time
+
+from pydoctorsender import DoctorSenderClient
+from pydoctorsender.hedging import HedgingPolicy
+from pydoctorsender.instrumentation import LatencyHistogram
+
+from .stub_server import StubServer
+
+
+def run(url: str, server: StubServer, operations: int, hedging=None) -> dict:
+    """
+    Calls segment_count operations times from a single thread
+
+    :return: Dict with the latency percentiles and request counts
+    """
+    client = DoctorSenderClient('bench@example.com', 'token', url=url, validate=False, hedging=hedging)
+    histogram = LatencyHistogram()
+    requests = server.requests
+    for _ in range(operations):
+        start = time.perf_counter()
+        client.segment_count(123)
+        histogram.record(time.perf_counter() - start)
+    sent = server.requests - requests
+    return {'p50': histogram.percentile(50),
+            'p99': histogram.percentile(99),
+            'requests': sent,
+            'extra': sent / operations - 1}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark request hedging against a local stub server')
+    parser.add_argument('--operations', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.005, help='latency of regular responses in seconds')
+    parser.add_argument('--slow-every', type=int, default=33, help='every n-th response is slow')
+    parser.add_argument('--slow-latency', type=float, default=0.3, help='latency of slow responses in seconds')
+    parser.add_argument('--budget', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    server = StubServer(latency=args.latency, slow_every=args.slow_every, slow_latency=args.slow_latency)
+    url = server.start()
+    try:
+        for name, hedging in (('unhedged', None), ('hedged', HedgingPolicy(budget=args.budget))):
+            result = run(url, server, args.operations, hedging)
+            print(f"{name:<10} {args.operations:>6} ops  p50 {result['p50'] * 1000:>8.2f}ms  "
+                  f"p99 {result['p99'] * 1000:>8.2f}ms  requests {result['requests']:>6} "
+                  f"({result['extra']:+.1%})")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
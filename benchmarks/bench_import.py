@@ -0,0 +1,81 @@
+"""
+Startup benchmark: import cost of the package as reported by ``python -X importtime`` and the time from interpreter
+start to the first completed DoctorSenderClient call (against the local StubServer), each measured in fresh
+processes. Exits with status 1 if the median import time exceeds --budget-ms.
+
+    python -m benchmarks.bench_import --runs 20 --budget-ms 30
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+from .stub_server import StubServer
+
+FIRST_CALL = '''
+import sys, time
+start = time.perf_counter()
+from pydoctorsender import DoctorSenderClient
+client = DoctorSenderClient('bench@example.com', 'token', url=sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+
+def import_time(package: str = 'pydoctorsender') -> tuple:
+    """
+    :return: Tuple of (cumulative import time of the package in seconds, list of (module, cumulative seconds) of the
+        five most expensive imports triggered by the package)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {package}'],
+                            capture_output=True, text=True, check=True)
+    # Children are reported before their parent, so the package's imports are the lines between the previous top
+    # level import (e.g. site) and the package itself
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == package:
+            return int(cumulative) / 1e6, sorted(modules, key=lambda m: m[1], reverse=True)[:5]
+        if not name.startswith('  '):
+            modules = []
+            continue
+        modules.append((name.strip(), int(cumulative) / 1e6))
+    raise RuntimeError(f'{package} does not show up in the import time report')
+
+
+def first_call_time(url: str) -> float:
+    """
+    :return: Float with the seconds from the start of the import to the first call returning, in a fresh process
+    """
+    result = subprocess.run([sys.executable, '-c', FIRST_CALL, url], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import and first call cost of pydoctorsender')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail if the median import time exceeds this')
+    args = parser.parse_args(argv)
+
+    imports = [import_time() for _ in range(args.runs)]
+    import_median = statistics.median(total for total, _ in imports)
+    print(f'import pydoctorsender: median {import_median * 1000:.1f}ms over {args.runs} runs')
+    for name, seconds in imports[-1][1]:
+        print(f'    {name:<40} {seconds * 1000:>8.1f}ms')
+
+    server = StubServer()
+    url = server.start()
+    try:
+        first_call = statistics.median(first_call_time(url) for _ in range(args.runs))
+    finally:
+        server.stop()
+    print(f'import + first call:   median {first_call * 1000:.1f}ms over {args.runs} runs')
+
+    if args.budget_ms is not None and import_median * 1000 > args.budget_ms:
+        print(f'Import time exceeds the budget of {args.budget_ms}ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+A local stand-in for the Doctorsender SOAP server. It answers every ds* method the client uses with responses shaped
+like the real ones, the size of the list-like responses can be configured, so the client can be measured without
+touching production.
+
+>>> server = StubServer(campaigns=10000)
+>>> url = server.start()
+>>> client = DoctorSenderClient('user', 'token', url=url)
+>>> server.configure(campaigns=100000)
+>>> server.stop()
+
+Run it standalone with ``python -m benchmarks.stub_server --port 8765``.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+from pydoctorsender.statics import categories, countries, languages
+
+DEFAULT_SIZES = {
+    'segments': 50,         # segments per list in dsSegmentsGetByListName
+    'campaigns': 1000,      # campaigns returned by dsCampaignGetAll
+    'unsubscribers': 1000,  # rows returned by dsUsersListGetUnsubscribes
+    'user_statistics': 1000,  # emails returned by dsCampaignGetUserStatistics
+    'lists': 20,            # lists returned by dsUsersListGetAll
+    'fields': 15,           # fields returned by dsUsersListGetFields
+}
+
+ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns1="ns1" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xmlns:SOAP-ENC="http://schemas.xmlsoap.org/soap/encoding/" xmlns:ns2="http://xml.apache.org/xml-soap" '
+            'SOAP-ENV:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><SOAP-ENV:Body>{body}'
+            '</SOAP-ENV:Body></SOAP-ENV:Envelope>')
+
+RESPONSE = ('<ns1:webserviceResponse><webserviceReturn xsi:type="ns2:Map">'
+            '<item><key xsi:type="xsd:string">error</key><value xsi:type="xsd:boolean">false</value></item>'
+            '<item><key xsi:type="xsd:string">msg</key><value>{msg}</value></item>'
+            '</webserviceReturn></ns1:webserviceResponse>')
+
+FAULT = ('<SOAP-ENV:Fault><faultcode>SOAP-ENV:Client</faultcode>'
+         '<faultstring>{msg}</faultstring></SOAP-ENV:Fault>')
+
+_method_re = re.compile(rb'<method[^>]*>(\w+)</method>')
+_ids_re = re.compile(rb'id IN \(([\d,]+)\)')
+
+
+def _kv(key, value) -> str:
+    return f'<item><key xsi:type="xsd:string">{escape(str(key))}</key>' \
+           f'<value xsi:type="xsd:string">{escape(str(value))}</value></item>'
+
+
+def _map(pairs) -> str:
+    return ''.join(_kv(k, v) for k, v in pairs)
+
+
+def _records(records) -> str:
+    return ''.join(f'<item xsi:type="ns2:Map">{_map(record.items())}</item>' for record in records)
+
+
+def _campaign(campaign_id: int) -> dict:
+    amount = 10000 + campaign_id % 90000
+    return {'id': campaign_id,
+            'name': f'Campaign {campaign_id} - weekly newsletter',
+            'amount': amount,
+            'subject': f'Your weekly deals, issue {campaign_id}',
+            'from_name': 'Example Shop',
+            'from_email': 'news@example.com',
+            'sender': 'news@example.com',
+            'reply_to': 'reply@example.com',
+            'list_unsubscribe': 'https://example.com/unsubscribe',
+            'speed': 5,
+            'send_date': '2020-01-01 08:00:00',
+            'status': 'finished',
+            'user_list': 'example_list',
+            'segment_id': campaign_id % 50,
+            'segment': f'segment {campaign_id % 50}',
+            'category_id': 1,
+            'country': 'DEU',
+            'opens': amount // 5,
+            'clicks': amount // 40,
+            'deliveries': amount - amount // 50,
+            'bounced': amount // 50,
+            'complaints': amount // 10000,
+            'unsubscribes': amount // 500,
+            'cvars': 0,
+            'unicViews': amount // 6,
+            'unicClics': amount // 50,
+            'bounceds_soft': amount // 100}
+
+
+class StubServer:
+    """Threaded HTTP server answering Doctorsender SOAP calls with generated responses"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, slow_every: int = 0,
+                 slow_latency: float = 0.0, **sizes):
+        """
+        :param host: String with the interface to bind to
+        :param port: Int with the port, 0 picks a free one
+        :param latency: Float with seconds every response is delayed by, to simulate the network round trip
+        :param slow_every: Int, every slow_every-th request is delayed by slow_latency instead, to simulate a latency
+            tail (0 for none)
+        :param slow_latency: Float with the seconds the slow requests are delayed by
+        :param sizes: Ints overriding DEFAULT_SIZES
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.sizes = dict(DEFAULT_SIZES, **sizes)
+        self.calls = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._next_id = 100000
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/soapserver.php'
+
+    def configure(self, **sizes):
+        """Changes response sizes, cached responses are dropped"""
+        with self._lock:
+            self.sizes.update(sizes)
+            self._cache.clear()
+
+    def start(self) -> str:
+        """
+        Starts serving in a background thread
+
+        :return: String with the url to hand to DoctorSenderClient
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client dropped the connection, e.g. a response aborted by the response limits
+                    pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                payload = server.respond(body)
+                latency = server.delay()
+                if latency:
+                    time.sleep(latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def delay(self) -> float:
+        """
+        :return: Float with the seconds the next response is delayed by
+        """
+        with self._lock:
+            self.requests += 1
+            if self.slow_every and self.requests % self.slow_every == 0:
+                return self.slow_latency
+        return self.latency
+
+    def respond(self, body: bytes) -> bytes:
+        """
+        :param body: Bytes of the SOAP request
+        :return: Bytes of the SOAP response
+        """
+        match = _method_re.search(body)
+        method = match.group(1).decode() if match else ''
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if method in ('dsSegmentsNew', 'dsCampaignNew'):
+                self._next_id += 1
+                return ENVELOPE.format(body=RESPONSE.format(msg=self._next_id)).encode('utf-8')
+            payload = self._cache.get(method)
+        if method == 'dsCampaignGetAll':
+            # Batched lookups ask for specific ids, those are answered without the cache
+            ids = _ids_re.search(body)
+            if ids:
+                ids = [int(i) for i in ids.group(1).split(b',') if int(i) <= self.sizes['campaigns']]
+                return ENVELOPE.format(body=RESPONSE.format(msg=_records(_campaign(i) for i in ids))).encode('utf-8')
+        if payload is None:
+            payload = self._build(method).encode('utf-8')
+            with self._lock:
+                self._cache[method] = payload
+        return payload
+
+    def _build(self, method: str) -> str:
+        msg = self._message(method)
+        if msg is None:
+            return ENVELOPE.format(body=FAULT.format(msg=f'Unknown method {escape(method)}'))
+        return ENVELOPE.format(body=RESPONSE.format(msg=msg))
+
+    def _message(self, method: str):
+        sizes = self.sizes
+        if method == 'dsIpGroupGetNames':
+            return 'default'
+        if method in ('dsGetSegmentCount', 'dsSegmentsAddCondition', 'dsSegmentsDelCondition'):
+            return '123456'
+        if method == 'dsSegmentsGetByListName':
+            return _map((i, f'segment {i}') for i in range(1, sizes['segments'] + 1))
+        if method in ('dsSegmentsDel', 'dsCampaignDelete', 'dsCampaignSetExclusions', 'dsCampaignSendEmailsTest',
+                      'dsCampaignSendList'):
+            return 'true'
+        if method == 'dsCampaignGet':
+            return _map(_campaign(1).items())
+        if method == 'dsCampaignGetAll':
+            return _records(_campaign(i) for i in range(1, sizes['campaigns'] + 1))
+        if method == 'dsCampaignGetUserStatistics':
+            emails = [f'user{i}@example.com' for i in range(sizes['user_statistics'])]
+            return escape(json.dumps({'email': emails}))
+        if method == 'dsUsersListGetAll':
+            return _records({'listName': f'list_{i}', 'test': 0, 'count': 1000 * i,
+                             'created_at': '2019-01-01 01:23:45', 'ready': 1,
+                             'last_amount_update': '2019-04-25 00:00:00'} for i in range(sizes['lists']))
+        if method == 'dsUsersListGetFields':
+            types = ('varchar', 'int', 'date', 'datetime', 'float')
+            return _map(('email' if i == 0 else f'field_{i}', 'varchar' if i == 0 else types[i % len(types)])
+                        for i in range(sizes['fields']))
+        if method == 'dsUsersListGetUnsubscribes':
+            return ''.join(f'<item xsi:type="xsd:string">20200101;{i // 60 % 24:02d}:{i % 60:02d};'
+                           f'user{i}@example.com;example_list</item>' for i in range(sizes['unsubscribers']))
+        if method == 'dsLanguageGetAll':
+            return _records({'id': k, 'language': v} for k, v in languages.items())
+        if method == 'dsCountryGetAll':
+            return _records({'iso3': k, 'name': v} for k, v in countries.items())
+        if method == 'dsCategoryGetAll':
+            return _records({'id': k, 'name': v} for k, v in categories.items())
+        if method == 'dsSettingsGetAllFromEmail':
+            return ''.join(f'<item xsi:type="xsd:string">{email}</item>'
+                           for email in ('news@example.com', 'reply@example.com'))
+        if method == 'dsFtpGetAccess':
+            return _map((('host', 'ftp.example.com'), ('user', 'user'), ('pass', 'secret')))
+        if method in ('dsUsersListDownload', 'dsUsersListDownloadHard', 'dsUsersGetUserActivity'):
+            return f'https://files.example.com/{method}.csv'
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--slow-every', type=int, default=0)
+    parser.add_argument('--slow-latency', type=float, default=0.0)
+    for name, default in DEFAULT_SIZES.items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, default=default)
+    args = vars(parser.parse_args())
+    stub = StubServer(**args)
+    print(f'Serving on {stub.start()}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -1 +1,17 @@
-from .doctorsender import DoctorSenderClient
\ No newline at end of file
+from .doctorsender import DoctorSenderClient
+from .instrumentation import Hook, MetricsCollector, RequestEvent
+from .lookups import Countries, Languages, Categories
+from .circuit import CircuitBreaker
+
+# Imported on first access, most scripts use neither and the pool pulls in concurrent.futures
+_lazy = {'DoctorSenderPool': '.pool', 'HedgingPolicy': '.hedging'}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        import importlib
+
+        value = getattr(importlib.import_module(_lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,160 @@
+"""
+Bulk creation of near-identical campaigns from one template. The settings are validated once, the shared html and plain
+text are encoded once and the encoded bytes are reused for every dsCampaignNew call, which run with bounded
+concurrency. A ledger records a content hash of every created campaign, so a re-run skips campaigns that were already
+created.
+
+>>> template = {'subject': 'Weekly deals', 'from_name': 'Example Shop', 'from_email': 'news@example.com',
+...             'reply_to': 'reply@example.com', 'html': html, 'plain': plain, 'list_unsubscribe': unsubscribe_url}
+>>> create_campaigns(client, template, [{'campaign_name': 'Deals DE', 'utm_campaign': 'deals_de'},
+...                                     {'campaign_name': 'Deals AT', 'utm_campaign': 'deals_at', 'country': 'AUT'}],
+...                  ledger='campaigns.json')
+[4711, 4712]
+"""
+import hashlib
+import inspect
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .doctorsender import CAMPAIGN_CONTENT_ITEMS, DoctorSenderClient
+
+# Arguments neither the template nor a campaign set take the create_campaign defaults
+_defaults = {name: parameter.default
+             for name, parameter in inspect.signature(DoctorSenderClient.create_campaign).parameters.items()
+             if parameter.default is not parameter.empty}
+
+_content_fields = ('html', 'plain')
+_setting_fields = ('from_email', 'reply_to', 'category_id', 'country', 'language_id', 'template_id',
+                   'list_unsubscribe')
+
+
+class CampaignLedger:
+    """Content hashes of created campaigns with their campaign id, stored as JSON file"""
+
+    def __init__(self, path: str):
+        """
+        :param path: String with the path of the JSON file, created on the first record
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.campaigns = json.load(f)
+        except FileNotFoundError:
+            self.campaigns = {}
+
+    def get(self, content_hash: str):
+        """
+        :return: Int with the campaign id created for the content hash, None if there is none
+        """
+        with self._lock:
+            return self.campaigns.get(content_hash)
+
+    def record(self, content_hash: str, campaign_id: int):
+        """Records a created campaign, the file is replaced atomically so a crash never leaves it half written"""
+        with self._lock:
+            self.campaigns[content_hash] = campaign_id
+            self._save()
+
+    def forget(self, content_hashes: list):
+        """Removes campaigns from the ledger, e.g. after they were deleted, and saves it like record"""
+        with self._lock:
+            for content_hash in content_hashes:
+                self.campaigns.pop(content_hash, None)
+            self._save()
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.campaigns, f)
+        os.replace(tmp_path, self.path)
+
+
+def _encode_content(client, content: dict) -> tuple:
+    """The encoded html and plain text items with the sha256 digest of both"""
+    items = client._campaign_items('', '', '', '', '', **content)[CAMPAIGN_CONTENT_ITEMS]
+    encoded = ''.join(items).encode('utf-8')
+    return encoded, hashlib.sha256(encoded).digest()
+
+
+def create_campaigns(client, template: dict, campaigns: list, max_workers: int = 8, ledger=None,
+                     verify: bool = True, return_exceptions: bool = False) -> list:
+    """
+    Creates one campaign per entry of campaigns, each being the template updated with the entry
+
+    :param client: DoctorSenderClient
+    :param template: Dict with the create_campaign arguments all campaigns share
+    :param campaigns: List of dicts with the create_campaign arguments of each campaign (at least campaign_name)
+    :param max_workers: Int, maximum of concurrent dsCampaignNew calls
+    :param ledger: Optional CampaignLedger or path of its JSON file, campaigns whose content hash is in the ledger are
+        not created again
+    :param verify: Bool, if True campaigns from the ledger are looked up (in one batched call) and created again if
+        they were deleted in the meantime
+    :param return_exceptions: Bool, if True exceptions are returned as results, otherwise the first one is raised once
+        all calls finished
+    :return: List with the campaign id (or exception) per entry of campaigns, in the same order
+    """
+    if isinstance(ledger, str):
+        ledger = CampaignLedger(ledger)
+
+    # html and plain of the template are encoded once, campaigns overriding them get their own encoding
+    contents = {}
+
+    def content(settings: dict) -> tuple:
+        key = tuple(settings.get(field, '') for field in _content_fields)
+        if key not in contents:
+            contents[key] = _encode_content(client, {field: settings.get(field, '') for field in _content_fields})
+        return contents[key]
+
+    available_emails = client.from_emails()
+    checked = set()
+    bodies = []
+    for overrides in campaigns:
+        settings = {**_defaults, **template, **overrides}
+        setting_values = tuple(settings.get(field) for field in _setting_fields)
+        if setting_values not in checked:
+            client._check_campaign_settings(*setting_values, available_emails=available_emails)
+            checked.add(setting_values)
+
+        encoded_content, content_digest = content(settings)
+        items = client._campaign_items(**dict(settings, html='', plain=''))
+        head = ''.join(items[:CAMPAIGN_CONTENT_ITEMS.start]).encode('utf-8')
+        tail = ''.join(items[CAMPAIGN_CONTENT_ITEMS.stop:]).encode('utf-8')
+        content_hash = hashlib.sha256(head + content_digest + tail).hexdigest()
+        bodies.append((content_hash, (head, encoded_content, tail)))
+
+    results = [None] * len(bodies)
+    if ledger is not None:
+        known = {i: ledger.get(content_hash) for i, (content_hash, _) in enumerate(bodies)}
+        known = {i: campaign_id for i, campaign_id in known.items() if campaign_id is not None}
+        if verify and known:
+            existing = client.campaigns(list(known.values()), fields=['name'], get_statistics=False)
+            deleted = [bodies[i][0] for i, campaign_id in known.items() if campaign_id not in existing]
+            ledger.forget(deleted)
+            known = {i: campaign_id for i, campaign_id in known.items() if campaign_id in existing}
+        for i, campaign_id in known.items():
+            results[i] = campaign_id
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    def create(i: int) -> int:
+        content_hash, parts = bodies[i]
+        campaign_id = client._new_campaign(b''.join(parts))
+        if ledger is not None:
+            ledger.record(content_hash, campaign_id)
+        return campaign_id
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {i: executor.submit(create, i) for i in pending}
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = e
+                errors.append(e)
+
+    if errors and not return_exceptions:
+        raise errors[0]
+    return results
@@ -0,0 +1,173 @@
+"""
+An in-memory catalog of the lists of an account with their fields and segments. The fields and segments of all lists
+are fetched concurrently and indexed by list name, segment id and segment name. A refresh only fetches the lists whose
+metadata (user count, last update, ...) changed, and a snapshot saved to disk makes the catalog available right away
+on the next start.
+
+>>> catalog = AccountCatalog(client).refresh()
+>>> catalog.fields('example_list')
+{'email': 'varchar', 'country': 'varchar', ...}
+>>> catalog.segment(4711)
+('example_list', 'Germany')
+>>> catalog.find_segments('Germany')
+[('example_list', 4711)]
+>>> catalog.save('catalog.json')
+>>> catalog = AccountCatalog.load(client, 'catalog.json')
+>>> catalog.refresh()  # only lists that changed since the snapshot
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .errors import DrsListError, DrsSegmentError
+
+_snapshot_version = 1
+
+
+class AccountCatalog:
+    def __init__(self, client, max_workers: int = 8):
+        """
+        :param client: DoctorSenderClient
+        :param max_workers: Int, maximum of concurrent calls while refreshing
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.refreshed_at = None
+        self._lists = {}
+        self._fields = {}
+        self._segments = {}
+        self._segment_lists = {}
+        self._segment_names = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, list_name: str) -> bool:
+        return list_name in self._lists
+
+    def __len__(self) -> int:
+        return len(self._lists)
+
+    def lists(self) -> dict:
+        """
+        :return: Dict with the list name as key and the list metadata as value, as returned by DoctorSenderClient.lists
+        """
+        return dict(self._lists)
+
+    def list(self, list_name: str) -> dict:
+        """
+        :return: Dict with the metadata of a list
+        """
+        try:
+            return self._lists[list_name]
+        except KeyError:
+            raise DrsListError(f"The list {list_name} could not be found.")
+
+    def fields(self, list_name: str) -> dict:
+        """
+        :return: Dict with the field names of a list as keys and the field types as value
+        """
+        self.list(list_name)
+        return self._fields.get(list_name, {})
+
+    def segments(self, list_name: str) -> dict:
+        """
+        :return: Dict with the segment id of a list as key and the segment name as value
+        """
+        self.list(list_name)
+        return self._segments.get(list_name, {})
+
+    def segment(self, segment_id: int) -> tuple:
+        """
+        :return: Tuple of (list name, segment name) of a segment
+        """
+        try:
+            list_name = self._segment_lists[int(segment_id)]
+        except KeyError:
+            raise DrsSegmentError(f"The segment {segment_id} could not be found.")
+        return list_name, self._segments[list_name][int(segment_id)]
+
+    def find_segments(self, segment_name: str, list_name: str = None) -> list:
+        """
+        :param segment_name: String with the segment name
+        :param list_name: Optional string to only search one list
+        :return: List of (list name, segment id) tuples of all segments with that name
+        """
+        found = self._segment_names.get(segment_name, [])
+        return [(name, segment_id) for name, segment_id in found if list_name is None or name == list_name]
+
+    def _fetch(self, list_name: str, metadata: dict) -> tuple:
+        is_testlist = str(metadata.get('test', 0)) == '1'
+        fields = self.client.get_list_fields(list_name, is_testlist) or {}
+        segments = {int(segment_id): name for segment_id, name in self.client.segments(list_name).items()}
+        return fields, segments
+
+    def refresh(self, force=None) -> 'AccountCatalog':
+        """
+        Fetches the lists of the account and the fields and segments of every list that is new or whose metadata
+        changed. Segments changes don't change the list metadata, force re-fetches lists regardless.
+
+        :param force: True to re-fetch all lists, or a list of list names to re-fetch
+        :return: The catalog itself
+        """
+        lists = dict(self.client.lists('') or {})
+
+        forced = set(lists) if force is True else set(force or ())
+        changed = [name for name, metadata in lists.items()
+                   if name in forced or self._lists.get(name) != metadata or name not in self._fields]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            fetched = dict(zip(changed, executor.map(lambda name: self._fetch(name, lists[name]), changed)))
+
+        fields = {name: self._fields[name] for name in lists if name not in fetched}
+        segments = {name: self._segments[name] for name in lists if name not in fetched}
+        for name, (list_fields, list_segments) in fetched.items():
+            fields[name] = list_fields
+            segments[name] = list_segments
+        self._swap(lists, fields, segments)
+        self.refreshed_at = time.time()
+        return self
+
+    def _swap(self, lists: dict, fields: dict, segments: dict):
+        """Rebuilds the indexes and replaces everything at once, so readers never see a half refreshed catalog"""
+        segment_lists = {}
+        segment_names = {}
+        for list_name, list_segments in segments.items():
+            for segment_id, segment_name in list_segments.items():
+                segment_lists[segment_id] = list_name
+                segment_names.setdefault(segment_name, []).append((list_name, segment_id))
+        with self._lock:
+            self._lists, self._fields, self._segments = lists, fields, segments
+            self._segment_lists, self._segment_names = segment_lists, segment_names
+
+    def save(self, path: str):
+        """Writes a snapshot of the catalog to a JSON file, replaced atomically"""
+        with self._lock:
+            snapshot = {'version': _snapshot_version,
+                        'refreshed_at': self.refreshed_at,
+                        'lists': self._lists,
+                        'fields': self._fields,
+                        'segments': self._segments}
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, client, path: str, max_workers: int = 8) -> 'AccountCatalog':
+        """
+        :param client: DoctorSenderClient, used for later refreshes
+        :param path: String with the path of a snapshot written by save()
+        :return: AccountCatalog with the state of the snapshot, call refresh() to bring it up to date
+        """
+        with open(path) as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != _snapshot_version:
+            raise ValueError(f"Unsupported catalog snapshot version {snapshot.get('version')}")
+
+        catalog = cls(client, max_workers=max_workers)
+        segments = {list_name: {int(segment_id): name for segment_id, name in list_segments.items()}
+                    for list_name, list_segments in snapshot['segments'].items()}
+        catalog._swap(snapshot['lists'], snapshot['fields'], segments)
+        catalog.refreshed_at = snapshot['refreshed_at']
+        return catalog
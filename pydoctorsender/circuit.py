@@ -0,0 +1,159 @@
+"""
+Circuit breaker for the client transport. Failures are tracked per group of SOAP methods, once the failure rate of a
+group crosses the threshold its circuit opens and calls fail immediately with DrsCircuitOpenError instead of waiting
+for the timeout. After open_duration a limited number of probe calls is let through (half-open), the circuit closes
+again when they succeed.
+
+>>> breaker = CircuitBreaker(failure_threshold=0.5, minimum_calls=10, open_duration=30)
+>>> client = DoctorSenderClient('user@doctorsender.com', 'example_api_token', circuit_breaker=breaker)
+
+Only transport and parsing failures count, errors returned by Doctorsender itself mean the service is up. State
+changes are reported to the client hooks through on_circuit_state_change(group, old_state, new_state).
+"""
+import threading
+import time
+from collections import deque
+
+from .errors import DrsCircuitOpenError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_groups = (('dsSegments', 'segments'), ('dsGetSegment', 'segments'), ('dsCampaign', 'campaigns'),
+           ('dsUsers', 'users'))
+
+
+def method_group(method: str) -> str:
+    """
+    :param method: String with the SOAP method name
+    :return: String with the group the method belongs to: segments, campaigns, users or settings
+    """
+    for prefix, group in _groups:
+        if method.startswith(prefix):
+            return group
+    return 'settings'
+
+
+class _Circuit:
+    __slots__ = ('state', 'calls', 'opened_at', 'probes', 'probe_successes')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.calls = deque()
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: float = 0.5, minimum_calls: int = 10, window: float = 60.0,
+                 open_duration: float = 30.0, half_open_calls: int = 1, group=method_group):
+        """
+        :param failure_threshold: Float, failure rate within the window at which the circuit opens
+        :param minimum_calls: Int, calls needed in the window before the failure rate is considered
+        :param window: Float, seconds of call history the failure rate is computed over
+        :param open_duration: Float, seconds an open circuit rejects calls before letting probes through
+        :param half_open_calls: Int, concurrent probes while half-open, the same number of successes closes the circuit
+        :param group: Callable mapping a SOAP method name to its group
+        """
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.group = group
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def state(self, method_or_group: str) -> str:
+        """
+        :param method_or_group: String with a SOAP method name or a group name
+        :return: String with the state of the circuit: closed, open or half_open
+        """
+        circuit = self._circuits.get(method_or_group) or self._circuits.get(self.group(method_or_group))
+        return circuit.state if circuit is not None else CLOSED
+
+    def _circuit(self, group: str) -> _Circuit:
+        circuit = self._circuits.get(group)
+        if circuit is None:
+            circuit = self._circuits[group] = _Circuit()
+        return circuit
+
+    def before(self, method: str, on_change=None):
+        """
+        Called before a request, raises DrsCircuitOpenError if the request must not be sent
+
+        :param method: String with the SOAP method name
+        :param on_change: Callable(group, old_state, new_state), called on state changes
+        """
+        group = self.group(method)
+        changes = []
+        try:
+            with self._lock:
+                circuit = self._circuit(group)
+                now = time.monotonic()
+                if circuit.state == OPEN:
+                    retry_after = circuit.opened_at + self.open_duration - now
+                    if retry_after > 0:
+                        raise DrsCircuitOpenError(group, retry_after)
+                    self._transition(group, circuit, HALF_OPEN, changes)
+                if circuit.state == HALF_OPEN:
+                    if circuit.probes >= self.half_open_calls:
+                        raise DrsCircuitOpenError(group, 0.0)
+                    circuit.probes += 1
+        finally:
+            self._notify(changes, on_change)
+
+    def record(self, method: str, failed: bool, on_change=None):
+        """
+        Called after a request that was let through by before()
+
+        :param method: String with the SOAP method name
+        :param failed: Bool, True if the request failed in a way that hints at Doctorsender being unavailable
+        :param on_change: Callable(group, old_state, new_state), called on state changes
+        """
+        group = self.group(method)
+        changes = []
+        with self._lock:
+            circuit = self._circuit(group)
+            now = time.monotonic()
+
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(circuit.probes - 1, 0)
+                if failed:
+                    self._transition(group, circuit, OPEN, changes, now)
+                else:
+                    circuit.probe_successes += 1
+                    if circuit.probe_successes >= self.half_open_calls:
+                        self._transition(group, circuit, CLOSED, changes)
+
+            elif circuit.state == CLOSED:
+                calls = circuit.calls
+                calls.append((now, failed))
+                while calls and calls[0][0] < now - self.window:
+                    calls.popleft()
+                if len(calls) >= self.minimum_calls:
+                    failures = sum(1 for _, f in calls if f)
+                    if failures / len(calls) >= self.failure_threshold:
+                        self._transition(group, circuit, OPEN, changes, now)
+
+        self._notify(changes, on_change)
+
+    @staticmethod
+    def _transition(group: str, circuit: _Circuit, state: str, changes: list, now: float = 0.0):
+        changes.append((group, circuit.state, state))
+        circuit.state = state
+        circuit.probes = 0
+        circuit.probe_successes = 0
+        if state == OPEN:
+            circuit.opened_at = now
+        if state == CLOSED:
+            circuit.calls.clear()
+
+    @staticmethod
+    def _notify(changes: list, on_change):
+        # Called outside the lock, so callbacks can safely look at the breaker
+        if on_change is not None:
+            for change in changes:
+                on_change(*change)
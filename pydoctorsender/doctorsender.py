@@ -1,19 +1,79 @@
 from typing import List
-import json
-import requests
+from contextlib import nullcontext
 import datetime as dt
+import time
 
-from .response import DrsResponse
+from .response import DrsResponse, decode
 from .errors import *
-from .statics import countries, languages, categories
+from .instrumentation import RequestEvent
+from .lookups import Countries, Languages, Categories
+from .segmentation import COMPARATORS, SegmentConditionValidator
+
+# requests, json and the static tables are imported where they are used, so importing the package stays cheap for
+# short-lived processes that only make a handful of calls
+
+# Fields requested by campaign() (dsCampaignGet) and available in list_campaigns() (dsCampaignGetAll)
+CAMPAIGN_FIELDS = ["name", "amount", "subject", "from_name", "from_email", "sender", "segment_id", "segment",
+                   "user_list", "country", "send_date", "reply_to", "list_unsubscribe"]
+CAMPAIGN_LIST_FIELDS = ["name", "amount", "subject", "from_name", "from_email", "sender", "html", "text", "reply_to",
+                        "list_unsubscribe", "speed", "send_date", "status", "user_list", "segment_id", "segment"]
+# Position of the html and plain text items in the dsCampaignNew parameters, see DoctorSenderClient._campaign_items
+CAMPAIGN_CONTENT_ITEMS = slice(8, 10)
+
+
+def _no_stage(name: str):
+    """Stand-in for ProfiledCall.stage when the profiler doesn't capture a call"""
+    return nullcontext()
 
 
 class DoctorSenderClient:
-    def __init__(self, user, token):
+    def __init__(self, user, token, hooks: list = None,
+                 url: str = 'https://soapwebservice.doctorsender.com/soapserver.php', parse_executor=None,
+                 parse_threshold: int = 1024 * 1024, session=None, validate: bool = True, circuit_breaker=None,
+                 hedging=None, profiler=None, response_limits=None):
+        """
+        :param user: String with the Doctorsender user (email)
+        :param token: String with the API token
+        :param hooks: List of instrumentation hooks (see pydoctorsender.instrumentation), called around every request
+        :param url: String with the SOAP endpoint, only needs to be changed to point the client at a stand-in server
+        :param parse_executor: Optional concurrent.futures.ProcessPoolExecutor, responses of at least parse_threshold
+            bytes are decoded in it, so parsing large responses doesn't hold the GIL of the calling process
+        :param parse_threshold: Int, size in bytes from which responses are decoded in the parse_executor
+        :param session: Optional requests.Session, e.g. to share one connection pool between several clients
+        :param validate: Bool, if True the ip groups are requested right away to make sure user and token are valid,
+            otherwise they are requested on first use
+        :param circuit_breaker: Optional pydoctorsender.circuit.CircuitBreaker (can be shared between clients), calls
+            fail fast with DrsCircuitOpenError while the circuit of their method group is open
+        :param hedging: Optional pydoctorsender.hedging.HedgingPolicy, read-only calls that are slow to respond are
+            sent a second time and the first response is used
+        :param profiler: Optional pydoctorsender.profiling.Profiler, captures CPU profiles and memory peaks of the
+            stages of sampled, large or slow calls
+        :param response_limits: Optional pydoctorsender.limits.ResponseLimits, responses are streamed and calls are
+            aborted with DrsResponseTooLargeError as soon as the response exceeds the limits of the method
+        """
         self.user = user
         self.token = token
-        self.url = 'https://soapwebservice.doctorsender.com/soapserver.php'
-        self.ips = self._ip_groups()  # Should always be "default', call to ensure that user and token are valid
+        self.url = url
+        self.hooks = list(hooks) if hooks else []
+        self.parse_executor = parse_executor
+        self.parse_threshold = parse_threshold
+        self.session = session
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.profiler = profiler
+        self.response_limits = response_limits
+        # Field schemas of lists and conditions of segments created through this client, see segment_add_condition
+        self.segment_validator = SegmentConditionValidator(self)
+        self._ips = None
+        self._envelopes = {}
+        if validate:
+            self._ips = self._ip_groups()  # Should always be "default', call to ensure that user and token are valid
+
+    @property
+    def ips(self) -> str:
+        if self._ips is None:
+            self._ips = self._ip_groups()
+        return self._ips
 
     def _construct_body(self, methode, data, ur_type):
         if data:
@@ -44,21 +104,129 @@ class DoctorSenderClient:
                     </SOAP-ENV:Envelope>
                     """
 
-    def _post_request(self, function_name: str, data: str, ur_type: int = 3, timeout=(10, 60)) -> DrsResponse:
+    def _envelope(self, methode, ur_type) -> tuple:
+        """The envelope of _construct_body as encoded (head, tail), built once per method, for pre-encoded data"""
+        envelope = self._envelopes.get((methode, ur_type))
+        if envelope is None:
+            marker = '\x00data\x00'
+            head, tail = self._construct_body(methode, marker, ur_type).split(marker)
+            envelope = self._envelopes[(methode, ur_type)] = (head.encode('utf-8'), tail.encode('utf-8'))
+        return envelope
+
+    def _post_request(self, function_name: str, data: str, ur_type: int = 3, timeout=(10, 60),
+                      records: bool = False) -> DrsResponse:
         """Every request to the API is a POST request (because fo the SOAP standard). This method constructs the request
 
         :param function_name: String with API function name as per Doctorsender API docs
-        :param data: String in xml format containing all additional parameters for the call
+        :param data: String in xml format containing all additional parameters for the call, or the same already
+            utf-8 encoded as bytes (e.g. to reuse large parameters between calls)
         :param ur_type: Int, either 2 or 3, different depending on how the xml data looks like
+        :param records: Bool, if True the content of the response is a list of record dicts (see DrsResponse)
         :return: DrsResponse object
         """
-        headers = {'content-type': 'application/soap+xml'}
-        body = self._construct_body(function_name, data, ur_type)
+        import requests
 
-        response = requests.post(self.url, data=body.encode('utf-8'), headers=headers, timeout=timeout)
+        headers = {'content-type': 'application/soap+xml'}
+        event = RequestEvent(function_name)
+        self._emit('on_request_start', event)
+        breaker = self.circuit_breaker
+        profile = self.profiler.call(function_name) if self.profiler is not None else None
+        stage = profile.stage if profile is not None else _no_stage
 
-        # For easier debugging and further processing, the response is handed over as a DrsResponse object
-        return DrsResponse(response)
+        try:
+            if breaker is not None:
+                breaker.before(function_name, self._circuit_state_changed)
+
+            start = time.perf_counter()
+            with stage('build'):
+                if isinstance(data, bytes):
+                    head, tail = self._envelope(function_name, ur_type)
+                    body = b''.join((head, data, tail))
+                else:
+                    body = self._construct_body(function_name, data, ur_type).encode('utf-8')
+            event.request_bytes = len(body)
+            event.build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            post = requests.post if self.session is None else self.session.post
+            limits = self.response_limits
+
+            def send():
+                if limits is None:
+                    return post(self.url, data=body, headers=headers, timeout=timeout)
+                response = post(self.url, data=body, headers=headers, timeout=timeout, stream=True)
+                try:
+                    response._content = limits.read(function_name, response)
+                finally:
+                    # Returns the connection to the pool, or drops it if the body was not read to the end
+                    response.close()
+                return response
+
+            with stage('network'):
+                if self.hedging is None:
+                    response = send()
+                else:
+                    response, event.hedges = self.hedging.run(function_name, send)
+            event.response_bytes = len(response.content)
+            event.network_time = time.perf_counter() - start
+            if profile is not None:
+                profile.response_size(event.response_bytes)
+
+            # For easier debugging and further processing, the response is handed over as a DrsResponse object
+            start = time.perf_counter()
+            with stage('parse'):
+                drs_response = self._parse_response(response, records)
+                error = drs_response.reduce()
+            event.parse_time = time.perf_counter() - start
+        except DrsCircuitOpenError as e:
+            event.outcome = 'rejected'
+            event.error = e
+            raise
+        except DrsResponseTooLargeError as e:
+            event.outcome = 'aborted'
+            event.error = e
+            raise
+        except Exception as e:
+            event.outcome = 'error'
+            event.error = e
+            raise
+        else:
+            event.outcome = 'ok' if error is None else 'fault'
+            event.error = error
+        finally:
+            if breaker is not None and event.outcome != 'rejected':
+                # Errors returned by Doctorsender (faults) mean the service is up, only transport and parsing
+                # failures count against the circuit
+                breaker.record(function_name, event.outcome == 'error', self._circuit_state_changed)
+            self._emit('on_request_end', event)
+            if profile is not None:
+                self.profiler.finish(profile, event)
+
+        return drs_response
+
+    def _parse_response(self, response, records: bool = False) -> DrsResponse:
+        """Decodes large responses in the parse_executor (if set), everything else inline"""
+        if self.parse_executor is not None and len(response.content) >= self.parse_threshold:
+            decoded = self.parse_executor.submit(decode, response.content, records).result()
+            return DrsResponse(response, decoded=decoded, records=records)
+        return DrsResponse(response, records=records)
+
+    def _circuit_state_changed(self, group: str, old_state: str, new_state: str):
+        self._emit('on_circuit_state_change', group, old_state, new_state)
+
+    def _emit(self, name: str, *args):
+        """Calls the method name on every hook that implements it, errors of a hook are logged and never reach the
+        request"""
+        for hook in self.hooks:
+            callback = getattr(hook, name, None)
+            if callback is not None:
+                try:
+                    callback(*args)
+                except Exception:
+                    # Imported here, logging is only needed once a hook is broken
+                    import logging
+
+                    logging.getLogger(__name__).exception(f"Instrumentation hook {hook!r} failed in {name}")
 
     # ------ Segment Methods ------
 
@@ -122,14 +290,18 @@ class DoctorSenderClient:
         except DrsReturnError as e:
             raise DrsListError(f"The list {list_name} could not be found.")
 
+        self.segment_validator.register_segment(segment_id, list_name, {})
         return segment_id
 
     def segment_add_condition(self, segment_id: int, field_name: str, comparator: str, value: str, is_or: bool = False,
-                               is_date: bool = False) -> int:
+                              is_date: bool = False, list_name: str = None) -> int:
         """Add a new condition to an existing segment
 
         Notes: Each field can only have one condition, the api (.content in return object) returns false if the field
-        does not exists
+        does not exists. Because a rejected condition leaves the segment invalid, conditions on segments created
+        through this client (or whose list_name is given) are checked locally first against the cached list fields
+        (field exists, comparator fits the field type, is_date for date fields) and the conditions already added. The
+        conditions a segment had before it became known to the client can't be checked, a warning says so.
 
         Doc: http://soapwebservice.doctorsender.com/doxy/html/classds_segments.html#a6a8492fe606dee505fc335832b45f217
 
@@ -139,28 +311,18 @@ class DoctorSenderClient:
         :param value: String, value the field shall be compared with
         :param is_or: Boolean, only works if comparator is 'segment'
         :param is_date: Boolean, set to true if the value is a date
+        :param list_name: String, the list of the segment, only needed for segments not created through this client
         :return: Int with amount of users in this segment after adding condition
         """
-        # To make the API more accessible, the parameter comparator takes string version of standard Python comparators
-        comparator_mapping = {'<': 'lt',
-                              '>': 'gt',
-                              '==': 'lt',
-                              '!=': 'ne',
-                              '<=': 'lte',
-                              '>=': 'gte',
-                              'like': 'like',
-                              'not like': 'not like',
-                              'in': 'in',
-                              'not in': 'not in',
-                              'segment': 'segment'}
-        assert comparator in comparator_mapping.keys(), "Comperator must be in " \
-                                                        "{<, >, ==, !=, <=, >=, like, not like, in, not in, segment}"
-        comparator = comparator_mapping[comparator]
+        if list_name is not None and not self.segment_validator.known(segment_id):
+            # Doctorsender has no call returning the conditions of a segment, the ones it already has are unknown
+            self.segment_validator.register_segment(segment_id, list_name)
+        self.segment_validator.validate(segment_id, field_name, comparator, value, is_date)
 
         data = f"""
             <item xsi:type="xsd:int">{segment_id}</item>
             <item xsi:type="xsd:str">{field_name}</item>
-            <item xsi:type="xsd:str">{comparator}</item>
+            <item xsi:type="xsd:str">{COMPARATORS[comparator]}</item>
             <item xsi:type="xsd:str">{value}</item>
             <item xsi:type="xsd:bool">{is_or}</item>
         """
@@ -175,10 +337,11 @@ class DoctorSenderClient:
         except DrsReturnError as e:
             raise DrsListError(e)
         except ValueError as e:
-            raise DrsSegmentError(f"Either the field {field_name} does not exist or already has a condition. " /
-                                  "With this error the segment became invalid. To continue working with it via API, " /
-                                  "tit is advised relete segment and create it again.")
+            raise DrsSegmentError(f"Either the field {field_name} does not exist or already has a condition. "
+                                  "With this error the segment became invalid. To continue working with it via API, "
+                                  "it is advised to delete the segment and create it again.")
 
+        self.segment_validator.condition_added(segment_id, field_name, comparator, value)
         return segment_count
 
     def segment_del_condition(self, segment_id: int, field_name: str) -> int:
@@ -200,6 +363,7 @@ class DoctorSenderClient:
         except ValueError as e:
             raise ValueError(f"Return count is not an integer: {drs_response.content}")
 
+        self.segment_validator.condition_removed(segment_id, field_name)
         return segment_count
 
     def delete_segment(self, segment_id: int):
@@ -215,6 +379,7 @@ class DoctorSenderClient:
 
         data = f"""<item xsi:type="xsd:int">{segment_id}</item>"""
         drs_response = self._post_request('dsSegmentsDel', data)
+        self.segment_validator.forget_segment(segment_id)
 
         # Response comes back as string 'true' or 'false', convert to boolean
         if drs_response.content == 'true':
@@ -254,14 +419,12 @@ class DoctorSenderClient:
             'segment_id', 'segment', 'user_list', 'country', 'send_date', 'reply_to', 'list_unsubscribe', 'bounceds_soft'
         """
 
-        available_fields = ["name", "amount", "subject", "from_name", "from_email", "sender", "segment_id",
-                            "segment", "user_list", "country", "send_date", "reply_to", "list_unsubscribe"]
         # "text", "html", "utm_source", "utm_medium", "utm_term", "utm_content", "utm_campaign"
 
         data = f"""
             <item xsi:type="xsd:int">{campaign_id}</item>
             <item SOAP-ENC:arrayType="xsd:string[3]" xsi:type="SOAP-ENC:Array">
-                {''.join(f'<item xsi:type="xsd:string">{field}</item>' for field in available_fields)}
+                {''.join(f'<item xsi:type="xsd:string">{field}</item>' for field in CAMPAIGN_FIELDS)}
             </item>
             <item xsi:type="xsd:int">1</item>
         """
@@ -291,41 +454,25 @@ class DoctorSenderClient:
         :param plain: Text template for the email
         :param template_id: int of the template (header and footer) to be used
         :param category_id: The category id, all categories with their id can be retrieved with dsCategoryGetAll
-        :param country: The iso3 country code for that mailing, can be retrieved with dsCountryGetAll
+        :param country: The iso3 country code for that mailing (in any case, it is sent upper case), can be retrieved
+            with dsCountryGetAll
         :param language_id: The language id, can be retrieved with dsLanguageGetAll
 
         :return: Int with the id of the new campaign
         """
-        # To avoid hard to catch 'SOAP-ENV:Client'-errors due to using non existing from_email or reply_to email address
-        available_emails = self.from_emails()
-        assert (from_email in available_emails) & (reply_to in available_emails), \
-            f"from_email and reply_to needs to be set up. Available emails: {available_emails}"
-
-        assert country in countries, "Country needs to be a valid iso-3 country code"
-        assert str(language_id) in languages.keys(), f"Get valid Language ids via DoctorSenderClient.dsLanguageGetAll()"
-        assert str(category_id) in categories.keys(), f"categoryid needs to be a valid Doctorsender category"
+        self._check_campaign_settings(from_email, reply_to, category_id, country, language_id, template_id,
+                                      list_unsubscribe)
+        data = ''.join(self._campaign_items(campaign_name, subject, from_name, from_email, reply_to, html, plain,
+                                            template_id, category_id, country, language_id, list_unsubscribe,
+                                            utm_campaign, utm_term, utm_content, footer_usub_link, mirror_link))
 
-        assert bool(template_id) | bool(list_unsubscribe), "Either template id or list unsubscribe need to be defined"
+        return self._new_campaign(data)
 
-        data = f"""
-            <item xsi:type="xsd:str"><![CDATA[{campaign_name}]]></item>
-            <item xsi:type="xsd:str"><![CDATA[{subject}]]></item>
-            <item xsi:type="xsd:str"><![CDATA[{from_name}]]></item>
-            <item xsi:type="xsd:str">{from_email}</item>
-            <item xsi:type="xsd:str">{reply_to}</item>
-            <item xsi:type="xsd:int">{category_id}</item>
-            <item xsi:type="xsd:str">{country}</item>
-            <item xsi:type="xsd:int">{language_id}</item>
-            <item xsi:type="xsd:str"><![CDATA[{html}]]></item>
-            <item xsi:type="xsd:str"><![CDATA[{plain}]]></item>
-            <item xsi:type="xsd:str">{list_unsubscribe}</item>
-            <item xsi:type="xsd:str">{utm_campaign}</item>
-            <item xsi:type="xsd:str">{utm_term}</item>
-            <item xsi:type="xsd:str">{utm_content}</item>
-            <item xsi:type="xsd:str">{footer_usub_link}</item>
-            <item xsi:type="xsd:str">{mirror_link}</item>
-            <item xsi:type="xsd:str">{template_id}</item>"""
+    def _new_campaign(self, data) -> int:
+        """Sends dsCampaignNew with the data built from _campaign_items (as string or encoded bytes)
 
+        :return: Int with the id of the new campaign
+        """
         drs_response = self._post_request('dsCampaignNew', data)
 
         try:
@@ -337,6 +484,46 @@ class DoctorSenderClient:
 
         return campaign_id
 
+    def _check_campaign_settings(self, from_email: str, reply_to: str, category_id: int, country: str,
+                                 language_id: int, template_id, list_unsubscribe: str, available_emails: list = None):
+        """Asserts that the settings of a new campaign are valid, see create_campaign"""
+        # To avoid hard to catch 'SOAP-ENV:Client'-errors due to using non existing from_email or reply_to email address
+        if available_emails is None:
+            available_emails = self.from_emails()
+        assert (from_email in available_emails) & (reply_to in available_emails), \
+            f"from_email and reply_to needs to be set up. Available emails: {available_emails}"
+
+        assert country in Countries.default(), "Country needs to be a valid iso-3 country code"
+        assert language_id in Languages.default(), f"Get valid Language ids via DoctorSenderClient.dsLanguageGetAll()"
+        assert category_id in Categories.default(), f"categoryid needs to be a valid Doctorsender category"
+
+        assert bool(template_id) | bool(list_unsubscribe), "Either template id or list unsubscribe need to be defined"
+
+    @staticmethod
+    def _campaign_items(campaign_name: str, subject: str, from_name: str, from_email: str, reply_to: str, html: str,
+                        plain: str, template_id: int = '', category_id: int = 1, country: str = 'DEU',
+                        language_id: int = 3, list_unsubscribe: str = '', utm_campaign: str = '', utm_term: str = '',
+                        utm_content: str = '', footer_usub_link: str = '', mirror_link: str = '') -> list:
+        """The dsCampaignNew parameters as list of xml items, html and plain are at CAMPAIGN_CONTENT_ITEMS"""
+        return [f"""
+            <item xsi:type="xsd:str"><![CDATA[{campaign_name}]]></item>""", f"""
+            <item xsi:type="xsd:str"><![CDATA[{subject}]]></item>""", f"""
+            <item xsi:type="xsd:str"><![CDATA[{from_name}]]></item>""", f"""
+            <item xsi:type="xsd:str">{from_email}</item>""", f"""
+            <item xsi:type="xsd:str">{reply_to}</item>""", f"""
+            <item xsi:type="xsd:int">{category_id}</item>""", f"""
+            <item xsi:type="xsd:str">{country.upper()}</item>""", f"""
+            <item xsi:type="xsd:int">{language_id}</item>""", f"""
+            <item xsi:type="xsd:str"><![CDATA[{html}]]></item>""", f"""
+            <item xsi:type="xsd:str"><![CDATA[{plain}]]></item>""", f"""
+            <item xsi:type="xsd:str">{list_unsubscribe}</item>""", f"""
+            <item xsi:type="xsd:str">{utm_campaign}</item>""", f"""
+            <item xsi:type="xsd:str">{utm_term}</item>""", f"""
+            <item xsi:type="xsd:str">{utm_content}</item>""", f"""
+            <item xsi:type="xsd:str">{footer_usub_link}</item>""", f"""
+            <item xsi:type="xsd:str">{mirror_link}</item>""", f"""
+            <item xsi:type="xsd:str">{template_id}</item>"""]
+
     def set_exclusion(self, campaign_id: int, campaigns_to_exclude: List[int]):
         data = f"""
             <item xsi:type="xsd:int">{campaign_id}</item>
@@ -408,7 +595,7 @@ class DoctorSenderClient:
         elif drs_response.content == 'false':
             sent = False
         else:
-            raise DrsSegmentError(f"Error while trying to send campaign {campaign_id}./n" /
+            raise DrsSegmentError(f"Error while trying to send campaign {campaign_id}.\n"
                                   f"Response message: {drs_response.content}")
 
         return sent
@@ -443,6 +630,8 @@ class DoctorSenderClient:
             # Doctorsender doesn't really expose their IP groups, so client facing it should always be 'default.'
             # Just to be sure, we will still take ip groups returned during the init call
             ip_group_name = self.ips
+        if not isinstance(multidate, str):
+            multidate = ','.join(date.strftime('%Y-%m-%d %H:%M:%S') for date in multidate)
 
         data = f"""
             <item xsi:type="xsd:int">{campaign_id}</item>
@@ -466,17 +655,13 @@ class DoctorSenderClient:
         if drs_response.content == 'true':
             sent = True
         else:
-            raise DrsSegmentError(f"Error while trying to send campaign {campaign_id}./n" /
+            raise DrsSegmentError(f"Error while trying to send campaign {campaign_id}.\n"
                                   f"Response message: {drs_response.content}")
 
         return sent
 
     def list_campaigns(self, sql_where: str, fields: list, get_statistics: bool = False) -> list:
-        available_fields = ["name", "amount", "subject", "from_name", "from_email", "sender", "html", "text",
-                            "reply_to", "list_unsubscribe", "speed", "send_date", "status", "user_list",
-                            "segment_id", "segment"]
-
-        assert all([True if field in available_fields else False for field in fields])
+        assert all([True if field in CAMPAIGN_LIST_FIELDS else False for field in fields])
 
         data = f"""
             <item xsi:type="xsd:str">{sql_where}</item>
@@ -485,24 +670,52 @@ class DoctorSenderClient:
             </item>
             <item xsi:type="xsd:int">{1 if get_statistics else 0}</item>
         """
-        drs_response = self._post_request('dsCampaignGetAll', data)
-
-        # The content does not follow the standard rules, so we parse it separatly
-        # First check if there is an error by calling the response property
-        _ = drs_response.content
-        # If that works without an en error, retrieve the items and parse it
-        try:
-            items = drs_response.dict['Envelope']['Body']['{ns1}webserviceResponse']['webserviceReturn'][1]['item'][
-                'value']
+        # The content does not follow the standard rules, it is reduced to a list of campaign dicts
+        drs_response = self._post_request('dsCampaignGetAll', data, records=True)
+        return drs_response.content
 
-            campaigns = [{i['item']['key']: i['item']['value'] for i in c['item']} for c in items]
-        except:
-            raise DrsReturnError(drs_response.content)
+    def campaigns(self, campaign_ids: list, fields: list = None, get_statistics: bool = True,
+                  chunk_size: int = 500) -> dict:
+        """Gets many campaigns at once, in chunks of dsCampaignGetAll calls instead of one dsCampaignGet per campaign
+
+        Fields that dsCampaignGetAll can not return (e.g. 'country') are fetched with one campaign() call per id, so
+        only ask for them if needed.
+
+        :param campaign_ids: List of campaign ids
+        :param fields: List of fields, defaults to the fields campaign() returns that dsCampaignGetAll can return
+        :param get_statistics: Bool, if True the statistics (opens, clicks, deliveries, ...) are included
+        :param chunk_size: Int, campaign ids per dsCampaignGetAll call
+        :return: Dict with the campaign id as key and a dict as returned by campaign() as value, campaigns that do not
+            exist are missing
+        """
+        if fields is None:
+            fields = [field for field in CAMPAIGN_FIELDS if field in CAMPAIGN_LIST_FIELDS]
+        fields = list(fields)
+        list_fields = [field for field in fields if field in CAMPAIGN_LIST_FIELDS]
+        # The name is always requested, the response can't be parsed without it
+        if 'name' not in list_fields:
+            list_fields.append('name')
+        missing_fields = [field for field in fields if field not in CAMPAIGN_LIST_FIELDS]
+
+        ids = list(dict.fromkeys(int(campaign_id) for campaign_id in campaign_ids))
+        campaigns = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            sql_where = f"id IN ({','.join(str(campaign_id) for campaign_id in chunk)})"
+            for campaign in self.list_campaigns(sql_where, list_fields, get_statistics=get_statistics):
+                campaigns[int(campaign['id'])] = campaign
+
+        if missing_fields:
+            for campaign_id, campaign in campaigns.items():
+                details = self.campaign(campaign_id)
+                campaign.update({field: details.get(field) for field in missing_fields})
 
         return campaigns
 
     def campaign_get_user_statistics(self, campaign_id: str, stats_type: str) -> list:
 
+        import json
+
         assert stats_type in  ["sent","openers","clickers","soft_bounced","hard_bounced","complaint","unsubscribe"]
 
         data = f"""
@@ -534,6 +747,8 @@ class DoctorSenderClient:
 
             :return:
             """
+            import json
+
             assert stats_type in  ["sent","openers","clickers","soft_bounced","hard_bounced","complaint","unsubscribe"]
 
             data = f"""
@@ -668,7 +883,8 @@ class DoctorSenderClient:
 
         Only all fields can be downloaded, since adding the line for is_testlist always returns "List cound now be found."
 
-        :return: A string containing the download link. This link can take a while to get active
+        :return: A string containing the download link. This link can take a while to get active, open_download
+            waits for it
         """
         data = f"""<item xsi:type="xsd:str">{list_name}</item>"""
 
@@ -676,6 +892,30 @@ class DoctorSenderClient:
 
         return drs_response.content
 
+    def open_download(self, link: str, timeout: float = 600, interval: float = 5):
+        """
+        Opens a link of download_list, download_hardbouncer or download_events, waiting for it to get active
+        >>> with client.open_download(client.download_list('list')) as response:
+        ...     lines = codecs.iterdecode(response.iter_lines(), 'utf-8')
+
+        :param link: String with the download link
+        :param timeout: Float, seconds to wait for the link to get active, the last error is raised after that
+        :param interval: Float, seconds between two attempts
+        :return: Streamed requests Response of the file, close it (or use it as context manager) when done
+        """
+        import requests
+
+        get = requests.get if self.session is None else self.session.get
+        deadline = time.monotonic() + timeout
+        while True:
+            response = get(link, stream=True, timeout=(10, 60))
+            if response.ok:
+                return response
+            response.close()
+            if time.monotonic() + interval > deadline:
+                response.raise_for_status()
+            time.sleep(interval)
+
     def download_hardbouncer(self, list_name: str, field: str = 'email') -> str:
         """
         Create a download link for a csv file that contains all hardbouncer in a given list.
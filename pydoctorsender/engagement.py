@@ -0,0 +1,135 @@
+"""
+Engagement of subscribers over many campaigns. Every email is interned once into an int id, the users of a campaign
+(openers, clickers, ...) are stored as sorted array of ids (4 bytes per user instead of a string per user and
+campaign) and counts over campaigns are computed over those arrays, with NumPy if it is installed.
+
+>>> index = EngagementIndex()
+>>> index.fetch(client, last_campaign_ids, stats_types=('openers', 'clickers'))
+>>> index.engaged('openers', at_least=2, last=10)  # opened at least 2 of the last 10 campaigns
+['a@example.com', ...]
+"""
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from .errors import DrsCampaignError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STATS_TYPES = ("sent", "openers", "clickers", "soft_bounced", "hard_bounced", "complaint", "unsubscribe")
+
+
+class EngagementIndex:
+    def __init__(self, use_numpy: bool = None):
+        """
+        :param use_numpy: Bool, defaults to True if NumPy is installed
+        """
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        # Campaign ids in the order they were added, oldest first
+        self.campaigns = []
+        self._ids = {}
+        self._emails = []
+        self._users = {}
+
+    def __len__(self) -> int:
+        """The number of distinct emails"""
+        return len(self._emails)
+
+    def _intern(self, email: str) -> int:
+        email = email.strip().lower()
+        email_id = self._ids.get(email)
+        if email_id is None:
+            email_id = self._ids[email] = len(self._emails)
+            self._emails.append(email)
+        return email_id
+
+    def add(self, campaign_id: int, stats_type: str, emails: list):
+        """
+        Adds the users of a campaign, add campaigns oldest first so 'last' in the queries means the latest campaigns
+
+        :param campaign_id: Int with the campaign id
+        :param stats_type: String, one of STATS_TYPES
+        :param emails: Iterable of emails, as returned by DoctorSenderClient.campaign_get_user_statistics
+        """
+        assert stats_type in STATS_TYPES, f"stats_type needs to be one of {STATS_TYPES}"
+        campaign_id = int(campaign_id)
+        if campaign_id not in self.campaigns:
+            self.campaigns.append(campaign_id)
+        self._users[(campaign_id, stats_type)] = array('I', sorted({self._intern(email) for email in emails}))
+
+    def fetch(self, client, campaign_ids: list, stats_types=('openers', 'clickers', 'hard_bounced'),
+              max_workers: int = 8):
+        """
+        Fetches and adds the users of campaigns, the calls run concurrently
+
+        :param client: DoctorSenderClient
+        :param campaign_ids: List of campaign ids, oldest first
+        :param stats_types: Iterable of STATS_TYPES to fetch per campaign
+        :param max_workers: Int, maximum of concurrent calls
+        """
+        calls = [(int(campaign_id), stats_type) for campaign_id in campaign_ids for stats_type in stats_types]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Results are consumed in order, so campaigns are added oldest first while later ones are still loading
+            for (campaign_id, stats_type), emails in zip(calls, executor.map(
+                    lambda call: client.campaign_get_user_statistics(*call), calls)):
+                self.add(campaign_id, stats_type, emails)
+
+    def users(self, campaign_id: int, stats_type: str) -> array:
+        """
+        :return: Sorted array of the email ids of a campaign
+        """
+        try:
+            return self._users[(int(campaign_id), stats_type)]
+        except KeyError:
+            raise DrsCampaignError(f"The {stats_type} of campaign {campaign_id} were not added to the index")
+
+    def _select(self, last: int = None, campaigns: list = None) -> list:
+        if campaigns is not None:
+            return [int(campaign_id) for campaign_id in campaigns]
+        return self.campaigns[-last:] if last else list(self.campaigns)
+
+    def counts(self, stats_type: str, last: int = None, campaigns: list = None):
+        """
+        :param stats_type: String, one of STATS_TYPES
+        :param last: Int, only count the last n campaigns
+        :param campaigns: List of campaign ids to count, instead of last
+        :return: Array with the number of campaigns per email id
+        """
+        users = [self.users(campaign_id, stats_type) for campaign_id in self._select(last, campaigns)]
+        if self.use_numpy:
+            ids = np.concatenate([np.frombuffer(u, dtype=np.uintc) for u in users]) if users else \
+                np.empty(0, dtype=np.uintc)
+            return np.bincount(ids, minlength=len(self._emails))
+
+        counts = array('I', bytes(4 * len(self._emails)))
+        for campaign_users in users:
+            for email_id in campaign_users:
+                counts[email_id] += 1
+        return counts
+
+    def engaged(self, stats_type: str = 'openers', at_least: int = 1, last: int = None,
+                campaigns: list = None) -> list:
+        """
+        :param stats_type: String, one of STATS_TYPES
+        :param at_least: Int, minimum number of campaigns
+        :param last: Int, only count the last n campaigns
+        :param campaigns: List of campaign ids to count, instead of last
+        :return: List of emails with stats_type in at least at_least of the campaigns, e.g. to build a segment
+        """
+        counts = self.counts(stats_type, last, campaigns)
+        if self.use_numpy:
+            return [self._emails[i] for i in np.flatnonzero(counts >= at_least)]
+        return [self._emails[i] for i, count in enumerate(counts) if count >= at_least]
+
+    def inactive(self, stats_type: str = 'openers', last: int = None, campaigns: list = None) -> list:
+        """
+        :return: List of emails that were sent at least one of the campaigns but never had stats_type in them, needs
+            the 'sent' users of the campaigns
+        """
+        sent = self.counts('sent', last, campaigns)
+        engaged = self.counts(stats_type, last, campaigns)
+        if self.use_numpy:
+            return [self._emails[i] for i in np.flatnonzero((sent > 0) & (engaged == 0))]
+        return [self._emails[i] for i, (s, e) in enumerate(zip(sent, engaged)) if s and not e]
@@ -27,3 +27,37 @@ class DrsCampaignError(Error):
 class DrsParserError(Error):
     """Raised when the Doctorsender Response can not be parsed."""
     pass
+
+
+class DrsCircuitOpenError(Error):
+    """Raised without calling Doctorsender when the circuit breaker for the method group is open."""
+    def __init__(self, group, retry_after):
+        self.group = group
+        self.retry_after = retry_after
+        super().__init__(group, retry_after)
+
+    def __str__(self):
+        return f"Circuit for {self.group} methods is open after repeated failures, retry in {self.retry_after:.1f}s"
+
+
+class DrsJobError(Error):
+    """Raised for jobs of a JobQueue that failed in an earlier run or can not run because a job they depend on failed."""
+    pass
+
+
+class DrsScheduleError(Error):
+    """Raised when a send can not be scheduled before its deadline without exceeding the capacity of its ip group."""
+    pass
+
+
+class DrsResponseTooLargeError(Error):
+    """Raised when a response exceeds the byte or item limit of its method, the rest of the response is not read."""
+    def __init__(self, method, limit, unit, hint):
+        self.method = method
+        self.limit = limit
+        self.unit = unit
+        self.hint = hint
+        super().__init__(method, limit, unit, hint)
+
+    def __str__(self):
+        return f"The response of {self.method} exceeded {self.limit} {self.unit} and was aborted, {self.hint}"
@@ -0,0 +1,438 @@
+"""
+Local evaluation of segment conditions against a downloaded list, so segments can be tuned offline and only the final
+one is created in Doctorsender. The list is held column by column and conditions are evaluated as whole-column masks
+(cached per condition), so counts and overlaps come back in milliseconds. Columns and masks are NumPy arrays if NumPy
+is installed (pip install pydoctorsender[numpy]), otherwise columns are lists and masks are ints with one bit per user.
+
+>>> data = ListData.download(client, 'example_list')
+>>> evaluator = SegmentEvaluator(data)
+>>> evaluator.count([('country', '==', 'DEU'), ('email', 'like', '%@gmail.com')])
+18234
+>>> evaluator.define('germany', [('country', '==', 'DEU')])
+>>> evaluator.overlap('germany', [('age', '>=', 30)])
+{'a': 51230, 'b': 80211, 'both': 30122, 'either': 101319, 'jaccard': 0.297}
+
+Conditions are (field, comparator, value) or (field, comparator, value, is_or) tuples using the comparators of
+DoctorSenderClient.segment_add_condition. For the 'segment' comparator the value is the name of a segment defined with
+define(), is_or combines it with OR instead of AND, as in Doctorsender.
+"""
+import codecs
+import csv
+import datetime as dt
+import operator
+import re
+
+from .errors import DrsSegmentError
+from .segmentation import COMPARATORS, _base_type, _date_types, _number_types
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_date_re = re.compile(r'^\d{4}-\d{2}-\d{2}')
+_operators = {'<': operator.lt, '>': operator.gt, '==': operator.eq, '!=': operator.ne, '<=': operator.le,
+              '>=': operator.ge}
+
+
+def _typed_column(values: list, field_type: str = None):
+    """
+    Converts a column of strings to a float, datetime64 or str array, inferring the type if it is not given. Cells of a
+    typed column that can't be converted (e.g. 'n/a' or MySQL's zero date 0000-00-00) become nan or NaT, which like
+    empty cells never match a condition.
+    """
+    column = np.array(values, dtype=object)
+    field_type = _base_type(field_type) if field_type else None
+
+    if field_type in _number_types or field_type is None:
+        try:
+            return np.where(column == '', 'nan', column).astype(float)
+        except ValueError:
+            if field_type is not None:
+                return np.array([_float_or_nan(v) for v in values], dtype=float)
+    if field_type in _date_types or field_type is None:
+        sample = next((v for v in values if v), '')
+        if field_type is not None or _date_re.match(sample):
+            try:
+                return column.astype('datetime64[s]')
+            except ValueError:
+                if field_type is not None:
+                    return np.array([_datetime64_or_nat(v) for v in values], dtype='datetime64[s]')
+    return column.astype(str)
+
+
+def _float_or_nan(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def _datetime64_or_nat(value: str):
+    try:
+        return np.datetime64(value, 's')
+    except ValueError:
+        return np.datetime64('NaT', 's')
+
+
+def _datetime(value):
+    """A date, datetime or ISO string as datetime"""
+    if isinstance(value, dt.datetime):
+        return value
+    if isinstance(value, dt.date):
+        return dt.datetime.combine(value, dt.time())
+    return dt.datetime.fromisoformat(str(value).replace('T', ' '))
+
+
+def _typed_list(values: list, field_type: str = None) -> list:
+    """
+    The same as _typed_column without NumPy: floats (nan if empty or invalid), datetimes (None if empty or invalid) or
+    strings
+    """
+    field_type = _base_type(field_type) if field_type else None
+
+    if field_type in _number_types or field_type is None:
+        try:
+            return [float(v) if v != '' else float('nan') for v in values]
+        except ValueError:
+            if field_type is not None:
+                return [_float_or_nan(v) for v in values]
+    if field_type in _date_types or field_type is None:
+        sample = next((v for v in values if v), '')
+        if field_type is not None or _date_re.match(sample):
+            try:
+                return [_datetime(v) if v != '' else None for v in values]
+            except ValueError:
+                if field_type is not None:
+                    return [_datetime_or_none(v) for v in values]
+    return list(values)
+
+
+def _datetime_or_none(value: str):
+    try:
+        return _datetime(value)
+    except ValueError:
+        return None
+
+
+def _kind(column) -> str:
+    """NumPy dtype kind of a column: 'f' for numbers, 'M' for dates, 'U' for text"""
+    if np is not None and isinstance(column, np.ndarray):
+        return column.dtype.kind
+    value = next((v for v in column if v is not None), None)
+    if isinstance(value, float):
+        return 'f'
+    # Only date columns hold None, a column of only None is a date column without dates
+    if isinstance(value, dt.datetime) or (value is None and len(column)):
+        return 'M'
+    return 'U'
+
+
+def _operand(kind: str, value):
+    """The value of a condition in the type of the column"""
+    if kind == 'f':
+        return float(value)
+    if kind == 'M':
+        return np.datetime64(value, 's') if np is not None else _datetime(value)
+    return str(value)
+
+
+def _like_regex(pattern: str):
+    """SQL LIKE pattern to a compiled regex, case-insensitive as in MySQL"""
+    regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.compile(f'^{regex}$', re.IGNORECASE | re.DOTALL)
+
+
+def _bits(flags) -> int:
+    """Iterable of bools to an int mask, bit i is set if the i-th flag is true"""
+    return int(''.join(map('01'.__getitem__, flags))[::-1] or '0', 2)
+
+
+def _count_bits(mask: int) -> int:
+    return bin(mask).count('1')
+
+
+class ListData:
+    """A list export held column by column"""
+
+    def __init__(self, columns: dict, use_numpy: bool = None):
+        """
+        :param columns: Dict with field name as key and a NumPy array (or a list without NumPy) as value, all of the
+            same length
+        :param use_numpy: Bool, whether the columns are NumPy arrays, defaults to True if NumPy is installed
+        """
+        self.columns = columns
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self._uniques = {}
+        self._lowered = {}
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, field: str):
+        try:
+            return self.columns[field]
+        except KeyError:
+            raise DrsSegmentError(f"The field {field} does not exist in the list, available fields: "
+                                  f"{', '.join(self.columns)}")
+
+    def unique(self, field: str) -> tuple:
+        """
+        :return: Tuple of (unique values, inverse indices) of a column, computed once
+        """
+        if field not in self._uniques:
+            if self.use_numpy:
+                self._uniques[field] = np.unique(self[field], return_inverse=True)
+            else:
+                positions = {}
+                inverse = [positions.setdefault(value, len(positions)) for value in self[field]]
+                self._uniques[field] = list(positions), inverse
+        return self._uniques[field]
+
+    def lowered(self, field: str):
+        """
+        :return: The column as lower case str array, computed once
+        """
+        if field not in self._lowered:
+            if self.use_numpy:
+                self._lowered[field] = np.char.lower(self[field].astype(str))
+            else:
+                self._lowered[field] = [str(value).lower() for value in self[field]]
+        return self._lowered[field]
+
+    @classmethod
+    def from_csv(cls, lines, delimiter: str = None, types: dict = None, use_numpy: bool = None) -> 'ListData':
+        """
+        :param lines: Iterable of text lines (e.g. an open file), the first one being the header
+        :param delimiter: String, detected from the header if not given
+        :param types: Dict with field name as key and Doctorsender field type as value (see get_list_fields), types of
+            other fields are inferred
+        :param use_numpy: Bool, defaults to True if NumPy is installed
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ImportError("use_numpy needs NumPy, install it with 'pip install pydoctorsender[numpy]'")
+        lines = iter(lines)
+        header = next(lines, '')
+        if delimiter is None:
+            delimiter = max(',;\t|', key=header.count)
+        fields = next(csv.reader([header], delimiter=delimiter))
+
+        values = [[] for _ in fields]
+        appenders = [v.append for v in values]
+        for row in csv.reader(lines, delimiter=delimiter):
+            if not row:
+                continue
+            for append, value in zip(appenders, row):
+                append(value)
+            # Short rows are padded, so all columns stay aligned
+            for append in appenders[len(row):]:
+                append('')
+
+        types = types or {}
+        typed = _typed_column if use_numpy else _typed_list
+        return cls({field: typed(column, types.get(field)) for field, column in zip(fields, values)}, use_numpy)
+
+    @classmethod
+    def download(cls, client, list_name: str, use_schema: bool = True, timeout: float = 600,
+                 use_numpy: bool = None) -> 'ListData':
+        """
+        Requests the export of a list and streams it into a ListData
+
+        :param client: DoctorSenderClient
+        :param list_name: String with the list name
+        :param use_schema: Bool, if True column types are taken from get_list_fields instead of being inferred
+        :param timeout: Float, seconds to wait for the export to get ready
+        :param use_numpy: Bool, defaults to True if NumPy is installed
+        """
+        types = client.segment_validator.fields(list_name) if use_schema else None
+        link = client.download_list(list_name)
+        with client.open_download(link, timeout=timeout) as response:
+            return cls.from_csv(codecs.iterdecode(response.iter_lines(), 'utf-8'), types=types, use_numpy=use_numpy)
+
+
+class SegmentEvaluator:
+    def __init__(self, data: ListData):
+        """
+        :param data: ListData with the users of the list
+        """
+        self.data = data
+        self.segments = {}
+        self._masks = {}
+
+    def define(self, name: str, conditions: list):
+        """Defines a named segment, to be used as value of the 'segment' comparator and in overlap()"""
+        self.segments[name] = [tuple(c) for c in conditions]
+        # Masks of segment conditions may depend on the redefined segment
+        self._masks = {key: mask for key, mask in self._masks.items() if key[1] != 'segment'}
+
+    def _condition_mask(self, field: str, comparator: str, value):
+        key = (field, comparator, str(value))
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+
+        if comparator not in COMPARATORS:
+            raise DrsSegmentError(f"Comparator must be in {{{', '.join(COMPARATORS)}}}")
+
+        if comparator == 'segment':
+            mask = self.mask(self.segments[value])
+        elif self.data.use_numpy:
+            mask = self._numpy_mask(field, comparator, value)
+        else:
+            mask = self._int_mask(field, comparator, value)
+
+        self._masks[key] = mask
+        return mask
+
+    def _numpy_mask(self, field: str, comparator: str, value):
+        if comparator in ('like', 'not like'):
+            pattern = str(value)
+            inner = pattern.strip('%')
+            if '_' not in pattern and '%' not in inner:
+                # Plain prefix, suffix or substring patterns run as vectorized string operations
+                column, inner = self.data.lowered(field), inner.lower()
+                if pattern.startswith('%') and pattern.endswith('%') and len(pattern) > 1:
+                    mask = np.char.find(column, inner) >= 0
+                elif pattern.startswith('%'):
+                    mask = np.char.endswith(column, inner)
+                elif pattern.endswith('%'):
+                    mask = np.char.startswith(column, inner)
+                else:
+                    mask = column == inner
+            else:
+                # The regex only runs once per distinct value, which makes low-cardinality fields cheap
+                uniques, inverse = self.data.unique(field)
+                regex = _like_regex(pattern)
+                matches = np.fromiter((bool(regex.match(str(u))) for u in uniques), dtype=bool, count=len(uniques))
+                mask = matches[inverse]
+            if comparator == 'not like':
+                mask = ~mask
+            return mask
+
+        column = self.data[field]
+        kind = column.dtype.kind
+        if comparator in ('in', 'not in'):
+            values = [v.strip() for v in str(value).split(',')] if isinstance(value, str) else list(value)
+            mask = np.isin(column, [_operand(kind, v) for v in values])
+            if comparator == 'not in':
+                mask = ~mask
+        else:
+            operand = _operand(kind, value)
+            mask = {'<': np.less, '>': np.greater, '==': np.equal, '!=': np.not_equal,
+                    '<=': np.less_equal, '>=': np.greater_equal}[comparator](column, operand)
+        # Like NULL in SQL, empty values never match
+        if kind == 'f':
+            mask &= ~np.isnan(column)
+        elif kind == 'M':
+            mask &= ~np.isnat(column)
+        return mask
+
+    def _int_mask(self, field: str, comparator: str, value) -> int:
+        if comparator in ('like', 'not like'):
+            pattern = str(value)
+            inner = pattern.strip('%')
+            if '_' not in pattern and '%' not in inner:
+                column, inner = self.data.lowered(field), inner.lower()
+                if pattern.startswith('%') and pattern.endswith('%') and len(pattern) > 1:
+                    mask = _bits(inner in v for v in column)
+                elif pattern.startswith('%'):
+                    mask = _bits(v.endswith(inner) for v in column)
+                elif pattern.endswith('%'):
+                    mask = _bits(v.startswith(inner) for v in column)
+                else:
+                    mask = _bits(v == inner for v in column)
+            else:
+                uniques, inverse = self.data.unique(field)
+                regex = _like_regex(pattern)
+                matches = [bool(regex.match(str(u))) for u in uniques]
+                mask = _bits(matches[i] for i in inverse)
+            if comparator == 'not like':
+                mask ^= (1 << len(self.data)) - 1
+            return mask
+
+        column = self.data[field]
+        kind = _kind(column)
+        # Like NULL in SQL, empty values (nan and None) never match
+        if comparator in ('in', 'not in'):
+            values = [v.strip() for v in str(value).split(',')] if isinstance(value, str) else list(value)
+            operands = {_operand(kind, v) for v in values}
+            keep = comparator == 'in'
+            return _bits(v is not None and v == v and (v in operands) == keep for v in column)
+        compare, operand = _operators[comparator], _operand(kind, value)
+        return _bits(v is not None and v == v and compare(v, operand) for v in column)
+
+    def mask(self, conditions: list):
+        """
+        :param conditions: List of condition tuples
+        :return: Bool array (int with one bit per user without NumPy), True for the users in the segment
+        """
+        if self.data.use_numpy:
+            mask = np.ones(len(self.data), dtype=bool)
+        else:
+            mask = (1 << len(self.data)) - 1
+        alternatives = []
+        for condition in conditions:
+            field, comparator, value = condition[:3]
+            is_or = len(condition) > 3 and condition[3]
+            condition_mask = self._condition_mask(field, comparator, value)
+            if comparator == 'segment' and is_or:
+                alternatives.append(condition_mask)
+            else:
+                mask = mask & condition_mask
+        for alternative in alternatives:
+            mask = mask | alternative
+        return mask
+
+    def _resolve(self, segment):
+        return self.mask(self.segments[segment] if isinstance(segment, str) else segment)
+
+    def _count(self, mask) -> int:
+        return int(np.count_nonzero(mask)) if self.data.use_numpy else _count_bits(mask)
+
+    def count(self, segment) -> int:
+        """
+        :param segment: String with the name of a defined segment or a list of condition tuples
+        :return: Int with the number of users in the segment
+        """
+        return self._count(self._resolve(segment))
+
+    def overlap(self, a, b) -> dict:
+        """
+        :param a: String with the name of a defined segment or a list of condition tuples
+        :param b: String with the name of a defined segment or a list of condition tuples
+        :return: Dict with the size of a, b, their intersection (both), their union (either) and the jaccard index
+        """
+        mask_a, mask_b = self._resolve(a), self._resolve(b)
+        both = self._count(mask_a & mask_b)
+        either = self._count(mask_a | mask_b)
+        return {'a': self._count(mask_a),
+                'b': self._count(mask_b),
+                'both': both,
+                'either': either,
+                'jaccard': both / either if either else 0.0}
+
+    def overlaps(self, names: list = None) -> dict:
+        """
+        :param names: List of defined segment names, defaults to all
+        :return: Dict with (name, name) as key and the number of users in both segments as value
+        """
+        names = list(self.segments) if names is None else names
+        if not self.data.use_numpy:
+            masks = [self._resolve(name) for name in names]
+            return {(a, b): _count_bits(masks[i] & masks[j]) for i, a in enumerate(names) for j, b in enumerate(names)}
+        masks = np.stack([self._resolve(name) for name in names]).astype(np.int32)
+        # One matrix product gives all pairwise intersections at once
+        matrix = masks @ masks.T
+        return {(a, b): int(matrix[i, j]) for i, a in enumerate(names) for j, b in enumerate(names)}
+
+    def users(self, segment, field: str = 'email'):
+        """
+        :return: Array (list without NumPy) with the field values (emails by default) of the users in the segment
+        """
+        mask = self._resolve(segment)
+        if self.data.use_numpy:
+            return self.data[field][mask]
+        column = self.data[field]
+        return [column[i] for i, bit in enumerate(bin(mask)[:1:-1]) if bit == '1']
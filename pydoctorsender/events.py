@@ -0,0 +1,346 @@
+"""
+A local, append-only store for user activity (download_events exports, get_unsubscribers results), so questions like
+"what did this email do last quarter" are answered from disk instead of exporting everything again.
+
+Events are partitioned by day (one directory per day). Every append writes new blocks, a block holds up to block_size
+events column by column (timestamps delta encoded, low-cardinality columns dictionary encoded, every column zlib
+compressed). Appends are streamed: a day's block is written as soon as it is full, so at most one block per day is
+held in memory. Each partition has an index of the blocks every email and campaign appears in, so queries by email or
+campaign only decode the blocks that contain them, and of the sources appended to it, so an import that was cut off
+is completed by running it again.
+
+>>> store = EventStore('events')
+>>> store.download(client, dt.date(2020, 1, 1), dt.date(2020, 1, 31))
+>>> store.append_unsubscribers(client.get_unsubscribers('example_list', start, end))
+>>> list(store.query(email='a@example.com', start=dt.datetime(2020, 1, 1), end=dt.datetime(2020, 4, 1)))
+[{'timestamp': datetime.datetime(2020, 1, 3, 8, 12), 'email': 'a@example.com', 'campaign_id': 4711,
+  'event': 'open', 'list': 'example_list'}, ...]
+"""
+import codecs
+import csv
+import datetime as dt
+import gzip
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import OrderedDict
+
+COLUMNS = ('timestamp', 'email', 'campaign_id', 'event', 'list')
+
+# Header names the columns of an event export may have, the first one found is used
+EXPORT_COLUMNS = {'timestamp': ('timestamp', 'datetime', 'date', 'created_at', 'fecha'),
+                  'email': ('email', 'mail'),
+                  'campaign_id': ('campaign_id', 'id_campaign', 'idcampaign', 'campaign', 'id_envio'),
+                  'event': ('event', 'type', 'action', 'tipo'),
+                  'list': ('list', 'list_name', 'listname', 'lista')}
+
+_magic = b'DRSE\x01'
+_uint = struct.Struct('<I')
+_epoch = dt.datetime(1970, 1, 1)
+_timestamp_formats = ('%Y%m%d%H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y')
+
+
+def _to_timestamp(value) -> int:
+    """Seconds since the epoch, datetimes are taken as they are (Doctorsender local time)"""
+    if isinstance(value, dt.datetime):
+        return int((value.replace(tzinfo=None) - _epoch).total_seconds())
+    if isinstance(value, dt.date):
+        return int((dt.datetime.combine(value, dt.time()) - _epoch).total_seconds())
+    try:
+        # Fast path for the usual 'YYYY-MM-DD HH:MM:SS'
+        return int((dt.datetime.fromisoformat(value).replace(tzinfo=None) - _epoch).total_seconds())
+    except ValueError:
+        pass
+    for timestamp_format in _timestamp_formats:
+        try:
+            return int((dt.datetime.strptime(value, timestamp_format) - _epoch).total_seconds())
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown timestamp format: {value!r}")
+
+
+def _int_column(values) -> bytes:
+    column = array('q', values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_int_column(data: bytes) -> array:
+    column = array('q')
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def _encode_block(events: list) -> bytes:
+    """events is a list of (timestamp, email, campaign_id, event, list) tuples sorted by timestamp"""
+    timestamps = [e[0] for e in events]
+    deltas = [timestamps[0]] + [b - a for a, b in zip(timestamps, timestamps[1:])] if events else []
+    payloads = [_int_column(deltas),
+                '\x00'.join(e[1] for e in events).encode('utf-8'),
+                _int_column(e[2] for e in events)]
+    for i in (3, 4):
+        # Event types and list names repeat a lot, they are stored once per block with a code per event
+        values = list(dict.fromkeys(e[i] for e in events))
+        codes = {value: code for code, value in enumerate(values)}
+        payloads.append(_uint.pack(len(values)) + '\x00'.join(values).encode('utf-8') +
+                        array('H', (codes[e[i]] for e in events)).tobytes())
+
+    parts = [_magic, _uint.pack(len(events))]
+    for payload in payloads:
+        compressed = zlib.compress(payload, 6)
+        parts += [_uint.pack(len(compressed)), compressed]
+    return b''.join(parts)
+
+
+def _decode_block(data: bytes) -> list:
+    if data[:len(_magic)] != _magic:
+        raise ValueError("Not an event block")
+    offset = len(_magic)
+    rows, = _uint.unpack_from(data, offset)
+    offset += _uint.size
+    payloads = []
+    for _ in COLUMNS:
+        length, = _uint.unpack_from(data, offset)
+        offset += _uint.size
+        payloads.append(zlib.decompress(data[offset:offset + length]))
+        offset += length
+    if not rows:
+        return []
+
+    timestamps, total = [], 0
+    for delta in _read_int_column(payloads[0]):
+        total += delta
+        timestamps.append(total)
+    emails = payloads[1].decode('utf-8').split('\x00')
+    campaign_ids = _read_int_column(payloads[2])
+    dictionary_columns = []
+    for payload in payloads[3:]:
+        values = payload[_uint.size:len(payload) - 2 * rows].decode('utf-8').split('\x00')
+        codes = array('H')
+        codes.frombytes(payload[len(payload) - 2 * rows:])
+        dictionary_columns.append([values[code] for code in codes])
+    return list(zip(timestamps, emails, campaign_ids, *dictionary_columns))
+
+
+class EventStore:
+    def __init__(self, path: str, block_size: int = 65536, cached_indexes: int = 64):
+        """
+        :param path: String with the directory of the store, created if it does not exist
+        :param block_size: Int, maximum events per block
+        :param cached_indexes: Int, maximum partition indexes kept in memory for queries
+        """
+        self.path = path
+        self.block_size = block_size
+        self.cached_indexes = cached_indexes
+        # Events skipped by append because they could not be read, e.g. an unknown timestamp format
+        self.skipped = 0
+        os.makedirs(path, exist_ok=True)
+        self._indexes = OrderedDict()
+        self._manifest_path = os.path.join(path, 'manifest.json')
+        try:
+            with open(self._manifest_path) as f:
+                self.sources = set(json.load(f))
+        except FileNotFoundError:
+            self.sources = set()
+
+    def partitions(self) -> list:
+        """
+        :return: Sorted list of the days (dt.date) in the store
+        """
+        return sorted(dt.date.fromisoformat(name) for name in os.listdir(self.path)
+                      if os.path.isdir(os.path.join(self.path, name)))
+
+    def _partition_path(self, day: dt.date) -> str:
+        return os.path.join(self.path, day.isoformat())
+
+    def _read_index(self, day: dt.date) -> dict:
+        try:
+            with gzip.open(os.path.join(self._partition_path(day), 'index.json.gz'), 'rt') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {'blocks': 0, 'emails': {}, 'campaigns': {}}
+        # Indexes written before sources were recorded per partition
+        index.setdefault('sources', [])
+        return index
+
+    def _index(self, day: dt.date) -> dict:
+        """The index of a partition for queries, the least recently used ones are dropped beyond cached_indexes"""
+        index = self._indexes.get(day)
+        if index is None:
+            index = self._indexes[day] = self._read_index(day)
+            if len(self._indexes) > self.cached_indexes:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(day)
+        return index
+
+    def _write_index(self, day: dt.date, index: dict):
+        path = os.path.join(self._partition_path(day), 'index.json.gz')
+        with gzip.open(f'{path}.tmp', 'wt') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(f'{path}.tmp', path)
+
+    def _write_block(self, day: dt.date, index: dict, rows: list):
+        rows.sort()
+        block = index['blocks']
+        block_path = os.path.join(self._partition_path(day), f'{block:06d}.blk')
+        with open(f'{block_path}.tmp', 'wb') as f:
+            f.write(_encode_block(rows))
+        os.replace(f'{block_path}.tmp', block_path)
+        for key, values in (('emails', {r[1] for r in rows}), ('campaigns', {str(r[2]) for r in rows if r[2]})):
+            for value in values:
+                index[key].setdefault(value, []).append(block)
+        index['blocks'] = block + 1
+
+    def append(self, events, source: str = None) -> int:
+        """
+        Appends events, each partition they fall into gets new blocks. Events that can't be read (e.g. an unknown
+        timestamp format) are skipped and counted in skipped.
+
+        :param events: Iterable of dicts with the keys timestamp (datetime or string), email, and optionally
+            campaign_id, event and list
+        :param source: Optional string identifying the export (e.g. 'events:2020-01-01:2020-01-31'), a source that
+            was already appended is skipped, so re-running an import doesn't duplicate events. Partitions record
+            their sources as well: if an import was cut off, running it again only appends to the partitions it had
+            not finished.
+        :return: Int with the number of events appended
+        """
+        if source is not None and source in self.sources:
+            return 0
+
+        # Index and buffered rows of every partition the events fall into, None for partitions that have the source
+        partitions = {}
+        appended = 0
+        for event in events:
+            try:
+                timestamp = _to_timestamp(event['timestamp'])
+                row = (timestamp, event['email'].strip().lower(), int(event.get('campaign_id') or 0),
+                       str(event.get('event') or ''), str(event.get('list') or ''))
+            except (AttributeError, TypeError, ValueError):
+                self.skipped += 1
+                continue
+            day = (_epoch + dt.timedelta(seconds=timestamp)).date()
+            if day not in partitions:
+                index = self._read_index(day)
+                partitions[day] = None if source in index['sources'] else (index, [])
+            if partitions[day] is None:
+                continue
+            index, rows = partitions[day]
+            rows.append(row)
+            appended += 1
+            if len(rows) == self.block_size:
+                os.makedirs(self._partition_path(day), exist_ok=True)
+                self._write_block(day, index, rows)
+                partitions[day] = (index, [])
+
+        for day, partition in partitions.items():
+            if partition is None:
+                continue
+            index, rows = partition
+            os.makedirs(self._partition_path(day), exist_ok=True)
+            if rows:
+                self._write_block(day, index, rows)
+            if source is not None:
+                index['sources'].append(source)
+            # Blocks that are not in the index yet are ignored by queries (and overwritten by the next append), the
+            # index is written last
+            self._write_index(day, index)
+            self._indexes.pop(day, None)
+
+        if source is not None:
+            self.sources.add(source)
+            with open(f'{self._manifest_path}.tmp', 'w') as f:
+                json.dump(sorted(self.sources), f)
+            os.replace(f'{self._manifest_path}.tmp', self._manifest_path)
+        return appended
+
+    def append_unsubscribers(self, unsubscribers: list, source: str = None) -> int:
+        """
+        :param unsubscribers: List as returned by DoctorSenderClient.get_unsubscribers
+        :return: Int with the number of events appended
+        """
+        return self.append(({'timestamp': u['timestamp'], 'email': u['email'], 'event': 'unsubscribe',
+                             'list': u['list']} for u in unsubscribers), source=source)
+
+    def append_export(self, lines, delimiter: str = None, columns: dict = None, source: str = None) -> int:
+        """
+        :param lines: Iterable of text lines of an event export, the first one being the header
+        :param delimiter: String, detected from the header if not given
+        :param columns: Dict mapping COLUMNS to header names, detected with EXPORT_COLUMNS if not given
+        :return: Int with the number of events appended
+        """
+        lines = iter(lines)
+        header = next(lines, '')
+        if delimiter is None:
+            delimiter = max(',;\t|', key=header.count)
+        names = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+        if columns is None:
+            columns = {column: next((name for name in candidates if name in names), None)
+                       for column, candidates in EXPORT_COLUMNS.items()}
+        if not columns.get('timestamp') or not columns.get('email'):
+            raise ValueError(f"The export needs a timestamp and an email column, found: {', '.join(names)}")
+        positions = {column: names.index(name.lower()) for column, name in columns.items() if name}
+
+        def events():
+            for row in csv.reader(lines, delimiter=delimiter):
+                if len(row) == len(names):
+                    yield {column: row[position] for column, position in positions.items()}
+
+        return self.append(events(), source=source)
+
+    def download(self, client, from_date: dt.date, until_date: dt.date, timeout: float = 600) -> int:
+        """
+        Requests an event export and streams it into the store, an export that was already stored is skipped
+
+        :param timeout: Float, seconds to wait for the export to get ready
+        :return: Int with the number of events appended
+        """
+        source = f'events:{from_date}:{until_date}'
+        if source in self.sources:
+            return 0
+        link = client.download_events(from_date, until_date)
+        with client.open_download(link, timeout=timeout) as response:
+            return self.append_export(codecs.iterdecode(response.iter_lines(), 'utf-8'), source=source)
+
+    def query(self, start: dt.datetime = None, end: dt.datetime = None, email: str = None, campaign_id: int = None,
+              event: str = None):
+        """
+        :param start: Optional datetime, events at or after it
+        :param end: Optional datetime, events before it
+        :param email: Optional string, only events of this email
+        :param campaign_id: Optional int, only events of this campaign
+        :param event: Optional string, only events of this type
+        :return: Generator of event dicts in time order per day
+        """
+        start_ts = _to_timestamp(start) if start is not None else None
+        end_ts = _to_timestamp(end) if end is not None else None
+        email = email.strip().lower() if email is not None else None
+
+        for day in self.partitions():
+            day_start = _to_timestamp(day)
+            if (end_ts is not None and day_start >= end_ts) or (start_ts is not None and day_start + 86400 <= start_ts):
+                continue
+            index = self._index(day)
+            blocks = set(range(index['blocks']))
+            if email is not None:
+                blocks &= set(index['emails'].get(email, ()))
+            if campaign_id is not None:
+                blocks &= set(index['campaigns'].get(str(int(campaign_id)), ()))
+
+            rows = []
+            for block in sorted(blocks):
+                with open(os.path.join(self._partition_path(day), f'{block:06d}.blk'), 'rb') as f:
+                    rows += _decode_block(f.read())
+            rows.sort()
+            for row in rows:
+                if ((start_ts is None or row[0] >= start_ts) and (end_ts is None or row[0] < end_ts) and
+                        (email is None or row[1] == email) and (campaign_id is None or row[2] == int(campaign_id)) and
+                        (event is None or row[3] == event)):
+                    yield {'timestamp': _epoch + dt.timedelta(seconds=row[0]), 'email': row[1],
+                           'campaign_id': row[2] or None, 'event': row[3] or None, 'list': row[4] or None}
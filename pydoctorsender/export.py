@@ -0,0 +1,149 @@
+"""
+Columnar export of campaign statistics. Doctorsender returns every counter as a string, here they are converted once
+into typed arrays (NumPy if it is installed, the stdlib array module otherwise) with ids and send dates as aligned
+columns, and rates are computed over whole columns.
+
+>>> stats = campaign_statistics(client, "send_date >= '2020-01-01'")
+>>> stats['opens']
+array([1200,  830, ...])
+>>> stats.open_rate()
+array([0.21, 0.18, ...])
+>>> pd.DataFrame(stats.to_dict())
+"""
+import datetime as dt
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+METRICS = ('amount', 'opens', 'clicks', 'deliveries', 'bounced', 'bounceds_soft', 'complaints', 'unsubscribes',
+           'cvars', 'unicViews', 'unicClics')
+
+_date_format = '%Y-%m-%d %H:%M:%S'
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_timestamp(value) -> int:
+    """Send dates as seconds since the epoch (UTC), 0 for campaigns that were never sent"""
+    try:
+        return int(dt.datetime.strptime(value, _date_format).replace(tzinfo=dt.timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+class CampaignStatistics:
+    """Aligned columns of campaign statistics, one row per campaign"""
+
+    def __init__(self, columns: dict, use_numpy: bool):
+        """
+        :param columns: Dict with the column name as key and an array (or list for text columns) as value
+        :param use_numpy: Bool, whether the numeric columns are NumPy arrays
+        """
+        self.columns = columns
+        self.use_numpy = use_numpy
+
+    @classmethod
+    def from_campaigns(cls, campaigns: list, use_numpy: bool = None) -> 'CampaignStatistics':
+        """
+        :param campaigns: List of campaign dicts as returned by list_campaigns(..., get_statistics=True) or campaign()
+        :param use_numpy: Bool, defaults to True if NumPy is installed
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ImportError("use_numpy needs NumPy, install it with 'pip install pydoctorsender[numpy]'")
+        n = len(campaigns)
+
+        def column(values, typecode):
+            if use_numpy:
+                return np.fromiter(values, dtype=np.int64, count=n)
+            return array(typecode, values)
+
+        columns = {'id': column((_to_int(c.get('id')) for c in campaigns), 'q')}
+        send_dates = column((_to_timestamp(c.get('send_date')) for c in campaigns), 'q')
+        columns['send_date'] = send_dates.astype('datetime64[s]') if use_numpy else send_dates
+        for metric in METRICS:
+            columns[metric] = column((_to_int(c.get(metric)) for c in campaigns), 'q')
+
+        # Everything else (name, subject, status, ...) is kept as text
+        for key in (campaigns[0] if campaigns else {}):
+            if key not in columns:
+                columns[key] = [c.get(key) for c in campaigns]
+
+        return cls(columns, use_numpy)
+
+    def __len__(self) -> int:
+        return len(self.columns['id'])
+
+    def __getitem__(self, column: str):
+        return self.columns[column]
+
+    def __repr__(self):
+        return f"<CampaignStatistics {len(self)} campaigns>"
+
+    def rate(self, numerator: str, denominator: str):
+        """
+        :param numerator: String with a metric column name
+        :param denominator: String with a metric column name
+        :return: Float array with numerator / denominator per campaign, nan where the denominator is 0
+        """
+        num, den = self.columns[numerator], self.columns[denominator]
+        if self.use_numpy:
+            out = np.full(len(num), np.nan)
+            return np.divide(num, den, out=out, where=den > 0)
+        return array('d', (n / d if d else float('nan') for n, d in zip(num, den)))
+
+    def open_rate(self):
+        """Unique opens per delivered email"""
+        return self.rate('unicViews', 'deliveries')
+
+    def click_rate(self):
+        """Unique clicks per delivered email (CTR)"""
+        return self.rate('unicClics', 'deliveries')
+
+    def click_to_open_rate(self):
+        """Unique clicks per unique open"""
+        return self.rate('unicClics', 'unicViews')
+
+    def bounce_rate(self):
+        """Bounced emails per sent email"""
+        return self.rate('bounced', 'amount')
+
+    def unsubscribe_rate(self):
+        """Unsubscribes per delivered email"""
+        return self.rate('unsubscribes', 'deliveries')
+
+    def to_dict(self, rates: bool = True) -> dict:
+        """
+        :param rates: Bool, if True the derived rates are added as columns
+        :return: Dict with column name as key and column as value, e.g. for pandas.DataFrame
+        """
+        columns = dict(self.columns)
+        if rates:
+            columns.update(open_rate=self.open_rate(), click_rate=self.click_rate(),
+                           click_to_open_rate=self.click_to_open_rate(), bounce_rate=self.bounce_rate(),
+                           unsubscribe_rate=self.unsubscribe_rate())
+        return columns
+
+
+def campaign_statistics(client, sql_where: str, fields: list = ('name', 'send_date', 'status'),
+                        use_numpy: bool = None) -> CampaignStatistics:
+    """
+    Fetches the statistics of all campaigns matching sql_where with a single dsCampaignGetAll call
+
+    :param client: DoctorSenderClient
+    :param sql_where: String with the where clause, as for DoctorSenderClient.list_campaigns
+    :param fields: List of additional campaign fields to fetch, see DoctorSenderClient.list_campaigns
+    :param use_numpy: Bool, defaults to True if NumPy is installed
+    :return: CampaignStatistics
+    """
+    campaigns = client.list_campaigns(sql_where, list(fields), get_statistics=True)
+    return CampaignStatistics.from_campaigns(campaigns, use_numpy=use_numpy)
@@ -0,0 +1,167 @@
+"""
+Request hedging for read-only SOAP methods: if a call has not returned after an adaptive delay (by default the running
+p95 of the method's latency), the request is sent a second time and the first response to arrive is used. The share of
+hedged calls is capped by a budget, so the extra load on Doctorsender stays bounded.
+
+A thread blocked on a socket can't be woken when the other request answers first, so the requests of a call that may be
+hedged run on helper threads while the calling thread waits for the first response. The slower request keeps running
+and its response is closed when it arrives. Calls that can't be hedged (other methods, or no room in the budget) are
+sent on the calling thread.
+
+>>> client = DoctorSenderClient('user@doctorsender.com', 'example_api_token', hedging=HedgingPolicy(budget=0.05))
+"""
+import threading
+import time
+
+from .instrumentation import LatencyHistogram
+
+# Methods without side effects, sending them twice is harmless
+READ_ONLY_METHODS = frozenset({
+    'dsGetSegmentCount', 'dsSegmentsGetByListName', 'dsCampaignGet', 'dsCampaignGetAll',
+    'dsCampaignGetUserStatistics', 'dsUsersListGetAll', 'dsUsersListGetFields', 'dsUsersListGetUnsubscribes',
+    'dsIpGroupGetNames', 'dsLanguageGetAll', 'dsCountryGetAll', 'dsCategoryGetAll', 'dsSettingsGetAllFromEmail',
+    'dsFtpGetAccess'})
+
+
+class HedgingPolicy:
+    def __init__(self, methods=READ_ONLY_METHODS, percentile: float = 95, budget: float = 0.05,
+                 min_samples: int = 20, initial_delay: float = 1.0, min_delay: float = 0.01):
+        """
+        :param methods: Set of SOAP method names that may be hedged, only add methods without side effects
+        :param percentile: Float, the hedge is sent once a call takes longer than this percentile of the method's
+            latency
+        :param budget: Float, max share of calls that get a hedge, e.g. 0.05 for 5%
+        :param min_samples: Int, calls of a method needed before its percentile is used, initial_delay is used before
+        :param initial_delay: Float, seconds to wait before hedging while there are too few samples
+        :param min_delay: Float, lower bound of the delay in seconds
+        """
+        self.methods = frozenset(methods)
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.calls = 0
+        self.hedges = 0
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def delay(self, method: str) -> float:
+        """
+        :param method: String with the SOAP method name
+        :return: Float with the seconds a call of the method may take before it is hedged
+        """
+        with self._lock:
+            histogram = self._histograms.get(method)
+            if histogram is None or histogram.count < self.min_samples:
+                return self.initial_delay
+            return max(histogram.percentile(self.percentile), self.min_delay)
+
+    def _record(self, method: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(method)
+            if histogram is None:
+                histogram = self._histograms[method] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def _start(self) -> bool:
+        """Counts a call, returns whether the budget has room for a hedge of it"""
+        with self._lock:
+            self.calls += 1
+            return self.hedges + 1 <= self.budget * self.calls
+
+    def run(self, method: str, send) -> tuple:
+        """
+        Sends a request, hedging it if the method allows it and the first request is slow
+
+        :param method: String with the SOAP method name
+        :param send: Callable sending the request and returning the response, it is called a second time for the hedge
+        :return: Tuple of (response, number of hedges sent)
+        """
+        if method not in self.methods:
+            return send(), 0
+        if not self._start():
+            # Without room for a hedge there is nothing to race, the request is sent on the calling thread
+            start = time.perf_counter()
+            response = send()
+            self._record(method, time.perf_counter() - start)
+            return response, 0
+
+        start = time.perf_counter()
+
+        def first():
+            response = send()
+            # Recorded even if the hedge answered first, the delay follows the latency of the first requests
+            self._record(method, time.perf_counter() - start)
+            return response
+
+        race = _Race()
+        race.start(first)
+        if race.wait(self.delay(method)):
+            return race.result(), 0
+
+        with self._lock:
+            self.hedges += 1
+        race.start(send)
+        race.wait()
+        return race.result(), 1
+
+
+class _Race:
+    """The requests of a hedged call, the first response is used and the others are closed as they arrive"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._results = []
+        self._running = 0
+        self._decided = False
+
+    def start(self, send):
+        with self._condition:
+            self._running += 1
+        threading.Thread(target=self._attempt, args=(send,), daemon=True).start()
+
+    def _attempt(self, send):
+        try:
+            result = (send(), None)
+        except Exception as e:
+            result = (None, e)
+        with self._condition:
+            self._running -= 1
+            late = self._decided
+            if not late:
+                self._results.append(result)
+                self._condition.notify_all()
+        if late and result[1] is None:
+            _close(result[0])
+
+    def _ready(self) -> bool:
+        # A response arrived, or every request sent so far failed
+        return any(error is None for _, error in self._results) or (bool(self._results) and not self._running)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        :param timeout: Float, seconds to wait at most, None to wait until a request answered
+        :return: Bool, True if a response arrived or every request failed
+        """
+        with self._condition:
+            return self._condition.wait_for(self._ready, timeout)
+
+    def result(self):
+        """Returns the first response, or raises the error of the first failed request if none succeeded"""
+        with self._condition:
+            self._decided = True
+            responses = [response for response, error in self._results if error is None]
+            errors = [error for _, error in self._results if error is not None]
+        for response in responses[1:]:
+            _close(response)
+        if responses:
+            return responses[0]
+        raise errors[0]
+
+
+def _close(response):
+    # Returns the connection of a requests Response to the pool
+    close = getattr(response, 'close', None)
+    if close is not None:
+        close()
@@ -0,0 +1,303 @@
+"""
+The engagement curve of campaigns over time. campaign() only returns the current counters, the snapshotter polls the
+statistics of the active campaigns in batched dsCampaignGetAll calls and appends them to one file per campaign. Samples
+are stored as deltas to the previous sample (time and every counter) in varint encoding, unchanged samples are not
+stored at all, which typically takes 5-15 bytes per sample instead of a full campaign dict.
+
+>>> history = StatsHistory('stats')
+>>> snapshotter = StatsSnapshotter(client, history, interval=600)
+>>> snapshotter.watch(running_campaign_ids)
+>>> snapshotter.run()  # in a background thread or service
+>>> history.series(4711, 'opens', start=sent_at, end=sent_at + dt.timedelta(days=2))
+[(datetime.datetime(2020, 1, 1, 8, 0, tzinfo=datetime.timezone.utc), 0), ...]
+>>> history.rollup(4711, 'opens', bucket=3600)  # opens per hour
+"""
+import datetime as dt
+import os
+import threading
+import time
+
+from .export import METRICS
+
+_magic = b'DRSH\x01'
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    """Maps signed to unsigned ints, small magnitudes stay small: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ..."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _read_varints(data: bytes, offset: int = 0):
+    """Yields (varint, offset after it) tuples of data, a truncated one at the end (from an interrupted write) is
+    dropped"""
+    value = shift = 0
+    for position in range(offset, len(data)):
+        byte = data[position]
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value, position + 1
+            value = shift = 0
+
+
+def _to_timestamp(value) -> int:
+    return int(value.timestamp()) if isinstance(value, dt.datetime) else int(value)
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class StatsHistory:
+    """Delta encoded time series of campaign counters, one append-only file per campaign"""
+
+    def __init__(self, path: str, metrics: tuple = METRICS):
+        """
+        :param path: String with the directory of the history, created if it does not exist
+        :param metrics: Tuple of the counters stored for new campaigns, existing files keep their metrics
+        """
+        self.path = path
+        self.metrics = tuple(metrics)
+        os.makedirs(path, exist_ok=True)
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def _file(self, campaign_id: int) -> str:
+        return os.path.join(self.path, f'{int(campaign_id)}.series')
+
+    def campaigns(self) -> list:
+        """
+        :return: Sorted list of the campaign ids with a history
+        """
+        return sorted(int(name[:-7]) for name in os.listdir(self.path) if name.endswith('.series'))
+
+    def _read(self, campaign_id: int) -> tuple:
+        """
+        :return: Tuple of (metrics, list of (timestamp, values) samples)
+        """
+        return self._load(campaign_id)[:2]
+
+    def _load(self, campaign_id: int) -> tuple:
+        """
+        :return: Tuple of (metrics, list of (timestamp, values) samples, offset after the last complete sample, file
+            size), the offset is 0 if the file has no complete sample
+        """
+        try:
+            with open(self._file(campaign_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return self.metrics, [], 0, 0
+        header_end = data.find(b'\n')
+        if data[:len(_magic)] != _magic[:len(data)]:
+            raise ValueError(f"{self._file(campaign_id)} is not a stats history")
+        if header_end < 0:
+            # The header itself was cut off
+            return self.metrics, [], 0, len(data)
+
+        metrics = tuple(data[len(_magic):header_end].decode('ascii').split(','))
+        varints = _read_varints(data, header_end + 1)
+        samples = []
+        end = 0
+        timestamp, values = 0, [0] * len(metrics)
+        while True:
+            record = [v for _, v in zip(range(len(metrics) + 1), varints)]
+            if len(record) <= len(metrics):
+                break
+            timestamp += record[0][0]
+            values = [value + _unzigzag(delta) for value, (delta, _) in zip(values, record[1:])]
+            samples.append((timestamp, values))
+            end = record[-1][1]
+        return metrics, samples, end, len(data)
+
+    def record(self, campaign_id: int, counters: dict, timestamp=None) -> bool:
+        """
+        Appends a sample of a campaign
+
+        :param campaign_id: Int with the campaign id
+        :param counters: Dict with the counters, e.g. as returned by campaign() or campaigns()
+        :param timestamp: Optional datetime or epoch seconds, defaults to now
+        :return: Bool, False if nothing changed since the last sample and nothing was written
+        """
+        timestamp = _to_timestamp(timestamp if timestamp is not None else time.time())
+        campaign_id = int(campaign_id)
+        with self._lock:
+            last = self._last.get(campaign_id)
+            if last is None:
+                metrics, samples, end, size = self._load(campaign_id)
+                if samples and end < size:
+                    # A sample cut off by an interrupted write, appending after it would misalign all later samples
+                    with open(self._file(campaign_id), 'r+b') as f:
+                        f.truncate(end)
+                last = self._last[campaign_id] = [metrics, *(samples[-1] if samples else (0, None))]
+            metrics, last_timestamp, last_values = last
+            values = [_to_int(counters.get(metric)) for metric in metrics]
+            if values == last_values:
+                return False
+
+            out = bytearray()
+            mode = 'ab'
+            if last_values is None:
+                # New file, or one without a complete sample, which is started over
+                out += _magic + ','.join(metrics).encode('ascii') + b'\n'
+                last_values = [0] * len(metrics)
+                mode = 'wb'
+            _write_varint(out, max(timestamp - last_timestamp, 0))
+            for value, last_value in zip(values, last_values):
+                _write_varint(out, _zigzag(value - last_value))
+            # One write per sample, a sample cut off by an interrupted write is dropped when the file is read and
+            # truncated before the next sample is appended
+            try:
+                with open(self._file(campaign_id), mode) as f:
+                    f.write(out)
+            except BaseException:
+                # Part of the sample may have been written, the next record() reads and repairs the file
+                del self._last[campaign_id]
+                raise
+            last[1:] = [max(timestamp, last_timestamp), values]
+        return True
+
+    def samples(self, campaign_id: int, start=None, end=None) -> list:
+        """
+        :param campaign_id: Int with the campaign id
+        :param start: Optional datetime or epoch seconds, samples at or after it
+        :param end: Optional datetime or epoch seconds, samples before it
+        :return: List of (datetime, dict of counters) tuples
+        """
+        metrics, samples = self._read(campaign_id)
+        start = _to_timestamp(start) if start is not None else None
+        end = _to_timestamp(end) if end is not None else None
+        return [(dt.datetime.fromtimestamp(timestamp, dt.timezone.utc), dict(zip(metrics, values)))
+                for timestamp, values in samples
+                if (start is None or timestamp >= start) and (end is None or timestamp < end)]
+
+    def series(self, campaign_id: int, metric: str, start=None, end=None) -> list:
+        """
+        :return: List of (datetime, value) tuples of one counter
+        """
+        return [(timestamp, counters[metric]) for timestamp, counters in self.samples(campaign_id, start, end)]
+
+    def at(self, campaign_id: int, timestamp) -> dict:
+        """
+        :return: Dict with the counters of a campaign at a point in time (the last sample before it), empty before
+            the first sample
+        """
+        metrics, samples = self._read(campaign_id)
+        timestamp = _to_timestamp(timestamp)
+        values = None
+        for sample_timestamp, sample_values in samples:
+            if sample_timestamp > timestamp:
+                break
+            values = sample_values
+        return dict(zip(metrics, values)) if values is not None else {}
+
+    def rollup(self, campaign_id: int, metric: str, bucket: int = 3600, start=None, end=None) -> list:
+        """
+        :param campaign_id: Int with the campaign id
+        :param metric: String with the counter, e.g. 'opens'
+        :param bucket: Int, bucket size in seconds
+        :param start: Optional datetime or epoch seconds, defaults to the first sample
+        :param end: Optional datetime or epoch seconds, defaults to the last sample
+        :return: List of (bucket start as datetime, increase of the counter within the bucket) tuples
+        """
+        metrics, samples = self._read(campaign_id)
+        if not samples:
+            return []
+        index = metrics.index(metric)
+        start = _to_timestamp(start) if start is not None else samples[0][0] - samples[0][0] % bucket
+        end = _to_timestamp(end) if end is not None else samples[-1][0] + 1
+
+        rollup = []
+        position, value = 0, 0
+        for bucket_start in range(start, end, bucket):
+            first = value
+            # Walk the samples once, the value at the end of a bucket is the last sample inside it
+            while position < len(samples) and samples[position][0] < bucket_start + bucket:
+                value = samples[position][1][index]
+                if samples[position][0] < bucket_start:
+                    first = value
+                position += 1
+            rollup.append((dt.datetime.fromtimestamp(bucket_start, dt.timezone.utc), value - first))
+        return rollup
+
+
+class StatsSnapshotter:
+    """Polls the statistics of active campaigns into a StatsHistory"""
+
+    def __init__(self, client, history: StatsHistory, interval: float = 600, max_age: float = 7 * 86400,
+                 batch_size: int = 500):
+        """
+        :param client: DoctorSenderClient
+        :param history: StatsHistory the samples are recorded in
+        :param interval: Float, seconds between polls
+        :param max_age: Float, campaigns sent longer than this many seconds ago are no longer polled
+        :param batch_size: Int, campaigns per dsCampaignGetAll call
+        """
+        self.client = client
+        self.history = history
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self._campaigns = set()
+        self._lock = threading.Lock()
+
+    def watch(self, campaign_ids: list):
+        with self._lock:
+            self._campaigns.update(int(campaign_id) for campaign_id in campaign_ids)
+
+    def unwatch(self, campaign_ids: list):
+        with self._lock:
+            self._campaigns.difference_update(int(campaign_id) for campaign_id in campaign_ids)
+
+    def poll_once(self) -> int:
+        """
+        Records one sample of every watched campaign
+
+        :return: Int with the number of campaigns that changed
+        """
+        with self._lock:
+            campaign_ids = sorted(self._campaigns)
+        if not campaign_ids:
+            return 0
+        now = time.time()
+        campaigns = self.client.campaigns(campaign_ids, fields=['send_date', 'status'], get_statistics=True,
+                                          chunk_size=self.batch_size)
+
+        changed = 0
+        expired = [campaign_id for campaign_id in campaign_ids if campaign_id not in campaigns]
+        for campaign_id, campaign in campaigns.items():
+            changed += self.history.record(campaign_id, campaign, now)
+            try:
+                sent_at = dt.datetime.strptime(campaign.get('send_date') or '', '%Y-%m-%d %H:%M:%S').timestamp()
+            except ValueError:
+                continue
+            if now - sent_at > self.max_age:
+                expired.append(campaign_id)
+        self.unwatch(expired)
+        return changed
+
+    def run(self, stop: threading.Event = None):
+        """
+        Polls every interval seconds until no campaign is watched anymore (or stop is set)
+
+        :param stop: Optional threading.Event to stop polling from another thread
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set() and self._campaigns:
+            started = time.monotonic()
+            self.poll_once()
+            stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
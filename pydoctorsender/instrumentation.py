@@ -0,0 +1,223 @@
+"""
+Instrumentation for the DoctorSenderClient. A hook is any object implementing (a subset of) the methods of
+:class:`Hook`, the client calls them around every SOAP request with a :class:`RequestEvent` describing the call.
+Exceptions raised by a hook are logged (logger pydoctorsender.doctorsender) and never reach the request.
+
+>>> metrics = MetricsCollector()
+>>> client = DoctorSenderClient('user@doctorsender.com', 'example_api_token', hooks=[metrics])
+>>> client.lists()
+>>> metrics.dump()['dsUsersListGetAll']['total']['p99']
+"""
+import threading
+import time
+
+
+class RequestEvent:
+    """Describes a single SOAP request, filled in by the client while the request progresses"""
+
+    __slots__ = ('method', 'started_at', 'request_bytes', 'response_bytes', 'build_time', 'network_time',
+                 'parse_time', 'hedges', 'outcome', 'error')
+
+    def __init__(self, method: str):
+        """
+        :param method: String with the SOAP method name, e.g. dsCampaignGet
+        """
+        self.method = method
+        self.started_at = time.time()
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.build_time = 0.0
+        self.network_time = 0.0
+        self.parse_time = 0.0
+        # Duplicate requests sent by a HedgingPolicy because the first one was slow
+        self.hedges = 0
+        # One of 'ok', 'fault' (Doctorsender returned an error), 'error' (transport or parsing failed), 'rejected'
+        # (not sent because the circuit breaker is open) or 'aborted' (the response exceeded the response limits)
+        self.outcome = None
+        self.error = None
+
+    @property
+    def total_time(self) -> float:
+        return self.build_time + self.network_time + self.parse_time
+
+    def __repr__(self):
+        return f"<RequestEvent {self.method} {self.outcome} {self.total_time * 1000:.1f}ms>"
+
+
+class Hook:
+    """Base class for instrumentation hooks, all methods are no-ops so subclasses only implement what they need"""
+
+    def on_request_start(self, event: RequestEvent):
+        pass
+
+    def on_request_end(self, event: RequestEvent):
+        pass
+
+    def on_circuit_state_change(self, group: str, old_state: str, new_state: str):
+        pass
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram: values are recorded in microseconds into log-linear buckets, which keeps the relative
+    error below 1/64 (~1.6%) over the whole range while only storing the buckets that were actually hit.
+    """
+
+    _SUB_BITS = 7
+    _SUB_COUNT = 1 << _SUB_BITS
+    _HALF_COUNT = _SUB_COUNT >> 1
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls._SUB_COUNT:
+            return value
+        shift = value.bit_length() - cls._SUB_BITS
+        return cls._SUB_COUNT + (shift - 1) * cls._HALF_COUNT + (value >> shift) - cls._HALF_COUNT
+
+    @classmethod
+    def _highest_value(cls, index: int) -> int:
+        if index < cls._SUB_COUNT:
+            return index
+        shift, mantissa = divmod(index - cls._SUB_COUNT, cls._HALF_COUNT)
+        shift += 1
+        return ((mantissa + cls._HALF_COUNT + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        """
+        :param seconds: Float, the duration to record
+        """
+        value = max(int(seconds * 1e6), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: Float between 0 and 100
+        :return: Float with the duration in seconds at the given percentile, 0.0 for an empty histogram
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(self.count * p / 100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_value(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def to_dict(self) -> dict:
+        """
+        :return: Dict with count, min, mean, max and the usual percentiles, all durations in seconds
+        """
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count,
+                'min': self.min / 1e6,
+                'mean': self.sum / self.count / 1e6,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'p999': self.percentile(99.9),
+                'max': self.max / 1e6}
+
+
+class MetricsCollector(Hook):
+    """In-process metrics: latency histograms per SOAP method and stage, outcome counters and byte totals"""
+
+    stages = ('total', 'build', 'network', 'parse')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+        self.circuits = {}
+
+    def _method(self, name: str) -> dict:
+        method = self._methods.get(name)
+        if method is None:
+            method = {'histograms': {stage: LatencyHistogram() for stage in self.stages},
+                      'outcomes': {},
+                      'request_bytes': 0,
+                      'response_bytes': 0,
+                      'hedges': 0}
+            self._methods[name] = method
+        return method
+
+    def on_request_end(self, event: RequestEvent):
+        with self._lock:
+            method = self._method(event.method)
+            histograms = method['histograms']
+            histograms['total'].record(event.total_time)
+            histograms['build'].record(event.build_time)
+            histograms['network'].record(event.network_time)
+            histograms['parse'].record(event.parse_time)
+            method['outcomes'][event.outcome] = method['outcomes'].get(event.outcome, 0) + 1
+            method['request_bytes'] += event.request_bytes
+            method['response_bytes'] += event.response_bytes
+            method['hedges'] += event.hedges
+
+    def on_circuit_state_change(self, group: str, old_state: str, new_state: str):
+        with self._lock:
+            circuit = self.circuits.setdefault(group, {'state': old_state, 'opened': 0})
+            circuit['state'] = new_state
+            if new_state == 'open':
+                circuit['opened'] += 1
+
+    def histogram(self, method: str, stage: str = 'total') -> LatencyHistogram:
+        """
+        :param method: String with the SOAP method name
+        :param stage: One of 'total', 'build', 'network' or 'parse'
+        :return: The LatencyHistogram of that method and stage (empty if the method was never called)
+        """
+        with self._lock:
+            method = self._methods.get(method)
+            return method['histograms'][stage] if method is not None else LatencyHistogram()
+
+    def dump(self) -> dict:
+        """
+        :return: Dict with the SOAP method name as key and a dict with the histogram summaries per stage, outcome
+            counts and byte totals as value
+        """
+        with self._lock:
+            return {name: dict({stage: h.to_dict() for stage, h in method['histograms'].items()},
+                               outcomes=dict(method['outcomes']),
+                               request_bytes=method['request_bytes'],
+                               response_bytes=method['response_bytes'],
+                               hedges=method['hedges'])
+                    for name, method in self._methods.items()}
+
+    def render(self) -> str:
+        """
+        :return: String in the Prometheus text exposition format, so the collector can be scraped as is
+        """
+        lines = []
+        for name, method in self.dump().items():
+            for stage in self.stages:
+                summary = method[stage]
+                for quantile in ('p50', 'p90', 'p99', 'p999'):
+                    if quantile in summary:
+                        q = '0.' + quantile[1:]
+                        lines.append(f'pydoctorsender_latency_seconds{{method="{name}",stage="{stage}",'
+                                     f'quantile="{q}"}} {summary[quantile]}')
+                lines.append(f'pydoctorsender_latency_seconds_count{{method="{name}",stage="{stage}"}} '
+                             f'{summary["count"]}')
+            for outcome, count in method['outcomes'].items():
+                lines.append(f'pydoctorsender_requests_total{{method="{name}",outcome="{outcome}"}} {count}')
+            lines.append(f'pydoctorsender_request_bytes_total{{method="{name}"}} {method["request_bytes"]}')
+            lines.append(f'pydoctorsender_response_bytes_total{{method="{name}"}} {method["response_bytes"]}')
+        with self._lock:
+            circuits = {group: dict(circuit) for group, circuit in self.circuits.items()}
+        for group, circuit in circuits.items():
+            lines.append(f'pydoctorsender_circuit_open{{group="{group}"}} {int(circuit["state"] != "closed")}')
+            lines.append(f'pydoctorsender_circuit_opened_total{{group="{group}"}} {circuit["opened"]}')
+        return '\n'.join(lines) + '\n'
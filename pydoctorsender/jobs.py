@@ -0,0 +1,378 @@
+"""
+A durable, resumable queue for bulk mutations. Every planned call is recorded in a SQLite file under a key before
+anything is sent, and every result (e.g. the id returned by dsSegmentsNew or dsCampaignNew) is checkpointed as soon as
+it arrives. Running the queue again after a crash only runs what is left.
+
+Arguments can reference the result of other jobs, add() returns such a reference:
+
+>>> queue = JobQueue('jobs.sqlite')
+>>> segment = queue.add('segment_de', 'create_segment', 'example_list', 'Germany')
+>>> queue.add('segment_de_country', 'segment_add_condition', segment, 'country', '==', 'DEU')
+>>> campaign = queue.add('campaign_de', 'create_campaign', 'Deals DE', 'Weekly deals', ...)
+>>> queue.add('send_de', 'send_campaign_list', campaign, 'example_list', segment_id=segment)
+>>> queue.run(client, max_workers=8)
+{'segment_de': 4711, 'segment_de_country': 123456, 'campaign_de': 4712, 'send_de': True}
+
+Jobs that were running when the process died may or may not have reached Doctorsender. Before a creation is sent,
+the largest id of the segments of its list (or of the campaigns with its name) is recorded with the job, on recovery
+only a segment or campaign with the name and a larger id is taken as created by the job. Calls that can safely be
+repeated are run again, all other interrupted jobs are marked as failed and have to be retried explicitly with retry().
+
+Results are stored as JSON, dicts with keys other than strings (e.g. the campaign ids of campaigns()) keep their keys,
+so a resumed run returns the same results as a fresh one. Tuples come back as lists, other objects as strings.
+"""
+import json
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .errors import DrsJobError
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Calls that have the same effect when made twice
+IDEMPOTENT_METHODS = {'set_exclusion', 'delete_campaign', 'delete_segment', 'segment_del_condition', 'segment_count',
+                      'campaign', 'list_campaigns', 'campaigns', 'segments', 'get_list_fields', 'lists'}
+
+_schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    args TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    marker INTEGER,
+    run_id TEXT
+)"""
+
+
+def ref(key: str) -> dict:
+    """
+    :return: Reference to the result of the job key, to be used as (part of) an argument of another job
+    """
+    return {'$ref': key}
+
+
+def _refs(value) -> set:
+    """Keys of all jobs referenced in value"""
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            return {value['$ref']}
+        return set().union(*(_refs(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_refs(v) for v in value))
+    return set()
+
+
+def _encode(value):
+    """value as JSON serializable object, dicts with keys other than strings are tagged as {'$items': [[key, value]]}"""
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value) and set(value) != {'$items'}:
+            return {k: _encode(v) for k, v in value.items()}
+        return {'$items': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {'$items'}:
+            return {_key(_decode(k)): _decode(v) for k, v in value['$items']}
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _key(key):
+    # Tuple keys were written as lists
+    return tuple(_key(k) for k in key) if isinstance(key, list) else key
+
+
+def _resolve(value, results: dict):
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            return results[value['$ref']]
+        return {k: _resolve(v, results) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, results) for v in value]
+    return value
+
+
+def _segment_list(list_name, segment_name, *args, **kwargs):
+    return list_name
+
+
+def _campaign_name(campaign_name, *args, **kwargs):
+    return campaign_name
+
+
+def _segment_markers(client, calls: list) -> list:
+    """Largest segment id of the list of every create_segment call, one segments() call per list"""
+    lists = {}
+    for args, kwargs in calls:
+        list_name = _segment_list(*args, **kwargs)
+        if list_name not in lists:
+            lists[list_name] = max((int(segment_id) for segment_id in client.segments(list_name) or {}), default=0)
+    return [lists[_segment_list(*args, **kwargs)] for args, kwargs in calls]
+
+
+def _campaign_markers(client, calls: list, chunk_size: int = 500) -> list:
+    """Largest id of the campaigns with the name of every create_campaign call, in batched list_campaigns calls"""
+    names = list(dict.fromkeys(str(_campaign_name(*args, **kwargs)) for args, kwargs in calls))
+    largest = {}
+    for start in range(0, len(names), chunk_size):
+        quoted = ', '.join("'{}'".format(name.replace("'", "''")) for name in names[start:start + chunk_size])
+        for campaign in client.list_campaigns(f"name IN ({quoted})", ['name']):
+            name = campaign.get('name')
+            largest[name] = max(largest.get(name, 0), int(campaign['id']))
+    return [largest.get(str(_campaign_name(*args, **kwargs)), 0) for args, kwargs in calls]
+
+
+def _find_segment(client, marker: int, list_name, segment_name, *args, **kwargs):
+    segment_ids = [int(segment_id) for segment_id, name in (client.segments(list_name) or {}).items()
+                   if name == segment_name and int(segment_id) > marker]
+    return max(segment_ids) if segment_ids else None
+
+
+def _find_campaign(client, marker: int, campaign_name, *args, **kwargs):
+    name = str(campaign_name).replace("'", "''")
+    campaigns = client.list_campaigns(f"name = '{name}'", ['name'])
+    campaign_ids = [int(campaign['id']) for campaign in campaigns
+                    if campaign.get('name') == campaign_name and int(campaign['id']) > marker]
+    return max(campaign_ids) if campaign_ids else None
+
+
+# Record the largest existing id before creations are sent, called with the (args, kwargs) of a batch of jobs
+MARKERS = {'create_segment': _segment_markers,
+           'create_campaign': _campaign_markers}
+
+# Look up whether an interrupted creation reached Doctorsender, called with the recorded marker and the arguments of
+# the job, only objects with an id above the marker count
+RECONCILERS = {'create_segment': _find_segment,
+               'create_campaign': _find_campaign}
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        """
+        :param path: String with the path of the SQLite file, created if it does not exist
+        """
+        self.path = path
+        # Several processes may work on the same file (see pydoctorsender.sharding), writers wait for each other
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=60)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(_schema)
+        # Queue files written before markers and run ids were recorded
+        for column in ('marker INTEGER', 'run_id TEXT'):
+            try:
+                self._db.execute(f'ALTER TABLE jobs ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, key: str, method: str, *args, **kwargs) -> dict:
+        """
+        Records a planned call, nothing is sent until run(). Adding a key that already exists does nothing, so the
+        planning code can simply run again on resume.
+
+        :param key: String identifying the job
+        :param method: String with the DoctorSenderClient method name, e.g. 'create_segment'
+        :param args: Positional arguments of the call (JSON serializable, may contain references of other jobs)
+        :param kwargs: Keyword arguments of the call (JSON serializable, may contain references of other jobs)
+        :return: Reference to the result of the job
+        """
+        self._db.execute('INSERT OR IGNORE INTO jobs (key, seq, method, args, kwargs, status, updated_at) '
+                         'VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs), ?, ?, ?, ?, ?)',
+                         (key, method, json.dumps(list(args)), json.dumps(kwargs), PENDING, time.time()))
+        return ref(key)
+
+    def status(self) -> dict:
+        """
+        :return: Dict with the status as key and the number of jobs as value
+        """
+        return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+
+    def results(self) -> dict:
+        """
+        :return: Dict with the key of every finished job as key and its result as value, in the order jobs were added
+        """
+        rows = self._db.execute('SELECT key, result FROM jobs WHERE status = ? ORDER BY seq', (DONE,))
+        # Rows written before every result was stored as JSON have NULL for a None result
+        return {key: None if result is None else _decode(json.loads(result)) for key, result in rows}
+
+    def failed(self) -> dict:
+        """
+        :return: Dict with the key of every failed job as key and the error message as value
+        """
+        return dict(self._db.execute('SELECT key, error FROM jobs WHERE status = ? ORDER BY seq', (FAILED,)))
+
+    def retry(self, keys: list = None, interrupted: bool = False):
+        """
+        Sets failed jobs back to pending, they run on the next run()
+
+        :param keys: List of job keys, only the failed jobs among them are set back, defaults to all failed jobs
+        :param interrupted: Bool, if True jobs left running by a crashed process are set back to pending as well,
+            without checking whether they reached Doctorsender
+        """
+        retried = list(self.failed())
+        if interrupted:
+            retried += [key for key, *_ in self._jobs(RUNNING)]
+        if keys is not None:
+            keys = set(keys)
+            retried = [key for key in retried if key in keys]
+        for key in retried:
+            self._set(key, PENDING)
+
+    def assign(self, keys: list, run_id: str):
+        """
+        Assigns jobs to a run, claim() with the run id only hands out jobs of that run. A job belongs to the run it was
+        last assigned to.
+
+        :param keys: List of job keys
+        :param run_id: String identifying the run
+        """
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            self._db.executemany('UPDATE jobs SET run_id = ? WHERE key = ?', [(run_id, key) for key in keys])
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+
+    def claim(self, limit: int, run_id: str = None) -> list:
+        """
+        Marks up to limit pending jobs as running and hands them out, for several processes working on one queue file.
+        References are not resolved, so claimed jobs should not have any.
+
+        :param limit: Int, maximum number of jobs to claim
+        :param run_id: Optional string, only jobs assigned to this run (see assign()) are claimed
+        :return: List of (key, method, args, kwargs) tuples, empty when no jobs are pending
+        """
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            if run_id is None:
+                rows = self._db.execute('SELECT key, method, args, kwargs FROM jobs WHERE status = ? ORDER BY seq '
+                                        'LIMIT ?', (PENDING, limit)).fetchall()
+            else:
+                rows = self._db.execute('SELECT key, method, args, kwargs FROM jobs WHERE status = ? AND run_id = ? '
+                                        'ORDER BY seq LIMIT ?', (PENDING, run_id, limit)).fetchall()
+            self._db.executemany('UPDATE jobs SET status = ?, updated_at = ? WHERE key = ?',
+                                 [(RUNNING, time.time(), key) for key, *_ in rows])
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        return [(key, method, json.loads(args), json.loads(kwargs)) for key, method, args, kwargs in rows]
+
+    def checkpoint(self, key: str, result=None, error: Exception = None):
+        """Records the result of a job, or marks it as failed if error is given"""
+        if error is None:
+            self._set(key, DONE, result=result)
+        else:
+            self._set(key, FAILED, error=f"{type(error).__name__}: {error}")
+
+    def _set(self, key: str, status: str, result=None, error: str = None, marker: int = None):
+        # The result of a finished job is always stored as JSON, a None result as 'null'
+        result = json.dumps(_encode(result), default=str) if status == DONE else None
+        self._db.execute('UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, '
+                         'marker = COALESCE(?, marker) WHERE key = ?',
+                         (status, result, error, time.time(), marker, key))
+
+    def _jobs(self, status: str) -> list:
+        rows = self._db.execute('SELECT key, method, args, kwargs FROM jobs WHERE status = ? ORDER BY seq', (status,))
+        return [(key, method, json.loads(args), json.loads(kwargs)) for key, method, args, kwargs in rows]
+
+    def _recover(self, client):
+        """Settles the jobs that were running when an earlier run was interrupted"""
+        results = self.results()
+        markers = dict(self._db.execute('SELECT key, marker FROM jobs WHERE status = ?', (RUNNING,)))
+        for key, method, args, kwargs in self._jobs(RUNNING):
+            reconciler = RECONCILERS.get(method)
+            marker = markers.get(key)
+            if reconciler is not None and marker is not None and _refs([args, kwargs]) <= set(results):
+                found = reconciler(client, marker, *_resolve(args, results), **_resolve(kwargs, results))
+                if found is not None:
+                    self._set(key, DONE, result=found)
+                    results[key] = found
+                else:
+                    self._set(key, PENDING)
+            elif method in IDEMPOTENT_METHODS:
+                self._set(key, PENDING)
+            else:
+                self._set(key, FAILED, error=f"Interrupted, {method} may or may not have been called, check and "
+                                             f"retry() the job if it has to run again")
+
+    def run(self, client, max_workers: int = 8, return_exceptions: bool = False) -> dict:
+        """
+        Runs all pending jobs, jobs whose references are resolved run concurrently
+
+        :param client: DoctorSenderClient
+        :param max_workers: Int, maximum of concurrent calls
+        :param return_exceptions: Bool, if True exceptions are returned as results, otherwise the first one is raised
+            once all runnable jobs finished
+        :return: Dict with the key of every job as key and its result (or exception) as value, in the order jobs were
+            added, jobs blocked by a failed job get a DrsJobError
+        """
+        self._recover(client)
+        results = self.results()
+        waiting = {key: (method, args, kwargs, _refs([args, kwargs]))
+                   for key, method, args, kwargs in self._jobs(PENDING)}
+        failed = self.failed()
+
+        errors = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                ready = [(key, method, _resolve(args, results), _resolve(kwargs, results))
+                         for key, (method, args, kwargs, refs) in waiting.items() if refs <= set(results)]
+                markers = {}
+                for method, find_markers in MARKERS.items():
+                    calls = [(key, args, kwargs) for key, job_method, args, kwargs in ready if job_method == method]
+                    if calls:
+                        found = find_markers(client, [(args, kwargs) for _, args, kwargs in calls])
+                        markers.update(zip((key for key, *_ in calls), found))
+                for key, method, args, kwargs in ready:
+                    del waiting[key]
+                    # Marked as running before the call, so an interrupted run can tell it might have been sent
+                    self._set(key, RUNNING, marker=markers.get(key))
+                    running[executor.submit(getattr(client, method), *args, **kwargs)] = key
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[key] = future.result()
+                    else:
+                        errors[key] = error
+                    self.checkpoint(key, results.get(key), error)
+
+        for key, message in failed.items():
+            errors.setdefault(key, DrsJobError(f"Job {key} failed in an earlier run: {message}"))
+        for key, (method, args, kwargs, refs) in waiting.items():
+            errors[key] = DrsJobError(f"Job {key} is blocked by {', '.join(sorted(refs - set(results)))}")
+
+        if errors and not return_exceptions:
+            raise next(iter(errors.values()))
+        order = [key for key, in self._db.execute('SELECT key FROM jobs ORDER BY seq')]
+        return {key: results[key] if key in results else errors[key]
+                for key in order if key in results or key in errors}
@@ -0,0 +1,84 @@
+"""
+Guards against runaway responses. Without limits a response is fully buffered by requests and then parsed, a bad
+sql_where in list_campaigns or a wide date range can take hundreds of megabytes. With ResponseLimits the response is
+streamed in, and the call is aborted with DrsResponseTooLargeError as soon as it exceeds the byte or item limit of its
+method, before anything is parsed.
+
+>>> limits = ResponseLimits(max_bytes=50 * 1024 * 1024, methods={'dsCampaignGetAll': (20 * 1024 * 1024, 200000)})
+>>> client = DoctorSenderClient('user@doctorsender.com', 'example_api_token', response_limits=limits)
+>>> client.list_campaigns('', ['name', 'html'])
+DrsResponseTooLargeError: The response of dsCampaignGetAll exceeded 20971520 bytes and was aborted, narrow sql_where...
+"""
+from .errors import DrsResponseTooLargeError
+
+# What to do instead, per SOAP method
+HINTS = {
+    'dsCampaignGetAll': "narrow sql_where, request fewer fields (html and text are large) or paginate with campaigns() "
+                        "and a chunk_size",
+    'dsUsersListGetUnsubscribes': "narrow the date range",
+    'dsUsersGetUserActivity': "narrow the date range",
+    'dsCampaignGetUserStatistics': "download the list export instead",
+}
+DEFAULT_HINT = "paginate or narrow the request"
+
+
+class ResponseLimits:
+    def __init__(self, max_bytes: int = None, max_items: int = None, methods: dict = None, hints: dict = None,
+                 chunk_size: int = 64 * 1024):
+        """
+        :param max_bytes: Int, default limit of the response size in bytes, None for no limit
+        :param max_items: Int, default limit of the number of items (<item> elements) in a response, None for no limit
+        :param methods: Dict with the SOAP method name as key and a tuple of (max_bytes, max_items) as value, overrides
+            the defaults for that method
+        :param hints: Dict with the SOAP method name as key and the hint of the error as value, extends HINTS
+        :param chunk_size: Int, bytes read at a time, the limits are checked after every chunk
+        """
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.methods = dict(methods or {})
+        self.hints = dict(HINTS, **(hints or {}))
+        self.chunk_size = chunk_size
+
+    def limits(self, method: str) -> tuple:
+        """
+        :return: Tuple of (max_bytes, max_items) of a method
+        """
+        return self.methods.get(method, (self.max_bytes, self.max_items))
+
+    def _abort(self, method: str, response, limit: int, unit: str):
+        # Closing drops the connection instead of reading the rest of the response into the void
+        response.close()
+        raise DrsResponseTooLargeError(method, limit, unit, self.hints.get(method, DEFAULT_HINT))
+
+    def read(self, method: str, response) -> bytes:
+        """
+        Reads a streamed response within the limits of its method
+
+        :param method: String with the SOAP method name
+        :param response: requests Response of a request sent with stream=True
+        :return: Bytes with the response body
+        """
+        max_bytes, max_items = self.limits(method)
+        if max_bytes is None and max_items is None:
+            return response.content
+
+        length = response.headers.get('Content-Length')
+        if max_bytes is not None and length and int(length) > max_bytes:
+            self._abort(method, response, max_bytes, 'bytes')
+
+        chunks = []
+        size = items = 0
+        tail = b''
+        for chunk in response.iter_content(self.chunk_size):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                self._abort(method, response, max_bytes, 'bytes')
+            if max_items is not None:
+                # The last 4 bytes read before the chunk catch a tag split between chunks, without counting any twice
+                window = tail + chunk
+                items += window.count(b'<item')
+                tail = window[-4:]
+                if items > max_items:
+                    self._abort(method, response, max_items, 'items')
+            chunks.append(chunk)
+        return b''.join(chunks)
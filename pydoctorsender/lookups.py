@@ -0,0 +1,168 @@
+"""
+Immutable lookup tables for the static Doctorsender data (countries, languages and categories) with a precomputed
+reverse index from name to id.
+
+>>> Languages.default()[3]
+'English'
+>>> Languages.default().id('english')
+3
+>>> Countries.default().search('united')
+{'ARE': 'United Arab Emirates', 'GBR': 'United Kingdom', ...}
+
+The defaults are built from pydoctorsender.statics, they can be refreshed from the live API and persisted:
+
+>>> Languages.refresh(client)
+>>> Languages.default().dump('languages.json')
+>>> Languages.set_default(Languages.load('languages.json'))
+"""
+from collections.abc import Mapping
+
+
+class LookupTable(Mapping):
+    """Read-only mapping from id to name, with a case-insensitive reverse index from name to ids"""
+
+    __slots__ = ('_by_id', '_by_name')
+
+    # Name of the DoctorSenderClient method and pydoctorsender.statics dict the table is built from
+    source = None
+    _default = None
+
+    def __init__(self, entries: dict):
+        """
+        :param entries: Dict with the ids (in any form accepted by _key) as keys and the names as values
+        """
+        by_id = {self._key(k): v for k, v in entries.items()}
+        by_name = {}
+        for k, v in by_id.items():
+            by_name.setdefault(v.casefold(), []).append(k)
+
+        object.__setattr__(self, '_by_id', by_id)
+        # Names are not unique (e.g. two categories are called 'Shopping'), so every name maps to a tuple of ids
+        object.__setattr__(self, '_by_name', {name: tuple(ids) for name, ids in by_name.items()})
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @staticmethod
+    def _key(key):
+        return int(key)
+
+    def __getitem__(self, key) -> str:
+        try:
+            return self._by_id[self._key(key)]
+        except (TypeError, ValueError, AttributeError):
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        try:
+            return self._key(key) in self._by_id
+        except (TypeError, ValueError, AttributeError):
+            return False
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self)} entries)"
+
+    def ids(self, name: str) -> tuple:
+        """
+        :param name: String with the name, case-insensitive
+        :return: Tuple with all ids that carry the name, empty if there is none
+        """
+        return self._by_name.get(name.casefold(), ())
+
+    def id(self, name: str):
+        """
+        :param name: String with the name, case-insensitive
+        :return: The (first) id with that name, raises KeyError if there is none
+        """
+        ids = self.ids(name)
+        if not ids:
+            raise KeyError(name)
+        return ids[0]
+
+    def search(self, text: str) -> dict:
+        """
+        :param text: String that is searched for in the names, case-insensitive
+        :return: Dict with id and name of all entries whose name contains text
+        """
+        text = text.casefold()
+        return {k: v for k, v in self._by_id.items() if text in v.casefold()}
+
+    def dump(self, path: str):
+        """Persists the table as compact json snapshot"""
+        import json
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([[k, v] for k, v in self._by_id.items()], f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'LookupTable':
+        """Loads a table from a snapshot written with dump()"""
+        import json
+
+        with open(path, encoding='utf-8') as f:
+            return cls(dict(json.load(f)))
+
+    @classmethod
+    def from_client(cls, client) -> 'LookupTable':
+        """
+        :param client: DoctorSenderClient
+        :return: A new table built from the live API
+        """
+        return cls(getattr(client, cls.source)())
+
+    @classmethod
+    def default(cls) -> 'LookupTable':
+        """
+        :return: The table used for validation, built from pydoctorsender.statics unless set or refreshed
+        """
+        if cls._default is None:
+            from . import statics
+
+            cls._default = cls(getattr(statics, cls.source))
+        return cls._default
+
+    @classmethod
+    def set_default(cls, table: 'LookupTable'):
+        cls._default = table
+
+    @classmethod
+    def refresh(cls, client) -> 'LookupTable':
+        """
+        Rebuilds the default table from the live API
+
+        :param client: DoctorSenderClient
+        :return: The new default table
+        """
+        cls._default = cls.from_client(client)
+        return cls._default
+
+
+class Countries(LookupTable):
+    """Iso-3 country code to country name, codes are case-insensitive"""
+
+    __slots__ = ()
+    source = 'countries'
+
+    @staticmethod
+    def _key(key):
+        return key.upper()
+
+
+class Languages(LookupTable):
+    """Language id to language name"""
+
+    __slots__ = ()
+    source = 'languages'
+
+
+class Categories(LookupTable):
+    """Category id to category name"""
+
+    __slots__ = ()
+    source = 'categories'
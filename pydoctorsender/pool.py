@@ -0,0 +1,171 @@
+"""
+A pool of DoctorSenderClients for several accounts, sharing one HTTP connection pool and one set of worker threads.
+
+>>> pool = DoctorSenderPool({'shop_de': ('de@example.com', 'token_de'), 'shop_fr': ('fr@example.com', 'token_fr')})
+>>> pool['shop_de'].lists()
+>>> pool.fan_out('segment_count', {'shop_de': [101, 102], 'shop_fr': [201]})
+{'shop_de': {101: 5321, 102: 120}, 'shop_fr': {201: 77}}
+>>> pool.fan_out('lists')
+{'shop_de': {...}, 'shop_fr': {...}}
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from .doctorsender import DoctorSenderClient
+
+
+class DoctorSenderPool:
+    def __init__(self, accounts: dict, max_workers: int = 16, per_account_limit: int = 4, **client_kwargs):
+        """
+        :param accounts: Dict with an account name as key and a (user, token) tuple as value
+        :param max_workers: Int, threads (and pooled connections) shared by all accounts
+        :param per_account_limit: Int, max concurrent requests per account, so one busy account can't starve the others
+        :param client_kwargs: Passed on to every DoctorSenderClient (e.g. hooks or url)
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # All accounts talk to the same host, the clients only differ in the credentials of their envelopes, so they
+        # skip the validation round trip and share the session
+        self.clients = {name: DoctorSenderClient(user, token, session=self.session, validate=False, **client_kwargs)
+                        for name, (user, token) in accounts.items()}
+        self.per_account_limit = per_account_limit
+        # Free request slots and calls waiting for one per account. A call only goes to the shared workers once it has
+        # a slot, so calls of a busy account wait in their queue instead of blocking a worker
+        self._free = {name: per_account_limit for name in accounts}
+        self._waiting = {name: deque() for name in accounts}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers)
+
+    def __getitem__(self, account: str) -> DoctorSenderClient:
+        return self.clients[account]
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown()
+        self.session.close()
+
+    def call(self, account: str, method: str, *args, **kwargs):
+        """
+        Calls a client method, waiting for a free slot of the account first
+
+        :param account: String with the account name
+        :param method: String with the DoctorSenderClient method name, e.g. 'segment_count'
+        :return: Whatever the client method returns
+        """
+        return self.submit(account, method, *args, **kwargs).result()
+
+    def submit(self, account: str, method: str, *args, **kwargs) -> Future:
+        """
+        Schedules a client method call, it runs on the shared workers as soon as the account has a free slot
+
+        :param account: String with the account name
+        :param method: String with the DoctorSenderClient method name, e.g. 'segment_count'
+        :return: concurrent.futures.Future of the result
+        """
+        call = getattr(self.clients[account], method)
+        future = Future()
+
+        def run():
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = call(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                self._release(account)
+
+        with self._lock:
+            if self._free[account]:
+                self._free[account] -= 1
+            else:
+                self._waiting[account].append(run)
+                return future
+        self._executor.submit(run)
+        return future
+
+    def _release(self, account: str):
+        """Hands the slot of a finished call to the next waiting call of the account"""
+        with self._lock:
+            if not self._waiting[account]:
+                self._free[account] += 1
+                return
+            run = self._waiting[account].popleft()
+        self._executor.submit(run)
+
+    def fan_out(self, method: str, args=None, accounts: list = None, return_exceptions: bool = False, **kwargs) -> dict:
+        """
+        Calls a client method concurrently for several accounts, every account gets at most per_account_limit of the
+        shared workers at a time and accounts are served round robin.
+
+        :param method: String with the DoctorSenderClient method name, e.g. 'segment_count'
+        :param args: None to call the method once per account, a list of arguments to call it once per argument and
+            account (use tuples for methods with several positional arguments) or a dict with the account name as key
+            and such a list as value. The arguments are the keys of the result, so they have to be hashable.
+        :param accounts: List of account names, defaults to all accounts (ignored if args is a dict)
+        :param return_exceptions: Bool, if True exceptions are returned as results, otherwise the first one is raised
+            once all calls finished
+        :param kwargs: Keyword arguments passed to every call
+        :return: Dict with the account name as key and either the result (args is None) or a dict with argument as key
+            and result as value
+        """
+        if isinstance(args, dict):
+            per_account = args
+        else:
+            per_account = {account: args for account in (accounts if accounts is not None else self.clients)}
+
+        calls = {}
+        for account, account_args in per_account.items():
+            if account_args is None:
+                calls[account] = [(None, ())]
+                continue
+            calls[account] = [(arg, arg if isinstance(arg, tuple) else (arg,)) for arg in account_args]
+            for arg, _ in calls[account]:
+                try:
+                    hash(arg)
+                except TypeError:
+                    raise TypeError(f"fan_out arguments are the keys of the result and have to be hashable, got "
+                                    f"{type(arg).__name__} for account {account}")
+
+        # Submitted round robin, so the first slots of every account are in the queue of the workers early on
+        futures = {account: [] for account in calls}
+        for i in range(max((len(account_calls) for account_calls in calls.values()), default=0)):
+            for account, account_calls in calls.items():
+                if i < len(account_calls):
+                    futures[account].append(self.submit(account, method, *account_calls[i][1], **kwargs))
+        wait([future for account_futures in futures.values() for future in account_futures])
+
+        results = {}
+        errors = []
+        for account, account_calls in calls.items():
+            outcomes = []
+            for future in futures[account]:
+                error = future.exception()
+                if error is not None:
+                    errors.append(error)
+                outcomes.append(error if error is not None else future.result())
+            if per_account[account] is None:
+                results[account] = outcomes[0]
+            else:
+                results[account] = {arg: outcome for (arg, _), outcome in zip(account_calls, outcomes)}
+
+        if errors and not return_exceptions:
+            raise errors[0]
+        return results
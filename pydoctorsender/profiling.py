@@ -0,0 +1,213 @@
+"""
+Opt-in profiling of single calls. A Profiler passed to the client captures a cProfile profile and the tracemalloc peak
+of every stage of a request (build: the envelope, network: the POST, parse: xml2dict, _remove_env_str and _key_value)
+for a sample of the calls and for calls above a size or latency threshold, and writes them to local files. Profiling
+costs nothing for the calls that are not captured.
+
+>>> profiler = Profiler('profiles', sample_rate=0.01, latency_threshold=5, size_threshold=10 * 1024 * 1024)
+>>> client = DoctorSenderClient('user@doctorsender.com', 'example_api_token', profiler=profiler)
+>>> with profiler.profile('dsCampaignGetAll', 'process'):  # your own code working on the result
+...     campaigns = process(client.list_campaigns(sql_where, fields))
+>>> profiler.report()['dsCampaignGetAll']['parse']
+{'calls': 3, 'time': 12.3, 'max_time': 5.1, 'peak_memory': 734003200, 'top': [('xml2dict.py:40(parse)', ...), ...]}
+>>> profiler.stats('dsCampaignGetAll', 'parse').sort_stats('cumulative').print_stats(20)
+
+The size threshold is known once the response arrived, so it captures the parse stage of that call. The latency is
+only known at the end of a call, a call above the latency threshold arms the profiler for the next call of the same
+method. tracemalloc is process wide, the memory of concurrent calls is attributed to every stage running at the time,
+and responses decoded in a parse_executor are parsed in another process, outside of the profile. With a
+HedgingPolicy the requests of a call run on helper threads, outside of the profile: the network stage is the time the
+calling thread waited for the first response.
+"""
+import cProfile
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class ProfiledCall:
+    """The profiling state of one request, created by Profiler.call"""
+
+    __slots__ = ('profiler', 'method', 'active', 'stages', 'prefix')
+
+    def __init__(self, profiler: 'Profiler', method: str, active: bool):
+        self.profiler = profiler
+        self.method = method
+        self.active = active
+        # Stage name -> (seconds, peak bytes of traced memory, files)
+        self.stages = {}
+        self.prefix = None
+
+    def stage(self, name: str):
+        """Context manager profiling a stage of the call, does nothing if the call is not captured"""
+        return self.profiler._stage(self, name) if self.active else nullcontext()
+
+    def response_size(self, size: int):
+        """Captures the remaining stages of a call whose response reached the size threshold"""
+        threshold = self.profiler.size_threshold
+        if not self.active and threshold is not None and size >= threshold:
+            self.active = True
+
+
+class Profiler:
+    def __init__(self, path: str, sample_rate: float = 0.0, latency_threshold: float = None,
+                 size_threshold: int = None, methods: list = None, cpu: bool = True, memory: bool = True,
+                 max_calls: int = 1000):
+        """
+        :param path: String with the directory the profiles are written to, created if it does not exist
+        :param sample_rate: Float between 0 and 1, the fraction of calls that are captured
+        :param latency_threshold: Float, seconds, a call taking longer arms the profiler for the next call of the method
+        :param size_threshold: Int, bytes, the parse stage of calls with a larger response is captured
+        :param methods: Optional list of SOAP method names, other methods are never captured
+        :param cpu: Bool, capture cProfile profiles (.prof files, readable with pstats or snakeviz)
+        :param memory: Bool, capture tracemalloc peaks and snapshots (.mem files, tracemalloc.Snapshot.load)
+        :param max_calls: Int, no more calls are captured once this many were written
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.latency_threshold = latency_threshold
+        self.size_threshold = size_threshold
+        self.methods = set(methods) if methods else None
+        self.cpu = cpu
+        self.memory = memory
+        self.max_calls = max_calls
+        os.makedirs(path, exist_ok=True)
+        # Summary of every captured stage: (method, stage, seconds, peak bytes, files)
+        self.records = []
+        self._armed = set()
+        self._captured = 0
+        self._counter = itertools.count()
+        self._tracing = 0
+        self._lock = threading.Lock()
+
+    def call(self, method: str):
+        """
+        Decides whether a request is captured, called by the client at the start of every request
+
+        :return: ProfiledCall, or None if nothing of the call can be captured
+        """
+        if self.methods is not None and method not in self.methods or self._captured >= self.max_calls:
+            return None
+        active = method in self._armed or (self.sample_rate and random.random() < self.sample_rate)
+        if active:
+            self._armed.discard(method)
+        elif self.size_threshold is None and self.latency_threshold is None:
+            return None
+        return ProfiledCall(self, method, bool(active))
+
+    def finish(self, call: ProfiledCall, event):
+        """
+        Called by the client at the end of every request with a ProfiledCall
+
+        :param call: ProfiledCall returned by call()
+        :param event: RequestEvent of the request
+        """
+        if call.stages:
+            with self._lock:
+                self._captured += 1
+        elif self.latency_threshold is not None and event.total_time >= self.latency_threshold:
+            self._armed.add(call.method)
+
+    @contextmanager
+    def profile(self, method: str, stage: str = 'process'):
+        """
+        Captures your own code, e.g. the processing of a result, under a method and stage of the report
+
+        :param method: String, the method the code belongs to (or any other label)
+        :param stage: String with the stage name
+        """
+        with self._stage(ProfiledCall(self, method, True), stage):
+            yield
+
+    def _file(self, call: ProfiledCall, stage: str, suffix: str) -> str:
+        if call.prefix is None:
+            call.prefix = f'{call.method}-{time.strftime("%Y%m%d-%H%M%S")}-{next(self._counter):06d}'
+        return os.path.join(self.path, f'{call.prefix}.{stage}.{suffix}')
+
+    @contextmanager
+    def _stage(self, call: ProfiledCall, stage: str):
+        profile = cProfile.Profile() if self.cpu else None
+        if self.memory:
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._tracing += 1
+                elif self._tracing:
+                    self._tracing += 1
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if profile is not None:
+            try:
+                if sys.getprofile() is not None:
+                    raise ValueError
+                profile.enable()
+            except ValueError:
+                # Another profiler is active in this thread (e.g. profile() around the call), it covers the stage
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            files = []
+            peak = None
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot()
+                with self._lock:
+                    # Tracing is stopped again by the last stage, unless it was started outside of the profiler
+                    if self._tracing:
+                        self._tracing -= 1
+                        if not self._tracing:
+                            tracemalloc.stop()
+                files.append(self._file(call, stage, 'mem'))
+                snapshot.dump(files[-1])
+            if profile is not None:
+                files.append(self._file(call, stage, 'prof'))
+                profile.dump_stats(files[-1])
+            call.stages[stage] = (seconds, peak, files)
+            with self._lock:
+                self.records.append((call.method, stage, seconds, peak, files))
+
+    def stats(self, method: str, stage: str) -> pstats.Stats:
+        """
+        :return: pstats.Stats merging the profiles of all captured calls of a method and stage, None if there are none
+        """
+        files = [f for m, s, _, _, fs in self.records if (m, s) == (method, stage) for f in fs if f.endswith('.prof')]
+        return pstats.Stats(*files) if files else None
+
+    def report(self, top: int = 10) -> dict:
+        """
+        :param top: Int, number of functions listed per stage
+        :return: Dict with the method as key and a dict with the stage as key and a dict of calls, time (total
+            seconds), max_time, peak_memory (largest peak in bytes, None without memory capture) and top (list of
+            (function, calls, own seconds, cumulative seconds) tuples, the largest cumulative time first) as value
+        """
+        with self._lock:
+            records = list(self.records)
+        report = {}
+        for method, stage, seconds, peak, _ in records:
+            summary = report.setdefault(method, {}).setdefault(
+                stage, {'calls': 0, 'time': 0.0, 'max_time': 0.0, 'peak_memory': None, 'top': []})
+            summary['calls'] += 1
+            summary['time'] += seconds
+            summary['max_time'] = max(summary['max_time'], seconds)
+            if peak is not None:
+                summary['peak_memory'] = max(summary['peak_memory'] or 0, peak)
+
+        for method, stages in report.items():
+            for stage, summary in stages.items():
+                stats = self.stats(method, stage) if self.cpu else None
+                if stats is None:
+                    continue
+                functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+                summary['top'] = [(f'{os.path.basename(file)}:{line}({name})', calls, own, cumulative)
+                                  for (file, line, name), (_, calls, own, cumulative, _) in functions]
+        return report
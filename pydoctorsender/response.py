@@ -1,25 +1,83 @@
+from types import SimpleNamespace
+
 from .xml2dict import xml2dict
 from .errors import DrsReturnError, DrsParserError
 
 
+def decode(xml: bytes, records: bool = False) -> tuple:
+    """
+    Parses and reduces a raw API response. This is the CPU heavy part of every call, it is a module level function so
+    it can be handed to a process pool for large responses, only the raw bytes go in and the reduced content comes out
+
+    :param xml: Bytes with the raw SOAP response
+    :param records: Bool, if True the content is reduced to a list of dicts (see DrsResponse)
+    :return: Tuple of (content, error), as accepted by DrsResponse(res, decoded=...)
+    """
+    drs_response = DrsResponse(SimpleNamespace(content=xml), records=records)
+    drs_response.reduce()
+    return drs_response.decoded
+
+
 class DrsResponse:
     """
     The DrsResponse object deals with the (pretty convoluted) xml response of the Doctorsender API
     """
 
-    def __init__(self, res):
+    def __init__(self, res, decoded: tuple = None, records: bool = False):
         """
         Initialize a DrsResponse object with an API return
         :param res: A requests Response object, containing the response of an Doctorsender API call
+        :param decoded: Tuple as returned by decode(), if the response was already decoded elsewhere (e.g. in a
+            process pool). The response dict is not kept there, dict is None then.
+        :param records: Bool, if True the content is a list of records (e.g. the campaigns of dsCampaignGetAll), each
+            one a dict with the field name as key, instead of the key value reduction of the other methods
         """
         self.xml = res.content
-        self._xml2dict()
+        self.records = records
+        if decoded is None:
+            self._xml2dict()
+            self._content = None
+            self._error = None
+            self._reduced = False
+        else:
+            self.dict = None
+            self._content, self._error = decoded
+            self._reduced = True
+
+    @property
+    def decoded(self) -> tuple:
+        """
+        :return: Tuple of (content, error), both are only set once reduce() ran
+        """
+        return self._content, self._error
 
     @property
     def content(self):
         """
         :return: Returns the inner content of the API response (remove all unnecessary stuff around
         """
+        if not self._reduced:
+            self.reduce()
+        if self._error is not None:
+            raise self._error
+        return self._content
+
+    def reduce(self):
+        """
+        Reduces the response dict to its inner content once, the result (or the error raised while doing so) is
+        cached so repeated access to .content does not walk the dict again
+
+        :return: The exception raised while reducing, None if the response was reduced successfully
+        """
+        if not self._reduced:
+            try:
+                self._content = self._reduce()
+            except Exception as e:
+                self._error = e
+            self._reduced = True
+        return self._error
+
+    def _reduce(self):
         if 'Fault' in self.dict['Envelope']['Body']:
             error_code = self.dict['Envelope']['Body']['Fault']['faultcode']
             error_msg = self.dict['Envelope']['Body']['Fault']['faultstring']
@@ -94,10 +152,31 @@ class DrsResponse:
                     raise DrsReturnError(res_list[i + 1]['item']['value'])
 
             elif sub_dict['item']['key'] == 'msg':
-                res_dict = self._key_value(sub_dict['item']['value'])
+                if self.records:
+                    res_dict = self._records(sub_dict['item']['value'])
+                else:
+                    res_dict = self._key_value(sub_dict['item']['value'])
 
         return res_dict
 
+    @staticmethod
+    def _records(ele) -> list:
+        # No records come back as empty string, a single one as dict instead of a list of dicts
+        if not ele:
+            return []
+        if isinstance(ele, dict):
+            ele = [ele]
+        try:
+            records = []
+            for record in ele:
+                fields = record['item']
+                if isinstance(fields, dict):
+                    fields = [fields]
+                records.append({field['item']['key']: field['item']['value'] for field in fields})
+        except (KeyError, TypeError):
+            raise DrsParserError(f"Response is not a list of records: {ele!r:.200}")
+        return records
+
     def _remove_env_str(self, d):
         for k, v in d.items():
             if type(v) == dict:
@@ -0,0 +1,339 @@
+"""
+Schedules sends over the capacity of the ip groups. Campaigns sent through the same ip group at the same time share its
+throughput, and bursts of several sends get throttled. The scheduler models the capacity (emails per second) of every
+ip group in time slots and picks, earliest deadline first, the lowest speed and the earliest slots that get each send
+out before its deadline: a single programmed send if possible, otherwise a multidate split over several slots.
+
+Naive datetimes are taken in the time zone of the send (the time_zone argument of send_campaign_list, Europe/Madrid by
+default) and the programmed dates are computed in it, whatever the time zone of the machine running the scheduler.
+
+>>> scheduler = SendScheduler(client, capacity={'default': 200})
+>>> plan = scheduler.plan([
+...     PendingSend(4711, 'newsletter', segment_id=12, start=dt.datetime(2020, 1, 1, 8),
+...                 deadline=dt.datetime(2020, 1, 1, 12)),
+...     PendingSend(4712, 'newsletter', start=dt.datetime(2020, 1, 1, 8), deadline=dt.datetime(2020, 1, 1, 10)),
+... ])
+>>> plan
+[<ScheduledSend 4712 120/s at 2020-01-01 08:00:00>, <ScheduledSend 4711 80/s at 2020-01-01 08:00:00>]
+>>> scheduler.apply(plan)  # calls send_campaign_list for every send
+"""
+import datetime as dt
+import inspect
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+
+from .doctorsender import DoctorSenderClient
+from .errors import DrsScheduleError
+
+DEFAULT_TIME_ZONE = inspect.signature(DoctorSenderClient.send_campaign_list).parameters['time_zone'].default
+
+
+def _timestamp(value: dt.datetime, time_zone: str) -> float:
+    """Epoch seconds of a datetime, naive ones are taken in time_zone"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=ZoneInfo(time_zone))
+    return value.timestamp()
+
+
+def _deadline(send: 'PendingSend', now: float) -> dt.datetime:
+    """The deadline of a send, one day from now if it has none"""
+    if send.deadline is None:
+        return dt.datetime.fromtimestamp(now + 86400, dt.timezone.utc)
+    return send.deadline
+
+
+class PendingSend:
+    """A campaign to be sent to a list or segment within a time window"""
+
+    __slots__ = ('campaign_id', 'list_name', 'segment_id', 'start', 'deadline', 'audience', 'ip_group', 'options')
+
+    def __init__(self, campaign_id: int, list_name: str, segment_id: int = 0, start: dt.datetime = None,
+                 deadline: dt.datetime = None, audience: int = None, ip_group: str = '', **options):
+        """
+        :param campaign_id: Int with the id of the campaign
+        :param list_name: String with the name of the list
+        :param segment_id: Int, id of the segment, 0 sends to the whole list
+        :param start: Datetime, the send starts at or after it, defaults to now
+        :param deadline: Datetime, the send has to be finished before it, one day after planning if None
+        :param audience: Int with the number of users, counted with segment_count (or the list count) if not given
+        :param ip_group: String with the ip group, defaults to the ip group of the client
+        :param options: Further arguments of send_campaign_list, e.g. time_zone or create_accum. Naive start and
+            deadline are in time_zone
+        """
+        self.campaign_id = campaign_id
+        self.list_name = list_name
+        self.segment_id = segment_id
+        self.start = start
+        self.deadline = deadline
+        self.audience = audience
+        self.ip_group = ip_group
+        self.options = options
+
+    @property
+    def time_zone(self) -> str:
+        return self.options.get('time_zone', DEFAULT_TIME_ZONE)
+
+    def __repr__(self):
+        return f"<PendingSend {self.campaign_id} until {self.deadline}>"
+
+
+class ScheduledSend:
+    """The speed and programmed dates of a send"""
+
+    __slots__ = ('send', 'ip_group', 'speed', 'dates', 'finish', 'slots')
+
+    def __init__(self, send: PendingSend, ip_group: str, speed: int, dates: list, finish: dt.datetime,
+                 slots: list = ()):
+        """
+        :param send: The PendingSend
+        :param ip_group: String with the ip group
+        :param speed: Int, emails per second
+        :param dates: List of naive datetimes in the time zone of the send, the programmed date or the multidate split
+            (the audience is split evenly)
+        :param finish: Naive datetime in the time zone of the send, the estimated end of the send
+        :param slots: List of the slots the send reserved capacity in
+        """
+        self.send = send
+        self.ip_group = ip_group
+        self.speed = speed
+        self.dates = dates
+        self.finish = finish
+        self.slots = list(slots)
+
+    @property
+    def campaign_id(self) -> int:
+        return self.send.campaign_id
+
+    def kwargs(self) -> dict:
+        """
+        :return: Dict with the arguments of DoctorSenderClient.send_campaign_list
+        """
+        kwargs = dict(self.send.options, campaign_id=self.send.campaign_id, list_name=self.send.list_name,
+                      ip_group_name=self.send.ip_group, segment_id=self.send.segment_id, speed=self.speed,
+                      programmed_date=self.dates[0], time_zone=self.send.time_zone)
+        if len(self.dates) > 1:
+            kwargs['multidate'] = self.dates
+        return kwargs
+
+    def __repr__(self):
+        dates = ', '.join(str(date) for date in self.dates)
+        return f"<ScheduledSend {self.campaign_id} {self.speed}/s at {dates}>"
+
+
+class SendScheduler:
+    def __init__(self, client, capacity=None, default_capacity: float = 100, min_speed: int = 1,
+                 max_speed: int = None, slot: int = 900, max_parts: int = 4, max_workers: int = 8):
+        """
+        :param client: DoctorSenderClient
+        :param capacity: Dict with the ip group as key and its capacity in emails per second as value
+        :param default_capacity: Float, emails per second of ip groups not in capacity
+        :param min_speed: Int, lowest speed of a send in emails per second
+        :param max_speed: Int, highest speed of a send in emails per second, defaults to the capacity of the ip group
+        :param slot: Int, length of a time slot in seconds, sends are programmed at the start of a slot
+        :param max_parts: Int, maximum number of dates a send is split over with multidate
+        :param max_workers: Int, maximum of concurrent segment_count and send_campaign_list calls
+        """
+        self.client = client
+        self.capacity = dict(capacity or {})
+        self.default_capacity = default_capacity
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.slot = slot
+        self.max_parts = max_parts
+        self.max_workers = max_workers
+        # Speed already scheduled per ip group and slot
+        self._used = {}
+        self._lock = threading.Lock()
+
+    def _ip_group(self, send: PendingSend) -> str:
+        return send.ip_group or self.client.ips
+
+    def _slot(self, timestamp: float, up: bool = False) -> int:
+        slots = timestamp / self.slot
+        return math.ceil(slots) if up else math.floor(slots)
+
+    def _date(self, slot: int, time_zone: str) -> dt.datetime:
+        """Naive datetime of the start of a slot in time_zone, as send_campaign_list expects it"""
+        return dt.datetime.fromtimestamp(slot * self.slot, ZoneInfo(time_zone)).replace(tzinfo=None)
+
+    def reserve(self, ip_group: str, start: dt.datetime, end: dt.datetime, speed: float,
+                time_zone: str = DEFAULT_TIME_ZONE):
+        """
+        Marks capacity as used, e.g. by sends that were programmed without the scheduler
+
+        :param ip_group: String with the ip group
+        :param start: Datetime, start of the send
+        :param end: Datetime, estimated end of the send
+        :param speed: Float, emails per second
+        :param time_zone: String, the time zone of naive start and end
+        """
+        with self._lock:
+            used = self._used.setdefault(ip_group, {})
+            first, last = self._slot(_timestamp(start, time_zone)), self._slot(_timestamp(end, time_zone), up=True)
+            for slot in range(first, last):
+                used[slot] = used.get(slot, 0) + speed
+
+    def release(self, scheduled: 'ScheduledSend'):
+        """Frees the capacity reserved by a planned send, e.g. one that could not be programmed"""
+        with self._lock:
+            self._release(scheduled)
+
+    def _release(self, scheduled: 'ScheduledSend'):
+        used = self._used.get(scheduled.ip_group, {})
+        for slot in scheduled.slots:
+            used[slot] = used.get(slot, 0) - scheduled.speed
+            if used[slot] <= 0:
+                del used[slot]
+        scheduled.slots = []
+
+    def free(self, ip_group: str, at: dt.datetime, time_zone: str = DEFAULT_TIME_ZONE) -> float:
+        """
+        :return: Float, emails per second of an ip group not yet scheduled at a point in time
+        """
+        slot = self._slot(_timestamp(at, time_zone))
+        return self.capacity.get(ip_group, self.default_capacity) - self._used.get(ip_group, {}).get(slot, 0)
+
+    def count(self, sends: list):
+        """Fills in the audience of the sends that don't have one, the counts run concurrently"""
+        missing = [send for send in sends if send.audience is None]
+        lists = {}
+        if any(not send.segment_id for send in missing):
+            lists = self.client.lists('') or {}
+
+        def count(send):
+            if send.segment_id:
+                return self.client.segment_count(send.segment_id)
+            return int(lists[send.list_name]['count'])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for send, audience in zip(missing, executor.map(count, missing)):
+                send.audience = audience
+
+    def _runs(self, free: list, parts: int, slots: int, speed: int):
+        """Start indices of the earliest parts non-overlapping runs of slots with room for speed, or None"""
+        starts = []
+        length = 0
+        for index, room in enumerate(free):
+            length = length + 1 if room >= speed else 0
+            if length == slots:
+                starts.append(index - slots + 1)
+                if len(starts) == parts:
+                    return starts
+                length = 0
+        return None
+
+    def _schedule(self, send: PendingSend, now: float) -> ScheduledSend:
+        ip_group = self._ip_group(send)
+        time_zone = send.time_zone
+        deadline = _deadline(send, now)
+        capacity = self.capacity.get(ip_group, self.default_capacity)
+        max_speed = int(min(capacity, self.max_speed or capacity))
+        start = now if send.start is None else max(_timestamp(send.start, time_zone), now)
+        first = self._slot(start, up=True)
+        last = self._slot(_timestamp(deadline, time_zone))
+        if last <= first:
+            raise DrsScheduleError(f"The window of campaign {send.campaign_id} is shorter than a slot")
+
+        used = self._used.setdefault(ip_group, {})
+        free = [capacity - used.get(slot, 0) for slot in range(first, last)]
+        audience = max(int(send.audience), 1)
+        # Fewer parts first, and for each the lowest speed: the send is spread as evenly as the capacity allows
+        for parts in range(1, self.max_parts + 1):
+            tried = set()
+            for slots in range(len(free) // parts, 0, -1):
+                speed = max(self.min_speed, math.ceil(audience / (parts * slots * self.slot)))
+                if speed > max_speed:
+                    break
+                if speed in tried:
+                    continue
+                tried.add(speed)
+                # The slots actually needed at this speed, rounding up the speed can make it fewer
+                needed = math.ceil(audience / (parts * speed * self.slot))
+                starts = self._runs(free, parts, needed, speed)
+                if starts is None:
+                    continue
+                slots = [slot for start in starts for slot in range(first + start, first + start + needed)]
+                for slot in slots:
+                    used[slot] = used.get(slot, 0) + speed
+                dates = [self._date(first + start, time_zone) for start in starts]
+                finish = dates[-1] + dt.timedelta(seconds=math.ceil(audience / parts / speed))
+                return ScheduledSend(send, ip_group, speed, dates, finish, slots)
+        raise DrsScheduleError(f"Campaign {send.campaign_id} with {audience} users can not be sent before "
+                               f"{deadline} within the capacity of ip group {ip_group}")
+
+    def plan(self, sends: list, return_exceptions: bool = False) -> list:
+        """
+        Computes the speed and dates of every send, earliest deadline first. The capacity used by the plan is reserved,
+        later plans are scheduled around it. If plan() raises, nothing stays reserved.
+
+        :param sends: List of PendingSend
+        :param return_exceptions: Bool, if True a DrsScheduleError is returned in place of a send that doesn't fit,
+            otherwise the first one is raised once all sends are planned
+        :return: List of ScheduledSend in the order they were scheduled
+        """
+        self.count(sends)
+        now = time.time()
+        planned = []
+        error = None
+        with self._lock:
+            try:
+                for send in sorted(sends, key=lambda send: (_timestamp(_deadline(send, now), send.time_zone),
+                                                            now if send.start is None else
+                                                            _timestamp(send.start, send.time_zone))):
+                    try:
+                        planned.append(self._schedule(send, now))
+                    except DrsScheduleError as e:
+                        if not return_exceptions and error is None:
+                            error = e
+                        planned.append(e)
+                if error is not None:
+                    raise error
+            except BaseException:
+                for scheduled in planned:
+                    if isinstance(scheduled, ScheduledSend):
+                        self._release(scheduled)
+                raise
+        return planned
+
+    def apply(self, plan: list, return_exceptions: bool = False) -> list:
+        """
+        Programs the planned sends with send_campaign_list, the calls run concurrently. The capacity reserved by sends
+        that failed is released.
+
+        :param plan: List of ScheduledSend as returned by plan(), exceptions in it are skipped
+        :param return_exceptions: Bool, if True errors are returned in place of the results, otherwise the first one
+            is raised once all calls finished
+        :return: List of the send_campaign_list results, one per ScheduledSend
+        """
+        scheduled = [send for send in plan if isinstance(send, ScheduledSend)]
+
+        def send_list(send):
+            try:
+                return self.client.send_campaign_list(**send.kwargs())
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(send_list, scheduled))
+        with self._lock:
+            for send, result in zip(scheduled, results):
+                if isinstance(result, Exception):
+                    self._release(send)
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    def schedule(self, sends: list, return_exceptions: bool = False) -> list:
+        """
+        plan() and apply() in one go
+
+        :return: List of ScheduledSend (or DrsScheduleError, with return_exceptions) of the programmed sends
+        """
+        plan = self.plan(sends, return_exceptions=return_exceptions)
+        self.apply(plan, return_exceptions=return_exceptions)
+        return plan
@@ -0,0 +1,168 @@
+"""
+Client-side checks for segment conditions. A condition Doctorsender rejects leaves the segment invalid (it has to be
+deleted and created again), so conditions are checked against the cached field schema of the list and the conditions
+already set on the segment before anything is sent.
+"""
+import threading
+import warnings
+
+from .errors import DrsSegmentError
+
+# The parameter comparator takes string versions of the standard Python comparators, mapped to the Doctorsender ones
+COMPARATORS = {'<': 'lt',
+               '>': 'gt',
+               '==': 'eq',
+               '!=': 'ne',
+               '<=': 'lte',
+               '>=': 'gte',
+               'like': 'like',
+               'not like': 'not like',
+               'in': 'in',
+               'not in': 'not in',
+               'segment': 'segment'}
+
+_text_types = {'varchar', 'char', 'text', 'string', 'str', 'email', 'enum'}
+_number_types = {'int', 'integer', 'tinyint', 'smallint', 'bigint', 'float', 'double', 'decimal', 'numeric', 'number'}
+_date_types = {'date', 'datetime', 'timestamp'}
+
+_ordering = {'<', '>', '<=', '>='}
+_pattern = {'like', 'not like'}
+
+
+def _base_type(field_type) -> str:
+    """'varchar(255)' -> 'varchar'"""
+    return str(field_type).split('(')[0].strip().lower()
+
+
+def check_condition(fields: dict, conditions: dict, field_name: str, comparator: str, value, is_date: bool = False):
+    """
+    Raises DrsSegmentError if Doctorsender would reject the condition
+
+    :param fields: Dict with field name as key and field type as value, as returned by get_list_fields
+    :param conditions: Dict with field name as key and (comparator, value) as value, the conditions of the segment
+    :param field_name: String, the field the condition compares against
+    :param comparator: String, one of the keys of COMPARATORS
+    :param value: The value the field is compared with
+    :param is_date: Bool, whether the value is a date
+    """
+    if comparator not in COMPARATORS:
+        raise DrsSegmentError(f"Comparator must be in {{{', '.join(COMPARATORS)}}}")
+    if comparator == 'segment':
+        return
+
+    if field_name not in fields:
+        raise DrsSegmentError(f"The field {field_name} does not exist in the list, available fields: "
+                              f"{', '.join(fields)}")
+    if field_name in conditions:
+        raise DrsSegmentError(f"The field {field_name} already has a condition "
+                              f"({' '.join(str(c) for c in conditions[field_name])}), each field can only have one")
+
+    field_type = _base_type(fields[field_name])
+    if field_type in _date_types and not is_date:
+        raise DrsSegmentError(f"The field {field_name} is a {field_type} field, set is_date=True")
+    if is_date and field_type in _text_types | _number_types:
+        raise DrsSegmentError(f"is_date is set but the field {field_name} is a {field_type} field")
+    if comparator in _pattern and field_type in _number_types | _date_types:
+        raise DrsSegmentError(f"'{comparator}' only works on text fields, {field_name} is a {field_type} field")
+    if comparator in _ordering and field_type in _text_types:
+        raise DrsSegmentError(f"'{comparator}' does not work on text fields, {field_name} is a {field_type} field")
+
+    if field_type in _number_types and comparator not in _pattern:
+        values = str(value).split(',') if comparator in {'in', 'not in'} else [value]
+        for v in values:
+            try:
+                float(v)
+            except ValueError:
+                raise DrsSegmentError(f"The field {field_name} is a {field_type} field, {v!r} is not a number")
+
+
+class SegmentConditionValidator:
+    """Caches list field schemas and the conditions of segments known to the client"""
+
+    def __init__(self, client):
+        """
+        :param client: DoctorSenderClient, used to fetch field schemas
+        """
+        self.client = client
+        self._fields = {}
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def fields(self, list_name: str) -> dict:
+        """
+        :param list_name: String with the list name
+        :return: Dict with field name as key and field type as value, fetched once per list
+        """
+        with self._lock:
+            fields = self._fields.get(list_name)
+        if fields is None:
+            fields = self.client.get_list_fields(list_name) or {}
+            with self._lock:
+                self._fields[list_name] = fields
+        return fields
+
+    def invalidate(self, list_name: str = None):
+        """Drops the cached schema of a list (or of all lists), e.g. after fields were added"""
+        with self._lock:
+            if list_name is None:
+                self._fields.clear()
+            else:
+                self._fields.pop(list_name, None)
+
+    def register_segment(self, segment_id: int, list_name: str, conditions: dict = None):
+        """
+        Makes a segment known, conditions are only checked for known segments
+
+        :param segment_id: Int with the segment id
+        :param list_name: String with the list the segment belongs to
+        :param conditions: Dict with field name as key and (comparator, value) as value, all conditions of the segment
+            (an empty dict for a new segment). None if they are unknown, e.g. for segments edited in the GUI, then
+            only the conditions added through the client can be checked for a second condition on the same field.
+        """
+        with self._lock:
+            self._segments[int(segment_id)] = (list_name, dict(conditions or {}), conditions is not None)
+
+    def known(self, segment_id: int) -> bool:
+        with self._lock:
+            return int(segment_id) in self._segments
+
+    def forget_segment(self, segment_id: int):
+        with self._lock:
+            self._segments.pop(int(segment_id), None)
+
+    def conditions(self, segment_id: int) -> dict:
+        """
+        :return: Dict with field name as key and (comparator, value) as value, None for unknown segments and segments
+            whose conditions are unknown
+        """
+        with self._lock:
+            segment = self._segments.get(int(segment_id))
+            return dict(segment[1]) if segment and segment[2] else None
+
+    def validate(self, segment_id: int, field_name: str, comparator: str, value, is_date: bool = False):
+        """Raises DrsSegmentError if the condition would be rejected, unknown segments are only checked for the
+        comparator"""
+        with self._lock:
+            segment = self._segments.get(int(segment_id))
+        if segment is None:
+            if comparator not in COMPARATORS:
+                raise DrsSegmentError(f"Comparator must be in {{{', '.join(COMPARATORS)}}}")
+            return
+        list_name, conditions, complete = segment
+        check_condition(self.fields(list_name), conditions, field_name, comparator, value, is_date)
+        if not complete and comparator != 'segment':
+            warnings.warn(f"Segment {segment_id} was not created through this client, its earlier conditions are "
+                          f"unknown: if one of them is on {field_name}, Doctorsender rejects the condition and the "
+                          f"segment becomes invalid", stacklevel=3)
+
+    def condition_added(self, segment_id: int, field_name: str, comparator: str, value):
+        with self._lock:
+            segment = self._segments.get(int(segment_id))
+            if segment is not None:
+                segment[1][field_name] = (comparator, value)
+
+    def condition_removed(self, segment_id: int, field_name: str):
+        with self._lock:
+            segment = self._segments.get(int(segment_id))
+            if segment is not None:
+                segment[1].pop(field_name, None)
@@ -0,0 +1,171 @@
+"""
+Runs account-wide operations (e.g. the user statistics of every campaign of a year) in several worker processes, so
+both the network wait and the XML parsing are spread over CPUs. Work is handed out through a JobQueue file, every
+process has its own DoctorSenderClient with its own connection pool, all processes share one global rate limit and the
+results come back in the order of the work list.
+
+>>> runner = ShardedRunner('user@doctorsender.com', 'example_api_token', processes=4, threads=8, rate_limit=20)
+>>> runner.map('campaign_get_user_statistics', [(campaign_id, 'openers') for campaign_id in campaign_ids])
+[['a@example.com', ...], ...]
+
+Passing a path makes the run resumable: running the same work list again after a crash only runs what is left. Jobs
+are keyed by a hash of the method and its arguments, so a different work list on the same path only reuses the results
+of identical calls. Pending or failed jobs of other work lists in the file are left alone.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .errors import DrsJobError
+from .instrumentation import Hook
+from .jobs import JobQueue
+
+
+class SharedRateLimit(Hook):
+    """Spaces the requests of all processes sharing it to at most rate per second"""
+
+    def __init__(self, rate: float, context=None):
+        """
+        :param rate: Float, maximum requests per second over all processes
+        :param context: Optional multiprocessing context the worker processes are started from
+        """
+        self.interval = 1.0 / rate
+        self._next = (context or multiprocessing).Value('d', 0.0)
+
+    def acquire(self):
+        """Blocks until the next request slot"""
+        with self._next.get_lock():
+            # time.monotonic is system-wide, so slots are comparable between processes
+            now = time.monotonic()
+            slot = max(now, self._next.value)
+            self._next.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_request_start(self, event):
+        self.acquire()
+
+
+def _work(path: str, run_id: str, user: str, token: str, client_kwargs: dict, threads: int,
+          rate_limit: SharedRateLimit):
+    """Entry point of a worker process: claims the jobs of the run from the queue file until none are left"""
+    import requests
+
+    from .doctorsender import DoctorSenderClient
+
+    hooks = list(client_kwargs.pop('hooks', None) or [])
+    if rate_limit is not None:
+        hooks.append(rate_limit)
+    client = DoctorSenderClient(user, token, hooks=hooks, session=requests.Session(), validate=False, **client_kwargs)
+    queue = JobQueue(path)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            # Claiming a few jobs ahead keeps the threads busy without hoarding jobs other processes could run
+            for key, method, args, kwargs in queue.claim(2 * threads - len(running), run_id):
+                running[executor.submit(getattr(client, method), *args, **kwargs)] = key
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                error = future.exception()
+                queue.checkpoint(key, None if error is not None else future.result(), error)
+    queue.close()
+
+
+class ShardedRunner:
+    def __init__(self, user: str, token: str, processes: int = None, threads: int = 4, rate_limit: float = None,
+                 path: str = None, **client_kwargs):
+        """
+        :param user: String with the Doctorsender user (email)
+        :param token: String with the API token
+        :param processes: Int, number of worker processes, defaults to the number of CPUs
+        :param threads: Int, concurrent calls per worker process
+        :param rate_limit: Float, maximum requests per second over all processes, unlimited if None
+        :param path: Optional string with the path of the JobQueue file, a temporary file removed after each run is
+            used if None. Only use it for calls that can safely be repeated, interrupted calls are run again.
+        :param client_kwargs: Keyword arguments for the DoctorSenderClient of every worker (must be picklable)
+        """
+        self.user = user
+        self.token = token
+        self.processes = processes or os.cpu_count() or 1
+        self.threads = threads
+        self.rate_limit = rate_limit
+        self.path = path
+        self.client_kwargs = client_kwargs
+
+    @staticmethod
+    def _key(method: str, args: tuple, kwargs: dict) -> str:
+        """Job key of a call, the same for the same method and arguments in every run"""
+        call = json.dumps([method, list(args), kwargs], sort_keys=True, default=str)
+        return f'{method}:{hashlib.sha256(call.encode("utf-8")).hexdigest()[:32]}'
+
+    def map(self, method: str, args: list, return_exceptions: bool = False, **kwargs) -> list:
+        """
+        Calls a client method once per entry of args, spread over the worker processes
+
+        :param method: String with the DoctorSenderClient method name, e.g. 'campaign_get_user_statistics'
+        :param args: List of arguments, tuples for methods with several positional arguments (JSON serializable)
+        :param return_exceptions: Bool, if True failed calls return a DrsJobError, otherwise the first one is raised
+            once all calls finished
+        :param kwargs: Keyword arguments passed to every call
+        :return: List with the result per entry of args, results are JSON round-tripped (e.g. tuples become lists)
+        """
+        path = self.path
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.sqlite', prefix='pydoctorsender-')
+            os.close(fd)
+
+        try:
+            calls = [arg if isinstance(arg, tuple) else (arg,) for arg in args]
+            keys = [self._key(method, call, kwargs) for call in calls]
+            run_id = uuid.uuid4().hex
+            with JobQueue(path) as queue:
+                for key, call in zip(keys, calls):
+                    queue.add(key, method, *call, **kwargs)
+                queue.assign(keys, run_id)
+                # Jobs of this work list that failed or were cut off by a crash in an earlier run are run again
+                queue.retry(keys, interrupted=True)
+
+            context = multiprocessing.get_context()
+            rate_limit = SharedRateLimit(self.rate_limit, context) if self.rate_limit else None
+            workers = [context.Process(target=_work, args=(path, run_id, self.user, self.token,
+                                                           dict(self.client_kwargs), self.threads, rate_limit),
+                                       daemon=True)
+                       for _ in range(min(self.processes, len(args)))]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            with JobQueue(path) as queue:
+                results, failed = queue.results(), queue.failed()
+        finally:
+            if self.path is None:
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+
+        crashed = [worker.exitcode for worker in workers if worker.exitcode]
+        output, errors = [], []
+        for i, key in enumerate(keys):
+            if key in results:
+                output.append(results[key])
+                continue
+            if key in failed:
+                error = DrsJobError(f"{method} of args[{i}] failed: {failed[key]}")
+            else:
+                error = DrsJobError(f"{method} of args[{i}] was not run, worker processes exited with {crashed}")
+            output.append(error)
+            errors.append(error)
+
+        if errors and not return_exceptions:
+            raise errors[0]
+        return output
@@ -0,0 +1,231 @@
+"""
+Audience overlap between campaigns, estimated from small sketches of the users a campaign was sent to. Every sketch
+combines a HyperLogLog (audience size and size of unions) with a bottom-k MinHash (Jaccard similarity), together a few
+KB per campaign, and the overlap of two audiences is estimated in microseconds. This is used to pick the campaigns
+worth excluding with set_exclusion instead of excluding long lists by guesswork.
+
+>>> store = SketchStore()
+>>> store.fetch(client, recent_campaign_ids)  # sketches the 'sent' users of every campaign
+>>> audience = AudienceSketch.from_emails(evaluator.users('germany'))
+>>> store.suggest_exclusions(audience, min_share=0.02)
+[4711, 4698]
+>>> client.set_exclusion(new_campaign_id, store.suggest_exclusions(audience, min_share=0.02))
+>>> store.save('sketches.bin')
+"""
+import hashlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("pydoctorsender.sketches requires NumPy, install it with 'pip install pydoctorsender[numpy]'")
+
+_magic = b'DRSK'
+_header = struct.Struct('<4sBHI')
+_entry = struct.Struct('<qH')
+# 2 ** -rank for every possible register value
+_inverse_powers = np.ldexp(1.0, -np.arange(65))
+
+
+def _hash(email: str) -> int:
+    """Stable 64 bit hash of a normalized email, the same in every process"""
+    return int.from_bytes(hashlib.blake2b(email.strip().lower().encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class AudienceSketch:
+    """HyperLogLog registers and bottom-k MinHash of a set of emails"""
+
+    __slots__ = ('registers', 'mins', 'k')
+
+    def __init__(self, registers, mins, k: int):
+        """
+        :param registers: NumPy uint8 array with the HyperLogLog registers, the length is a power of 2
+        :param mins: Sorted NumPy uint64 array with the (at most k) smallest hashes
+        :param k: Int, the number of hashes the MinHash keeps
+        """
+        self.registers = registers
+        self.mins = mins
+        self.k = k
+
+    @classmethod
+    def from_emails(cls, emails, p: int = 12, k: int = 256) -> 'AudienceSketch':
+        """
+        :param emails: Iterable of emails
+        :param p: Int, 2 ** p HyperLogLog registers, the standard error of the size estimate is 1.04 / sqrt(2 ** p)
+        :param k: Int, hashes kept by the MinHash, the standard error of the Jaccard estimate is about 1 / sqrt(k)
+        """
+        hashes = np.fromiter((_hash(email) for email in emails), dtype=np.uint64)
+        return cls.from_hashes(hashes, p, k)
+
+    @classmethod
+    def from_hashes(cls, hashes, p: int = 12, k: int = 256) -> 'AudienceSketch':
+        """
+        :param hashes: NumPy uint64 array of 64 bit hashes
+        """
+        registers = np.zeros(1 << p, dtype=np.uint8)
+        if len(hashes):
+            index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+            rest = hashes & np.uint64((1 << (64 - p)) - 1)
+            # Rank is the position of the first 1 bit in the remaining 64 - p bits, frexp gives the bit length
+            bit_length = np.frexp(rest.astype(np.float64))[1]
+            rank = (64 - p) - bit_length + 1
+            np.maximum.at(registers, index, rank.astype(np.uint8))
+        mins = np.unique(hashes)[:k]
+        return cls(registers, mins, k)
+
+    @property
+    def p(self) -> int:
+        return len(self.registers).bit_length() - 1
+
+    def cardinality(self) -> float:
+        """
+        :return: Float with the estimated number of distinct emails
+        """
+        if len(self.mins) < self.k:
+            # Small sets are fully contained in the MinHash, their size is exact
+            return float(len(self.mins))
+        return self._estimate(self.registers)
+
+    @staticmethod
+    def _estimate(registers) -> float:
+        m = len(registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / _inverse_powers[registers].sum()
+        zeros = m - np.count_nonzero(registers)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def union(self, other: 'AudienceSketch') -> 'AudienceSketch':
+        """
+        :return: AudienceSketch of the union of both audiences
+        """
+        mins = np.union1d(self.mins, other.mins)[:min(self.k, other.k)]
+        return AudienceSketch(np.maximum(self.registers, other.registers), mins, min(self.k, other.k))
+
+    def _shared(self, other: 'AudienceSketch') -> tuple:
+        """Size of the bottom-k of the union and how many of its hashes are in both MinHashes"""
+        k = min(self.k, other.k)
+        # Both are duplicate-free, so a hash that appears twice in the merged sort is in both
+        merged = np.sort(np.concatenate((self.mins, other.mins)))
+        duplicate = merged[1:] == merged[:-1]
+        distinct = len(merged) - np.count_nonzero(duplicate)
+        if distinct > k:
+            threshold = np.delete(merged, np.flatnonzero(duplicate))[k - 1]
+            return k, int(np.count_nonzero(merged[1:][duplicate] <= threshold))
+        return distinct, int(np.count_nonzero(duplicate))
+
+    def jaccard(self, other: 'AudienceSketch') -> float:
+        """
+        :return: Float with the estimated Jaccard similarity (intersection / union) of both audiences
+        """
+        size, shared = self._shared(other)
+        return shared / size if size else 0.0
+
+    def overlap(self, other: 'AudienceSketch') -> float:
+        """
+        :return: Float with the estimated number of emails in both audiences
+        """
+        size, shared = self._shared(other)
+        if not shared:
+            return 0.0
+        if size < min(self.k, other.k):
+            # Both audiences are fully contained in their MinHashes
+            return float(shared)
+        return shared / size * self._estimate(np.maximum(self.registers, other.registers))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes() + self.mins.astype('<u8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, p: int, k: int) -> 'AudienceSketch':
+        m = 1 << p
+        registers = np.frombuffer(data[:m], dtype=np.uint8).copy()
+        mins = np.frombuffer(data[m:], dtype='<u8').astype(np.uint64)
+        return cls(registers, mins, k)
+
+
+class SketchStore:
+    """Audience sketches of many campaigns"""
+
+    def __init__(self, p: int = 12, k: int = 256):
+        """
+        :param p: Int, 2 ** p HyperLogLog registers per sketch
+        :param k: Int, hashes kept by the MinHash of every sketch
+        """
+        self.p = p
+        self.k = k
+        self.sketches = {}
+
+    def __len__(self) -> int:
+        return len(self.sketches)
+
+    def __getitem__(self, campaign_id: int) -> AudienceSketch:
+        return self.sketches[int(campaign_id)]
+
+    def add(self, campaign_id: int, emails):
+        """Sketches the emails a campaign was sent to"""
+        self.sketches[int(campaign_id)] = AudienceSketch.from_emails(emails, self.p, self.k)
+
+    def fetch(self, client, campaign_ids: list, max_workers: int = 8):
+        """
+        Fetches the 'sent' users of campaigns (concurrently) and sketches them, campaigns already in the store are
+        skipped as their audience does not change after the send
+
+        :param client: DoctorSenderClient
+        :param campaign_ids: List of campaign ids
+        :param max_workers: Int, maximum of concurrent calls
+        """
+        campaign_ids = [int(campaign_id) for campaign_id in campaign_ids if int(campaign_id) not in self.sketches]
+
+        def sketch(campaign_id):
+            return AudienceSketch.from_emails(client.campaign_get_user_statistics(campaign_id, 'sent'),
+                                              self.p, self.k)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for campaign_id, audience in zip(campaign_ids, executor.map(sketch, campaign_ids)):
+                self.sketches[campaign_id] = audience
+
+    def overlaps(self, audience: AudienceSketch, campaign_ids: list = None) -> dict:
+        """
+        :param audience: AudienceSketch, e.g. of the users of a new campaign
+        :param campaign_ids: List of campaign ids to compare with, defaults to all
+        :return: Dict with the campaign id as key and the estimated number of shared emails as value
+        """
+        campaign_ids = self.sketches if campaign_ids is None else [int(c) for c in campaign_ids]
+        return {campaign_id: audience.overlap(self.sketches[campaign_id]) for campaign_id in campaign_ids}
+
+    def suggest_exclusions(self, audience: AudienceSketch, min_share: float = 0.01, max_campaigns: int = None,
+                           campaign_ids: list = None) -> list:
+        """
+        :param audience: AudienceSketch of the users of the new campaign
+        :param min_share: Float, campaigns sharing less than this fraction of the audience are not worth excluding
+        :param max_campaigns: Int, maximum number of campaigns to suggest
+        :param campaign_ids: List of campaign ids to consider, defaults to all
+        :return: List of campaign ids for set_exclusion, the largest overlap first
+        """
+        size = audience.cardinality()
+        overlaps = self.overlaps(audience, campaign_ids)
+        suggested = sorted((campaign_id for campaign_id, overlap in overlaps.items()
+                            if size and overlap / size >= min_share), key=overlaps.get, reverse=True)
+        return suggested[:max_campaigns] if max_campaigns else suggested
+
+    def save(self, path: str):
+        """Writes all sketches to a compact binary file"""
+        with open(path, 'wb') as f:
+            f.write(_header.pack(_magic, self.p, self.k, len(self.sketches)))
+            for campaign_id, audience in self.sketches.items():
+                f.write(_entry.pack(campaign_id, len(audience.mins)))
+                f.write(audience.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'SketchStore':
+        with open(path, 'rb') as f:
+            magic, p, k, count = _header.unpack(f.read(_header.size))
+            if magic != _magic:
+                raise ValueError(f"{path} is not a sketch file")
+            store = cls(p, k)
+            for _ in range(count):
+                campaign_id, n_mins = _entry.unpack(f.read(_entry.size))
+                store.sketches[campaign_id] = AudienceSketch.from_bytes(f.read((1 << p) + 8 * n_mins), p, k)
+        return store
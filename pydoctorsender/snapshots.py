@@ -0,0 +1,181 @@
+"""
+Snapshots of list exports for finding the subscribers that changed between two downloads. Every row of the export is
+reduced to its email and a 64 bit hash of the row, sorted by email with an external merge sort (bounded memory, sorted
+runs are written to temporary files) and written to a compact fingerprint file. Two snapshots are compared with a
+single streaming merge.
+
+>>> ListSnapshot.download(client, 'example_list', 'example_list-2020-01-02.snap')
+>>> for change, email in diff('example_list-2020-01-01.snap', 'example_list-2020-01-02.snap'):
+...     print(change, email)  # change is one of ADDED, REMOVED, MODIFIED
+"""
+import codecs
+import csv
+import hashlib
+import heapq
+import os
+import struct
+import tempfile
+from operator import itemgetter
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+_magic = b'DRSS\x01'
+_length = struct.Struct('<H')
+_digest_size = 8
+# Records are sorted by email only, the sort and the merge of the runs are stable, so rows of the same email stay in
+# export order
+_email = itemgetter(0)
+
+
+def _write_records(f, records):
+    for email, digest in records:
+        f.write(_length.pack(len(email)))
+        f.write(email)
+        f.write(digest)
+
+
+def _read_records(f):
+    """Yields (email, digest) tuples of a run or snapshot file, email as bytes"""
+    read = f.read
+    while True:
+        length = read(_length.size)
+        if not length:
+            return
+        email = read(_length.unpack(length)[0])
+        yield email, read(_digest_size)
+
+
+class ListSnapshot:
+    """A fingerprint file: (email, row hash) records sorted by email, one per subscriber"""
+
+    def __init__(self, path: str):
+        """
+        :param path: String with the path of a snapshot written by create() or download()
+        """
+        self.path = path
+
+    def __iter__(self):
+        """Yields (email, row digest) tuples in email order"""
+        for email, digest in self._records():
+            yield email.decode('utf-8'), digest
+
+    def _records(self):
+        with open(self.path, 'rb') as f:
+            if f.read(len(_magic)) != _magic:
+                raise ValueError(f"{self.path} is not a list snapshot")
+            yield from _read_records(f)
+
+    @classmethod
+    def create(cls, lines, path: str, key_field: str = 'email', delimiter: str = None,
+               run_size: int = 500000) -> 'ListSnapshot':
+        """
+        :param lines: Iterable of text lines of a list export (e.g. an open file), the first one being the header
+        :param path: String with the path of the snapshot file to write
+        :param key_field: String with the field identifying a subscriber
+        :param delimiter: String, detected from the header if not given
+        :param run_size: Int, rows sorted in memory at a time, bounds the memory used
+        """
+        lines = iter(lines)
+        header = next(lines, '')
+        if delimiter is None:
+            delimiter = max(',;\t|', key=header.count)
+        fields = next(csv.reader([header], delimiter=delimiter))
+        key_index = fields.index(key_field)
+        # Fields are hashed in name order, so a change in the column order of the export doesn't modify every row
+        order = sorted(range(len(fields)), key=fields.__getitem__)
+
+        runs = []
+        records = []
+        try:
+            for row in csv.reader(lines, delimiter=delimiter):
+                if len(row) <= key_index:
+                    continue
+                email = row[key_index].strip().lower().encode('utf-8')
+                values = '\x1f'.join(row[i] if i < len(row) else '' for i in order).encode('utf-8')
+                records.append((email, hashlib.blake2b(values, digest_size=_digest_size).digest()))
+                if len(records) >= run_size:
+                    runs.append(cls._write_run(records))
+                    records = []
+
+            records.sort(key=_email)
+            if runs:
+                runs.append(cls._write_run(records))
+                files = [open(run, 'rb') for run in runs]
+                try:
+                    cls._write(path, heapq.merge(*(_read_records(f) for f in files), key=_email))
+                finally:
+                    for f in files:
+                        f.close()
+            else:
+                cls._write(path, records)
+        finally:
+            for run in runs:
+                os.remove(run)
+        return cls(path)
+
+    @staticmethod
+    def _write_run(records: list) -> str:
+        """Writes sorted records to a temporary file and returns its path"""
+        records.sort(key=_email)
+        fd, run = tempfile.mkstemp(suffix='.run', prefix='pydoctorsender-')
+        with os.fdopen(fd, 'wb') as f:
+            _write_records(f, records)
+        return run
+
+    @staticmethod
+    def _write(path: str, records):
+        def unique(records):
+            # A list can contain an email more than once, the first row of the export wins
+            last = None
+            for email, digest in records:
+                if email != last:
+                    yield email, digest
+                    last = email
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_magic)
+            _write_records(f, unique(records))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def download(cls, client, list_name: str, path: str, key_field: str = 'email', run_size: int = 500000,
+                 timeout: float = 600) -> 'ListSnapshot':
+        """
+        Requests the export of a list and streams it into a snapshot, the export is never held in memory
+
+        :param client: DoctorSenderClient
+        :param list_name: String with the list name
+        :param path: String with the path of the snapshot file to write
+        :param timeout: Float, seconds to wait for the export to get ready
+        """
+        link = client.download_list(list_name)
+        with client.open_download(link, timeout=timeout) as response:
+            lines = codecs.iterdecode(response.iter_lines(), 'utf-8')
+            return cls.create(lines, path, key_field=key_field, run_size=run_size)
+
+
+def diff(old, new):
+    """
+    Compares two snapshots with a streaming merge, in time linear in their size and constant memory
+
+    :param old: ListSnapshot or path of the older snapshot
+    :param new: ListSnapshot or path of the newer snapshot
+    :return: Generator of (change, email) tuples in email order, change being ADDED, REMOVED or MODIFIED
+    """
+    old = (old if isinstance(old, ListSnapshot) else ListSnapshot(old))._records()
+    new = (new if isinstance(new, ListSnapshot) else ListSnapshot(new))._records()
+    old_record, new_record = next(old, None), next(new, None)
+    while old_record is not None or new_record is not None:
+        if new_record is None or (old_record is not None and old_record[0] < new_record[0]):
+            yield REMOVED, old_record[0].decode('utf-8')
+            old_record = next(old, None)
+        elif old_record is None or new_record[0] < old_record[0]:
+            yield ADDED, new_record[0].decode('utf-8')
+            new_record = next(new, None)
+        else:
+            if old_record[1] != new_record[1]:
+                yield MODIFIED, new_record[0].decode('utf-8')
+            old_record, new_record = next(old, None), next(new, None)
@@ -3,6 +3,8 @@ Some things in Doctorsender are static, and this file contains three dictionarie
 categories
 countries
 languages
+
+Use the tables in pydoctorsender.lookups for lookups, they are built from these dicts.
 """
 
 categories = {
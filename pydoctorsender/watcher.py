@@ -0,0 +1,232 @@
+"""
+Watches in-flight campaigns. All campaigns that are due are polled together in batched dsCampaignGetAll calls and
+every campaign gets its own polling interval: campaigns that are moving fast or are about to finish are polled often,
+idle ones back off, and finished ones are dropped. Only a final status ends watching a campaign: a campaign missing
+from a response, or a failed call, backs the campaigns off like an unchanged poll.
+
+>>> watcher = CampaignWatcher(client, on_change=print)
+>>> watcher.watch([4711, 4712])
+>>> watcher.run()  # blocks until all campaigns finished
+
+Or as async iterator:
+
+>>> async for change in watcher.changes():
+...     print(change.campaign_id, change.changes)
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = ('status', 'amount', 'deliveries', 'opens', 'clicks', 'bounced', 'unsubscribes')
+
+
+class CampaignChange:
+    """A change of one or more tracked fields of a campaign"""
+
+    __slots__ = ('campaign_id', 'changes', 'campaign', 'finished')
+
+    def __init__(self, campaign_id: int, changes: dict, campaign: dict, finished: bool):
+        """
+        :param campaign_id: Int with the campaign id
+        :param changes: Dict with field name as key and (old value, new value) as value
+        :param campaign: Dict with the campaign as returned by DoctorSenderClient.campaigns
+        :param finished: Bool, True if the campaign reached a final status and is no longer watched
+        """
+        self.campaign_id = campaign_id
+        self.changes = changes
+        self.campaign = campaign
+        self.finished = finished
+
+    def __repr__(self):
+        return f"<CampaignChange {self.campaign_id} {self.changes}{' finished' if self.finished else ''}>"
+
+
+class _Watched:
+    __slots__ = ('values', 'interval', 'next_poll', 'last_poll', 'deliveries')
+
+    def __init__(self, interval: float):
+        self.values = None
+        self.interval = interval
+        self.next_poll = 0.0
+        self.last_poll = None
+        self.deliveries = None
+
+
+class CampaignWatcher:
+    def __init__(self, client, on_change=None, min_interval: float = 10.0, max_interval: float = 900.0,
+                 backoff: float = 2.0, final_statuses=('finished', 'cancelled'), batch_size: int = 500):
+        """
+        :param client: DoctorSenderClient
+        :param on_change: Optional callable, called with a CampaignChange for every change
+        :param min_interval: Float, shortest polling interval of a campaign in seconds
+        :param max_interval: Float, longest polling interval of a campaign in seconds
+        :param backoff: Float, factor the interval of a campaign grows by while it does not change
+        :param final_statuses: Statuses after which a campaign is no longer watched
+        :param batch_size: Int, campaigns per dsCampaignGetAll call
+        """
+        self.client = client
+        self.callbacks = [on_change] if on_change else []
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.final_statuses = set(final_statuses)
+        self.batch_size = batch_size
+        self.calls = 0
+        self.errors = 0
+        self._campaigns = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._campaigns)
+
+    def watch(self, campaign_ids: list):
+        """Starts watching campaigns, they are polled on the next poll"""
+        with self._lock:
+            for campaign_id in campaign_ids:
+                self._campaigns.setdefault(int(campaign_id), _Watched(self.min_interval))
+
+    def unwatch(self, campaign_ids: list):
+        with self._lock:
+            for campaign_id in campaign_ids:
+                self._campaigns.pop(int(campaign_id), None)
+
+    def interval(self, campaign_id: int) -> float:
+        """
+        :return: Float with the current polling interval of a campaign in seconds
+        """
+        return self._campaigns[int(campaign_id)].interval
+
+    def next_poll_in(self) -> float:
+        """
+        :return: Float with the seconds until the next campaign is due, 0 if one is due now, None if there are none
+        """
+        with self._lock:
+            if not self._campaigns:
+                return None
+            return max(0.0, min(w.next_poll for w in self._campaigns.values()) - time.monotonic())
+
+    def _next_interval(self, watched: _Watched, campaign: dict, changed: bool, now: float) -> float:
+        deliveries = _to_int(campaign.get('deliveries'))
+        amount = _to_int(campaign.get('amount'))
+        interval = watched.interval
+
+        if watched.last_poll is not None and deliveries > watched.deliveries and amount > deliveries:
+            # Sending: poll again around the time the campaign is halfway to finishing at the current rate
+            rate = (deliveries - watched.deliveries) / (now - watched.last_poll)
+            interval = (amount - deliveries) / rate / 2
+        elif changed:
+            interval = interval / self.backoff
+        else:
+            interval = interval * self.backoff
+
+        watched.deliveries = deliveries
+        watched.last_poll = now
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _back_off(self, watched: _Watched, now: float):
+        watched.interval = min(max(watched.interval * self.backoff, self.min_interval), self.max_interval)
+        watched.next_poll = now + watched.interval
+
+    def poll_once(self) -> list:
+        """
+        Polls all campaigns that are due. A failed dsCampaignGetAll call is logged and counted in errors, the
+        campaigns of its batch are polled again after a longer interval.
+
+        :return: List of CampaignChange, also handed to the callbacks
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [campaign_id for campaign_id, w in self._campaigns.items() if w.next_poll <= now]
+
+        changes = []
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start:start + self.batch_size]
+            try:
+                campaigns = self.client.campaigns(batch, fields=['status', 'amount', 'send_date'],
+                                                  get_statistics=True, chunk_size=self.batch_size)
+            except Exception:
+                logger.exception(f"Polling {len(batch)} campaigns failed")
+                self.errors += 1
+                now = time.monotonic()
+                with self._lock:
+                    for campaign_id in batch:
+                        if campaign_id in self._campaigns:
+                            self._back_off(self._campaigns[campaign_id], now)
+                continue
+            self.calls += 1
+            now = time.monotonic()
+            for campaign_id in batch:
+                change = self._update(campaign_id, campaigns.get(campaign_id), now)
+                if change is not None:
+                    changes.append(change)
+
+        for change in changes:
+            for callback in self.callbacks:
+                callback(change)
+        return changes
+
+    def _update(self, campaign_id: int, campaign: dict, now: float):
+        with self._lock:
+            watched = self._campaigns.get(campaign_id)
+            if watched is None:
+                return None
+            if campaign is None:
+                # Missing from the response, e.g. not listed yet: kept until it reports a final status (or is unwatched)
+                self._back_off(watched, now)
+                return None
+
+            values = {field: campaign.get(field) for field in TRACKED_FIELDS}
+            old_values = watched.values or {}
+            changed = {field: (old_values.get(field), value) for field, value in values.items()
+                       if old_values.get(field) != value}
+            watched.values = values
+
+            finished = campaign.get('status') in self.final_statuses
+            if finished:
+                del self._campaigns[campaign_id]
+            else:
+                watched.interval = self._next_interval(watched, campaign, bool(changed), now)
+                watched.next_poll = now + watched.interval
+
+        if changed or finished:
+            return CampaignChange(campaign_id, changed, campaign, finished)
+        return None
+
+    def run(self, stop: threading.Event = None):
+        """
+        Polls until all campaigns finished (or stop is set), failed polls are retried as described in poll_once
+
+        :param stop: Optional threading.Event to stop watching from another thread
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            delay = self.next_poll_in()
+            if delay is None:
+                return
+            if stop.wait(delay):
+                return
+            self.poll_once()
+
+    async def changes(self):
+        """
+        Async iterator over CampaignChange objects until all campaigns finished, polls run in the default executor
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self.next_poll_in()
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+            for change in await loop.run_in_executor(None, self.poll_once):
+                yield change
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
@@ -1,7 +1,7 @@
-import xml.etree.ElementTree as ET
-
-
 def xml2dict(s):
+    # Imported on first use, so importing the package doesn't pay for the xml machinery
+    import xml.etree.ElementTree as ET
+
     root = ET.fromstring(s)
     result = {root.tag: parse(root)}
     return result
@@ -10,7 +10,7 @@ def xml2dict(s):
 def parse(ele):
     tags = []
     p_childs = []
-    for child in ele.getchildren():
+    for child in ele:
         tags.append(child.tag)
         p_childs.append((child.tag, parse(child)))
 
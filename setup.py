@@ -14,6 +14,9 @@ setup(
     install_requires=[
         'requests'
     ],
+    extras_require={
+        'numpy': ['numpy']
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         # "3 - Alpha", "4 - Beta" or "5 - Production/Stable" as the current state of your package
@@ -0,0 +1,17 @@
+import pytest
+
+from benchmarks.stub_server import StubServer
+from pydoctorsender import DoctorSenderClient
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return DoctorSenderClient('user@example.com', 'token', url=server.url)
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from pydoctorsender.bulk import CampaignLedger, create_campaigns
+
+TEMPLATE = {'subject': 'Weekly deals', 'from_name': 'Example Shop', 'from_email': 'news@example.com',
+            'reply_to': 'reply@example.com', 'html': '<p>Deals</p>', 'plain': 'Deals',
+            'list_unsubscribe': 'https://example.com/unsubscribe'}
+CAMPAIGNS = [{'campaign_name': 'Deals DE', 'utm_campaign': 'deals_de'},
+             {'campaign_name': 'Deals AT', 'utm_campaign': 'deals_at', 'country': 'aut'},
+             {'campaign_name': 'Deals CH', 'html': '<p>Angebote</p>'}]
+
+
+@pytest.fixture
+def bodies(server, monkeypatch):
+    bodies = []
+    respond = server.respond
+
+    def capture(body):
+        if b'dsCampaignNew' in body:
+            bodies.append(body)
+        return respond(body)
+
+    monkeypatch.setattr(server, 'respond', capture)
+    return bodies
+
+
+def test_same_requests_as_create_campaign(client, bodies):
+    ids = create_campaigns(client, TEMPLATE, CAMPAIGNS, max_workers=1)
+    assert len(set(ids)) == 3
+    bulk = list(bodies)
+    bodies.clear()
+    for overrides in CAMPAIGNS:
+        client.create_campaign(**dict(TEMPLATE, **overrides))
+    assert bulk == bodies
+
+
+def test_invalid_settings_are_not_sent(server, client):
+    server.calls.clear()
+    with pytest.raises(AssertionError):
+        create_campaigns(client, TEMPLATE, [{'campaign_name': 'Deals'}, {'campaign_name': 'Other', 'country': 'XYZ'}])
+    assert 'dsCampaignNew' not in server.calls
+
+
+def test_ledger_skips_created(server, client, tmp_path):
+    path = str(tmp_path / 'campaigns.json')
+    ids = create_campaigns(client, TEMPLATE, CAMPAIGNS, ledger=path, verify=False)
+    assert sorted(json.load(open(path)).values()) == sorted(ids)
+
+    server.calls.clear()
+    changed = CAMPAIGNS[:2] + [dict(CAMPAIGNS[2], subject='Angebote')]
+    again = create_campaigns(client, TEMPLATE, changed, ledger=path, verify=False)
+    assert again[:2] == ids[:2] and again[2] not in ids
+    assert server.calls['dsCampaignNew'] == 1
+
+
+def test_ledger_verifies_deleted(server, client, tmp_path):
+    ledger = CampaignLedger(str(tmp_path / 'campaigns.json'))
+    ids = create_campaigns(client, TEMPLATE, CAMPAIGNS, ledger=ledger)
+    # The stub knows the campaigns up to the lowest created id, the other two were deleted
+    kept = ids.index(min(ids))
+    server.configure(campaigns=ids[kept])
+    server.calls.clear()
+    again = create_campaigns(client, TEMPLATE, CAMPAIGNS, ledger=ledger)
+    assert again[kept] == ids[kept]
+    assert not set(again[:kept] + again[kept + 1:]) & set(ids)
+    assert server.calls['dsCampaignNew'] == 2
+    assert CampaignLedger(ledger.path).campaigns == ledger.campaigns
+
+
+def test_ledger_forget_is_saved(tmp_path):
+    ledger = CampaignLedger(str(tmp_path / 'campaigns.json'))
+    ledger.record('a', 1)
+    ledger.record('b', 2)
+    ledger.forget(['a', 'unknown'])
+    assert CampaignLedger(ledger.path).campaigns == {'b': 2}
+
+
+def test_return_exceptions(client, monkeypatch):
+    new_campaign = client._new_campaign
+
+    def failing(data):
+        if b'Deals AT' in data:
+            raise ConnectionError('reset')
+        return new_campaign(data)
+
+    monkeypatch.setattr(client, '_new_campaign', failing)
+    results = create_campaigns(client, TEMPLATE, CAMPAIGNS, return_exceptions=True)
+    assert isinstance(results[1], ConnectionError)
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    with pytest.raises(ConnectionError):
+        create_campaigns(client, TEMPLATE, CAMPAIGNS)
@@ -0,0 +1,26 @@
+import pytest
+
+
+def test_campaigns_default_fields_are_batched(server, client):
+    server.configure(campaigns=1200)
+    server.calls.clear()
+
+    campaigns = client.campaigns(range(1, 1201))
+
+    assert len(campaigns) == 1200
+    assert server.calls == {'dsCampaignGetAll': 3}
+    assert campaigns[17]['name'] == 'Campaign 17 - weekly newsletter'
+
+
+def test_campaigns_falls_back_for_explicit_fields(server, client):
+    server.calls.clear()
+
+    campaigns = client.campaigns([1, 2, 3], fields=['name', 'country'])
+
+    assert server.calls == {'dsCampaignGetAll': 1, 'dsCampaignGet': 3}
+    assert campaigns[2]['country'] == 'DEU'
+
+
+@pytest.mark.parametrize('ids', [[], [999999]])
+def test_campaigns_missing_ids(client, ids):
+    assert client.campaigns(ids) == {}
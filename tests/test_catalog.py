@@ -0,0 +1,66 @@
+import pytest
+
+from pydoctorsender.catalog import AccountCatalog
+from pydoctorsender.errors import DrsListError, DrsSegmentError
+
+
+@pytest.fixture
+def catalog(server, client):
+    server.configure(lists=3, segments=2)
+    server.calls.clear()
+    return AccountCatalog(client).refresh()
+
+
+def test_lookups(server, catalog):
+    assert server.calls == {'dsUsersListGetAll': 1, 'dsUsersListGetFields': 3, 'dsSegmentsGetByListName': 3}
+    assert len(catalog) == 3 and 'list_1' in catalog
+    assert catalog.list('list_1')['count'] == '1000'
+    assert catalog.fields('list_1')['field_1'] == 'int'
+    assert catalog.segments('list_1') == {1: 'segment 1', 2: 'segment 2'}
+    assert catalog.find_segments('segment 2') == [('list_0', 2), ('list_1', 2), ('list_2', 2)]
+    assert catalog.find_segments('segment 2', list_name='list_1') == [('list_1', 2)]
+    assert catalog.segment(1)[1] == 'segment 1'
+    with pytest.raises(DrsListError):
+        catalog.fields('missing')
+    with pytest.raises(DrsSegmentError):
+        catalog.segment(999)
+
+
+def test_refresh_fetches_changed_lists(server, client, catalog):
+    server.calls.clear()
+    catalog.refresh()
+    assert server.calls == {'dsUsersListGetAll': 1}
+
+    lists = client.lists('')
+    lists['list_2'] = dict(lists['list_2'], count='5')
+    lists['list_3'] = dict(lists['list_0'])
+    del lists['list_0']
+    client.lists = lambda test_lists=0: lists
+    server.calls.clear()
+    catalog.refresh()
+    assert server.calls == {'dsUsersListGetFields': 2, 'dsSegmentsGetByListName': 2}
+    assert sorted(catalog.lists()) == ['list_1', 'list_2', 'list_3']
+    assert catalog.find_segments('segment 1') == [('list_1', 1), ('list_2', 1), ('list_3', 1)]
+
+    server.calls.clear()
+    catalog.refresh(force=['list_1'])
+    assert server.calls == {'dsUsersListGetFields': 1, 'dsSegmentsGetByListName': 1}
+
+
+def test_save_and_load(server, client, catalog, tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    catalog.save(path)
+    loaded = AccountCatalog.load(client, path)
+    assert loaded.lists() == catalog.lists()
+    assert loaded.segments('list_0') == catalog.segments('list_0')
+    assert loaded.refreshed_at == catalog.refreshed_at
+    server.calls.clear()
+    loaded.refresh()
+    assert server.calls == {'dsUsersListGetAll': 1}
+
+
+def test_unsupported_snapshot(client, tmp_path):
+    path = tmp_path / 'catalog.json'
+    path.write_text('{"version": 0}')
+    with pytest.raises(ValueError):
+        AccountCatalog.load(client, str(path))
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+import requests
+
+from pydoctorsender import CircuitBreaker, DoctorSenderClient, MetricsCollector
+from pydoctorsender.circuit import CLOSED, HALF_OPEN, OPEN, method_group
+from pydoctorsender.errors import DrsCircuitOpenError, DrsReturnError
+
+
+def test_method_group():
+    assert method_group('dsSegmentsNew') == method_group('dsGetSegmentCount') == 'segments'
+    assert method_group('dsCampaignGetAll') == 'campaigns'
+    assert method_group('dsUsersListGetAll') == 'users'
+    assert method_group('dsIpGroupGetNames') == 'settings'
+
+
+def test_opens_at_failure_rate():
+    changes = []
+    breaker = CircuitBreaker(failure_threshold=0.5, minimum_calls=4, open_duration=60)
+    for failed in (True, False, True):
+        breaker.before('dsCampaignGet')
+        breaker.record('dsCampaignGet', failed, lambda *change: changes.append(change))
+    # Below minimum_calls the failure rate is not considered
+    assert breaker.state('dsCampaignGet') == CLOSED
+    breaker.record('dsCampaignGet', False, lambda *change: changes.append(change))
+    assert breaker.state('campaigns') == OPEN
+    assert changes == [('campaigns', CLOSED, OPEN)]
+    with pytest.raises(DrsCircuitOpenError) as error:
+        breaker.before('dsCampaignNew')
+    assert error.value.group == 'campaigns' and 0 < error.value.retry_after <= 60
+    # Other groups are not affected
+    breaker.before('dsSegmentsNew')
+
+
+def test_half_open_probes():
+    breaker = CircuitBreaker(minimum_calls=1, open_duration=0.05, half_open_calls=1)
+    breaker.record('dsCampaignGet', True)
+    assert breaker.state('campaigns') == OPEN
+    time.sleep(0.06)
+    breaker.before('dsCampaignGet')
+    assert breaker.state('campaigns') == HALF_OPEN
+    # Only half_open_calls probes at a time
+    with pytest.raises(DrsCircuitOpenError):
+        breaker.before('dsCampaignGet')
+    breaker.record('dsCampaignGet', True)
+    assert breaker.state('campaigns') == OPEN
+
+    time.sleep(0.06)
+    breaker.before('dsCampaignGet')
+    breaker.record('dsCampaignGet', False)
+    assert breaker.state('campaigns') == CLOSED
+
+
+def test_window():
+    breaker = CircuitBreaker(minimum_calls=2, window=0.05)
+    breaker.record('dsCampaignGet', True)
+    time.sleep(0.06)
+    breaker.record('dsCampaignGet', True)
+    assert breaker.state('campaigns') == CLOSED
+
+
+def test_client(server):
+    metrics = MetricsCollector()
+    breaker = CircuitBreaker(minimum_calls=2, open_duration=60)
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, hooks=[metrics],
+                                circuit_breaker=breaker, validate=False)
+    server.stop()
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.lists()
+    with pytest.raises(DrsCircuitOpenError):
+        client.lists()
+    assert metrics.dump()['dsUsersListGetAll']['outcomes'] == {'error': 2, 'rejected': 1}
+    assert metrics.circuits == {'users': {'state': OPEN, 'opened': 1}}
+    assert 'pydoctorsender_circuit_open{group="users"} 1' in metrics.render()
+
+
+def test_faults_do_not_count(server, monkeypatch):
+    breaker = CircuitBreaker(minimum_calls=1)
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, circuit_breaker=breaker,
+                                validate=False)
+    fault = (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope xmlns:SOAP-ENV='
+             b'"http://schemas.xmlsoap.org/soap/envelope/"><SOAP-ENV:Body><SOAP-ENV:Fault>'
+             b'<faultcode>SOAP-ENV:Server</faultcode><faultstring>Unknown list</faultstring>'
+             b'</SOAP-ENV:Fault></SOAP-ENV:Body></SOAP-ENV:Envelope>')
+    monkeypatch.setattr(server, 'respond', lambda body: fault)
+    with pytest.raises(DrsReturnError):
+        client.lists()
+    assert breaker.state('users') == CLOSED
@@ -0,0 +1,48 @@
+import pytest
+
+from pydoctorsender.engagement import EngagementIndex
+from pydoctorsender.errors import DrsCampaignError
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'stdlib'])
+def index(request):
+    index = EngagementIndex(use_numpy=request.param)
+    everyone = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+    for campaign_id, openers in ((1, ['a@example.com', 'b@example.com']),
+                                 (2, ['A@example.com ', 'c@example.com']),
+                                 (3, ['a@example.com', 'a@example.com'])):
+        index.add(campaign_id, 'sent', everyone)
+        index.add(campaign_id, 'openers', openers)
+    return index
+
+
+def test_engaged(index):
+    assert len(index) == 4
+    assert list(index.counts('openers')) == [3, 1, 1, 0]
+    assert index.engaged('openers', at_least=2) == ['a@example.com']
+    assert index.engaged('openers', at_least=1, last=2) == ['a@example.com', 'c@example.com']
+    assert index.engaged('openers', campaigns=[1]) == ['a@example.com', 'b@example.com']
+    assert index.engaged('openers', campaigns=[]) == []
+
+
+def test_inactive(index):
+    assert index.inactive('openers') == ['d@example.com']
+    assert index.inactive('openers', last=1) == ['b@example.com', 'c@example.com', 'd@example.com']
+
+
+def test_missing_users(index):
+    with pytest.raises(DrsCampaignError):
+        index.engaged('clickers')
+    with pytest.raises(AssertionError):
+        index.add(4, 'viewers', [])
+
+
+def test_fetch(server, client):
+    server.configure(user_statistics=50)
+    index = EngagementIndex()
+    index.fetch(client, [3, 1, 2], stats_types=('sent', 'openers'))
+    assert index.campaigns == [3, 1, 2]
+    assert server.calls['dsCampaignGetUserStatistics'] == 6
+    assert len(index) == 50
+    assert len(index.engaged('openers', at_least=3)) == 50
+    assert index.inactive('openers') == []
@@ -0,0 +1,168 @@
+import functools
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from pydoctorsender.evaluator import ListData, SegmentEvaluator
+
+LINES = ['email;country;age;signup',
+         'ann@gmail.com;DEU;34;2020-01-05',
+         'bea@example.com;ESP;;2019-06-01',
+         'cy@GMAIL.com;DEU;19;',
+         'dee@yahoo.es;FRA;52;2021-03-10',
+         'eve@gmail.com;esp;28;2020-11-30']
+
+SEGMENTS = {'germany': [('country', '==', 'DEU')],
+            'gmail': [('email', 'like', '%@gmail.com')],
+            'adults': [('age', '>=', 21)]}
+
+CONDITIONS = [
+    [('country', '==', 'DEU')],
+    [('country', '!=', 'DEU')],
+    [('email', 'like', '%@gmail.com')],
+    [('email', 'not like', '%@gmail.com')],
+    [('email', 'like', 'a%')],
+    [('email', 'like', '%e%')],
+    [('email', 'like', '_ve@%')],
+    [('country', 'in', 'DEU, FRA')],
+    [('country', 'not in', ['DEU'])],
+    [('age', 'in', '19,52')],
+    [('age', 'not in', '19')],
+    [('age', '<', 30)],
+    [('signup', '>=', '2020-01-01')],
+    [('signup', '<', '2020-01-01')],
+    [('age', '>=', 21), ('segment', 'segment', 'gmail', True)],
+    [('country', '==', 'DEU'), ('segment', 'segment', 'adults')],
+]
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'stdlib'])
+def evaluator(request):
+    evaluator = SegmentEvaluator(ListData.from_csv(LINES, use_numpy=request.param))
+    for name, conditions in SEGMENTS.items():
+        evaluator.define(name, conditions)
+    return evaluator
+
+
+@pytest.mark.parametrize('conditions', CONDITIONS)
+def test_stdlib_matches_numpy(conditions):
+    numpy = SegmentEvaluator(ListData.from_csv(LINES, use_numpy=True))
+    stdlib = SegmentEvaluator(ListData.from_csv(LINES, use_numpy=False))
+    for evaluator in (numpy, stdlib):
+        for name, segment in SEGMENTS.items():
+            evaluator.define(name, segment)
+    assert list(stdlib.users(conditions)) == list(numpy.users(conditions))
+    assert stdlib.count(conditions) == numpy.count(conditions)
+
+
+def test_count_and_users(evaluator):
+    assert evaluator.count('germany') == 2
+    assert list(evaluator.users('gmail')) == ['ann@gmail.com', 'cy@GMAIL.com', 'eve@gmail.com']
+    # Empty values never match, neither a condition nor its negation
+    assert evaluator.count([('age', '<', 30)]) + evaluator.count([('age', '>=', 30)]) == 4
+    assert evaluator.count([('signup', '>', '2000-01-01')]) == 4
+
+
+def test_overlap(evaluator):
+    assert evaluator.overlap('germany', 'gmail') == {'a': 2, 'b': 3, 'both': 2, 'either': 3, 'jaccard': 2 / 3}
+    overlaps = evaluator.overlaps(['germany', 'adults'])
+    assert overlaps[('germany', 'germany')] == 2
+    assert overlaps[('germany', 'adults')] == overlaps[('adults', 'germany')] == 1
+
+
+def test_redefined_segment(evaluator):
+    conditions = [('segment', 'segment', 'germany')]
+    assert evaluator.count(conditions) == 2
+    evaluator.define('germany', [('country', '==', 'FRA')])
+    assert evaluator.count(conditions) == 1
+
+
+def test_column_types():
+    data = ListData.from_csv(LINES, use_numpy=False)
+    assert data['age'][1] != data['age'][1]
+    assert data['signup'][2] is None
+    assert data['country'][4] == 'esp'
+    typed = ListData.from_csv(LINES, types={'age': 'varchar(3)'}, use_numpy=False)
+    assert typed['age'][:2] == ['34', '']
+
+
+
+@pytest.mark.parametrize('use_numpy', [True, False], ids=['numpy', 'stdlib'])
+def test_invalid_cells_of_typed_columns(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    lines = ['email;age;signup',
+             'ann@gmail.com;34;2020-01-05',
+             'bea@example.com;n/a;0000-00-00',
+             'cy@GMAIL.com;19;2021-03-10 08:30:00']
+    data = ListData.from_csv(lines, types={'age': 'int(11)', 'signup': 'date'}, use_numpy=use_numpy)
+    evaluator = SegmentEvaluator(data)
+    # Like empty cells, invalid ones never match, neither a condition nor its negation
+    assert evaluator.count([('age', '>=', 0)]) == 2
+    assert evaluator.count([('age', '!=', 34)]) == 1
+    assert evaluator.count([('signup', '>', '1900-01-01')]) == 2
+    assert evaluator.count([('signup', '<', '2100-01-01')]) == 2
+    assert evaluator.count([('signup', 'not in', '2020-01-05')]) == 1
+
+def test_without_numpy():
+    code = ("import sys; sys.modules['numpy'] = None\n"
+            "from pydoctorsender.evaluator import ListData, SegmentEvaluator\n"
+            f"data = ListData.from_csv({LINES!r})\n"
+            "assert not data.use_numpy\n"
+            "print(SegmentEvaluator(data).count([('email', 'like', '%@gmail.com')]))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '3'
+
+
+class _Files(BaseHTTPRequestHandler):
+    """Answers 404 until the export is ready, as the Doctorsender download links do"""
+    not_ready = 0
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        if self.requests <= self.not_ready:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = '\n'.join(LINES).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def files():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), type('Files', (_Files,), {}))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_waits_for_link(client, files, monkeypatch):
+    files.RequestHandlerClass.not_ready = 2
+    link = f'http://127.0.0.1:{files.server_port}/example_list.csv'
+    monkeypatch.setattr(client, 'download_list', lambda list_name: link)
+    monkeypatch.setattr(client, 'open_download', functools.partial(client.open_download, interval=0.01))
+    data = ListData.download(client, 'example_list', use_schema=False, use_numpy=False)
+    assert len(data) == 5
+    assert files.RequestHandlerClass.requests == 3
+
+
+def test_open_download_times_out(client, files):
+    files.RequestHandlerClass.not_ready = 1000
+    link = f'http://127.0.0.1:{files.server_port}/example_list.csv'
+    with pytest.raises(requests.HTTPError):
+        client.open_download(link, timeout=0.2, interval=0.05)
+    assert files.RequestHandlerClass.requests > 1
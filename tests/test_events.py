@@ -0,0 +1,145 @@
+import datetime as dt
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pydoctorsender.events import EventStore, _decode_block, _encode_block
+
+EXPORT = ['Fecha;Mail;Id_Envio;Tipo;Lista',
+          '2020-01-01 08:00:00;A@example.com;4711;open;example_list',
+          '2020-01-01 09:30:00;b@example.com;4711;click;example_list',
+          '02/01/2020 10:00:00;a@example.com;4712;open;other_list',
+          '2020-01-02 23:59:59;c@example.com;4712;open;other_list',
+          'broken;row']
+
+
+def test_block_round_trip():
+    rows = [(1577865600 + i * 7, f'user{i % 5}@example.com', 4711 + i % 2, ('open', 'click')[i % 2], 'example_list')
+            for i in range(100)]
+    assert _decode_block(_encode_block(rows)) == rows
+    assert _decode_block(_encode_block([])) == []
+    with pytest.raises(ValueError):
+        _decode_block(b'something else')
+
+
+def test_append_export_and_query(tmp_path):
+    store = EventStore(str(tmp_path), block_size=1)
+    assert store.append_export(EXPORT) == 4
+    assert store.partitions() == [dt.date(2020, 1, 1), dt.date(2020, 1, 2)]
+
+    events = list(store.query(email='a@example.com'))
+    assert [(e['timestamp'], e['campaign_id'], e['list']) for e in events] == [
+        (dt.datetime(2020, 1, 1, 8), 4711, 'example_list'), (dt.datetime(2020, 1, 2, 10), 4712, 'other_list')]
+    assert [e['email'] for e in store.query(campaign_id=4712)] == ['a@example.com', 'c@example.com']
+    assert [e['email'] for e in store.query(event='click')] == ['b@example.com']
+    # start is inclusive, end exclusive
+    assert len(list(store.query(start=dt.datetime(2020, 1, 1, 9, 30), end=dt.datetime(2020, 1, 2, 23, 59, 59)))) == 2
+    assert list(store.query(email='unknown@example.com')) == []
+
+
+def test_reopened_store_appends(tmp_path):
+    EventStore(str(tmp_path)).append_export(EXPORT, source='export-1')
+    store = EventStore(str(tmp_path))
+    assert store.append_export(EXPORT, source='export-1') == 0
+    store.append([{'timestamp': dt.datetime(2020, 1, 1, 12), 'email': 'a@example.com', 'event': 'open'}])
+    assert len(list(EventStore(str(tmp_path)).query(email='a@example.com'))) == 3
+
+
+def test_full_blocks_are_written_while_appending(tmp_path):
+    store = EventStore(str(tmp_path), block_size=2)
+    day = tmp_path / '2020-01-01'
+
+    def events():
+        for i in range(5):
+            # Two events of the day fill a block, it is on disk before the rest arrives
+            assert len(list(day.glob('*.blk'))) == i // 2
+            yield {'timestamp': dt.datetime(2020, 1, 1, 12 - i), 'email': f'user{i}@example.com'}
+
+    assert store.append(events()) == 5
+    assert len(list(day.glob('*.blk'))) == 3
+    assert [e['email'] for e in store.query()] == [f'user{i}@example.com' for i in reversed(range(5))]
+
+
+def test_invalid_events_are_skipped(tmp_path):
+    store = EventStore(str(tmp_path))
+    export = EXPORT + ['yesterday;d@example.com;4712;open;other_list', '2020-01-02 10:00:00;e@example.com;x;open;list']
+    assert store.append_export(export) == 4
+    assert store.skipped == 2
+
+
+def test_cut_off_import_is_completed(tmp_path, monkeypatch):
+    store = EventStore(str(tmp_path))
+    write_index = store._write_index
+
+    def crash_on_second_day(day, index):
+        if day == dt.date(2020, 1, 2):
+            raise OSError('disk full')
+        write_index(day, index)
+
+    monkeypatch.setattr(store, '_write_index', crash_on_second_day)
+    with pytest.raises(OSError):
+        store.append_export(EXPORT, source='export-1')
+    assert list(store.query()) and not list(store.query(start=dt.datetime(2020, 1, 2)))
+
+    # Running the import again only appends to the second day
+    store = EventStore(str(tmp_path))
+    assert store.append_export(EXPORT, source='export-1') == 2
+    assert len(list(store.query())) == 4
+    assert store.append_export(EXPORT, source='export-1') == 0
+
+
+def test_index_cache_is_bounded(tmp_path):
+    store = EventStore(str(tmp_path), cached_indexes=1)
+    store.append_export(EXPORT)
+    assert len(list(store.query(email='a@example.com'))) == 2
+    assert list(store._indexes) == [dt.date(2020, 1, 2)]
+
+
+def test_missing_columns(tmp_path):
+    with pytest.raises(ValueError, match='timestamp and an email'):
+        EventStore(str(tmp_path)).append_export(['email,type', 'a@example.com,open'])
+
+
+def test_unsubscribers(tmp_path, client):
+    store = EventStore(str(tmp_path))
+    unsubscribers = client.get_unsubscribers('example_list', dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 2))
+    assert store.append_unsubscribers(unsubscribers) == len(unsubscribers)
+    events = list(store.query(email=unsubscribers[0]['email']))
+    assert events == [{'timestamp': unsubscribers[0]['timestamp'], 'email': unsubscribers[0]['email'],
+                       'campaign_id': None, 'event': 'unsubscribe', 'list': 'example_list'}]
+
+
+class _Export(BaseHTTPRequestHandler):
+    """Answers 404 for the first request, as an export link that is not active yet"""
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        body = '\n'.join(EXPORT).encode('utf-8') if self.requests > 1 else b''
+        self.send_response(200 if body else 404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_download(tmp_path, client, monkeypatch):
+    handler = type('Export', (_Export,), {})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(client, 'download_events',
+                            lambda from_date, until_date: f'http://127.0.0.1:{httpd.server_port}/events.csv')
+        monkeypatch.setattr(client, 'open_download', functools.partial(client.open_download, interval=0.01))
+        store = EventStore(str(tmp_path))
+        assert store.download(client, dt.date(2020, 1, 1), dt.date(2020, 1, 2)) == 4
+        # The same export is not downloaded again
+        assert store.download(client, dt.date(2020, 1, 1), dt.date(2020, 1, 2)) == 0
+        assert handler.requests == 2
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
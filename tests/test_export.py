@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from pydoctorsender import export
+from pydoctorsender.export import CampaignStatistics, campaign_statistics
+
+CAMPAIGNS = [{'id': '1', 'name': 'Sent', 'send_date': '2020-01-01 08:00:00', 'amount': '1000', 'deliveries': '950',
+              'unicViews': '190', 'unicClics': '19', 'bounced': '50', 'unsubscribes': '5'},
+             {'id': '2', 'name': 'Draft', 'send_date': '', 'amount': '0', 'deliveries': None, 'unicViews': 'n/a'}]
+
+
+@pytest.fixture
+def without_numpy(monkeypatch):
+    monkeypatch.setattr(export, 'np', None)
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_columns_and_rates(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    stats = CampaignStatistics.from_campaigns(CAMPAIGNS, use_numpy=use_numpy)
+    assert len(stats) == 2
+    assert list(stats['id']) == [1, 2]
+    assert list(stats['unicViews']) == [190, 0]
+    assert stats['name'] == ['Sent', 'Draft']
+    send_dates = [int(v.astype(int)) if use_numpy else v for v in stats['send_date']]
+    assert send_dates == [1577865600, 0]
+
+    assert stats.open_rate()[0] == pytest.approx(0.2)
+    assert stats.click_to_open_rate()[0] == pytest.approx(0.1)
+    assert stats.bounce_rate()[0] == pytest.approx(0.05)
+    # Rates of campaigns without a denominator are nan, not 0 or a ZeroDivisionError
+    assert math.isnan(stats.open_rate()[1]) and math.isnan(stats.bounce_rate()[1])
+    assert set(stats.to_dict()) >= {'open_rate', 'click_rate', 'click_to_open_rate', 'bounce_rate',
+                                    'unsubscribe_rate'}
+    assert 'open_rate' not in stats.to_dict(rates=False)
+
+
+def test_empty():
+    assert len(CampaignStatistics.from_campaigns([], use_numpy=False)) == 0
+
+
+def test_empty_numpy():
+    pytest.importorskip('numpy')
+    assert len(CampaignStatistics.from_campaigns([], use_numpy=True)) == 0
+
+
+def test_campaign_statistics(server, client):
+    np = pytest.importorskip('numpy')
+    server.configure(campaigns=20)
+    stats = campaign_statistics(client, 'id > 0')
+    fallback = campaign_statistics(client, 'id > 0', use_numpy=False)
+    assert stats.use_numpy and len(stats) == 20
+    assert list(stats['opens']) == list(fallback['opens'])
+    np.testing.assert_allclose(stats.click_rate(), list(fallback.click_rate()))
+
+
+def test_without_numpy(without_numpy):
+    stats = CampaignStatistics.from_campaigns(CAMPAIGNS)
+    assert not stats.use_numpy
+    assert list(stats['deliveries']) == [950, 0]
+    assert list(stats['send_date']) == [1577865600, 0]
+    assert stats.open_rate()[0] == pytest.approx(0.2) and math.isnan(stats.open_rate()[1])
+    with pytest.raises(ImportError, match=r'pydoctorsender\[numpy\]'):
+        CampaignStatistics.from_campaigns(CAMPAIGNS, use_numpy=True)
+
+
+def test_campaign_statistics_without_numpy(server, client, without_numpy):
+    server.configure(campaigns=20)
+    stats = campaign_statistics(client, 'id > 0')
+    assert not stats.use_numpy and len(stats) == 20
+    assert len(stats.click_rate()) == 20
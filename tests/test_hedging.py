@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from pydoctorsender import DoctorSenderClient, MetricsCollector
+from pydoctorsender.hedging import HedgingPolicy
+from pydoctorsender.limits import ResponseLimits
+
+
+def hedging(**kwargs):
+    # min_samples above the number of calls keeps the delay at initial_delay
+    return HedgingPolicy(**dict(dict(budget=1.0, min_samples=1000, initial_delay=0.1), **kwargs))
+
+
+@pytest.fixture
+def slow_server(server):
+    # Every third request (the first is the validation of the client) takes half a second
+    server.slow_every = 3
+    server.slow_latency = 0.5
+    return server
+
+
+class Response(str):
+    closed = []
+
+    def close(self):
+        self.closed.append(str(self))
+
+
+def eventually(condition):
+    for _ in range(100):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def racing_send(first, hedge, hedge_sent):
+    """A send whose first request answers once first is set and the hedge once hedge is set"""
+    calls = []
+
+    def send():
+        calls.append(threading.get_ident())
+        if len(calls) == 1:
+            first.wait(1)
+            return Response('first')
+        hedge_sent.set()
+        hedge.wait(1)
+        return Response('hedge')
+
+    return send, calls
+
+
+def test_unhedged_calls_run_on_calling_thread():
+    threads = []
+
+    def send():
+        threads.append(threading.get_ident())
+        return 'response'
+
+    # Methods with side effects, and calls without room in the budget, are sent once on the calling thread
+    assert hedging().run('dsCampaignNew', send) == ('response', 0)
+    assert hedging(budget=0.0).run('dsGetSegmentCount', send) == ('response', 0)
+    assert threads == [threading.get_ident()] * 2
+
+
+def test_hedge_answering_first_wins():
+    Response.closed = []
+    first, hedge = threading.Event(), threading.Event()
+    hedge.set()
+    send, calls = racing_send(first, hedge, threading.Event())
+    assert hedging().run('dsGetSegmentCount', send) == ('hedge', 1)
+    assert len(calls) == 2 and threading.get_ident() not in calls
+    # The first request keeps running, its response is closed when it arrives
+    first.set()
+    assert eventually(lambda: Response.closed == ['first'])
+
+
+def test_first_request_answering_after_the_delay_wins():
+    Response.closed = []
+    hedge, hedge_sent = threading.Event(), threading.Event()
+    # The first request answers once the hedge was sent (after the delay), while the hedge is still waiting
+    send, calls = racing_send(hedge_sent, hedge, hedge_sent)
+    start = time.perf_counter()
+    assert hedging().run('dsGetSegmentCount', send) == ('first', 1)
+    assert time.perf_counter() - start < 0.5
+    assert Response.closed == []
+    hedge.set()
+    assert eventually(lambda: Response.closed == ['hedge'])
+
+
+def test_failed_first_request_waits_for_the_hedge():
+    def send():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            raise requests.ConnectionError('first')
+        time.sleep(0.3)
+        return 'hedge'
+
+    calls = []
+    assert hedging().run('dsGetSegmentCount', send) == ('hedge', 1)
+    # Without any response the error of the first request is raised
+    with pytest.raises(ValueError):
+        hedging().run('dsGetSegmentCount', lambda: int('first'))
+
+
+def test_slow_calls_are_hedged(slow_server):
+    metrics = MetricsCollector()
+    client = DoctorSenderClient('user@example.com', 'token', url=slow_server.url, hooks=[metrics], hedging=hedging())
+    for _ in range(4):
+        start = time.perf_counter()
+        assert client.segment_count(1) == 123456
+        assert time.perf_counter() - start < 0.4
+    assert metrics.dump()['dsGetSegmentCount']['hedges'] == 2
+    assert slow_server.calls['dsGetSegmentCount'] == 6
+
+
+def test_budget(slow_server):
+    policy = hedging(budget=0.0)
+    client = DoctorSenderClient('user@example.com', 'token', url=slow_server.url, hedging=policy)
+    start = time.perf_counter()
+    for _ in range(2):
+        client.segment_count(1)
+    assert time.perf_counter() - start >= 0.5
+    # The validation of the client is a read-only call as well
+    assert (policy.calls, policy.hedges) == (3, 0)
+
+
+def test_delay_follows_latency():
+    policy = hedging(min_samples=5, min_delay=0.001)
+    for _ in range(5):
+        policy.run('dsGetSegmentCount', lambda: time.sleep(0.02) or 'response')
+    assert 0.015 < policy.delay('dsGetSegmentCount') < 0.04
+    assert policy.delay('dsCampaignGet') == 0.1
+
+
+def test_losing_streamed_requests_free_their_connection(slow_server):
+    # With a single pooled connection that blocks when taken, a connection kept by a losing request hangs the next call
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=1, pool_block=True))
+    client = DoctorSenderClient('user@example.com', 'token', url=slow_server.url, session=session, hedging=hedging(),
+                                response_limits=ResponseLimits(max_bytes=1024 * 1024))
+    calls = threading.Thread(target=lambda: [client.segment_count(1) for _ in range(4)], daemon=True)
+    calls.start()
+    calls.join(5)
+    assert not calls.is_alive()
@@ -0,0 +1,76 @@
+import datetime as dt
+import os
+
+import pytest
+
+from pydoctorsender.history import StatsHistory
+
+METRICS = ('opens', 'clicks', 'unsubscribes')
+
+
+@pytest.fixture
+def history(tmp_path):
+    return StatsHistory(str(tmp_path), metrics=METRICS)
+
+
+def test_record_and_read(history):
+    assert history.record(1, {'opens': 10, 'clicks': 1}, 1000)
+    assert not history.record(1, {'opens': 10, 'clicks': 1}, 1060)
+    assert history.record(1, {'opens': 25, 'clicks': 3, 'unsubscribes': 1}, 1120)
+
+    samples = history.samples(1)
+    assert [counters for _, counters in samples] == [{'opens': 10, 'clicks': 1, 'unsubscribes': 0},
+                                                     {'opens': 25, 'clicks': 3, 'unsubscribes': 1}]
+    assert samples[1][0] == dt.datetime.fromtimestamp(1120, dt.timezone.utc)
+    assert history.at(1, 1100) == {'opens': 10, 'clicks': 1, 'unsubscribes': 0}
+    assert history.at(1, 999) == {}
+    assert history.campaigns() == [1]
+
+
+def test_counters_can_decrease(history):
+    history.record(1, {'opens': 10}, 1000)
+    history.record(1, {'opens': 4}, 1001)
+    assert history.series(1, 'opens') == [(dt.datetime.fromtimestamp(1000, dt.timezone.utc), 10),
+                                          (dt.datetime.fromtimestamp(1001, dt.timezone.utc), 4)]
+
+
+def test_rollup(history):
+    for minute, opens in enumerate([0, 5, 10, 50, 60]):
+        history.record(1, {'opens': opens, 'clicks': minute}, 3600 + minute * 1800)
+
+    # Hourly buckets starting at 01:00, each with the increase over the last value before it
+    assert [increase for _, increase in history.rollup(1, 'opens', bucket=3600)] == [5, 45, 10]
+
+
+@pytest.mark.parametrize('kept', [1, 2, 4, 5])
+def test_torn_write_is_repaired(history, tmp_path, kept):
+    history.record(1, {'opens': 100, 'clicks': 2}, 1000)
+    history.record(1, {'opens': 500, 'clicks': 3}, 2000)
+
+    # The second sample takes 6 bytes: time delta (2 bytes), opens delta (2 bytes), clicks delta, unsubscribes delta.
+    # Keep only the first bytes of it, as a crash during the write would
+    path = os.path.join(str(tmp_path), '1.series')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) - 6 + kept])
+
+    reopened = StatsHistory(str(tmp_path), metrics=METRICS)
+    assert [counters['opens'] for _, counters in reopened.samples(1)] == [100]
+    reopened.record(1, {'opens': 600, 'clicks': 4}, 3000)
+    assert [counters for _, counters in StatsHistory(str(tmp_path)).samples(1)] == [
+        {'opens': 100, 'clicks': 2, 'unsubscribes': 0}, {'opens': 600, 'clicks': 4, 'unsubscribes': 0}]
+
+
+def test_torn_header_is_rewritten(history, tmp_path):
+    with open(os.path.join(str(tmp_path), '1.series'), 'wb') as f:
+        f.write(b'DRSH\x01ope')
+    history.record(1, {'opens': 1}, 1000)
+    assert [counters['opens'] for _, counters in history.samples(1)] == [1]
+
+
+def test_not_a_history(history, tmp_path):
+    with open(os.path.join(str(tmp_path), '2.series'), 'wb') as f:
+        f.write(b'something else\n')
+    with pytest.raises(ValueError):
+        history.samples(2)
@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+import pydoctorsender
+
+
+def test_import_stays_lean():
+    code = ('import sys, pydoctorsender; '
+            'print(sorted(m for m in ("requests", "json", "concurrent.futures", "logging", "pydoctorsender.pool", '
+            '"pydoctorsender.hedging") if m in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
+
+
+def test_lazy_exports():
+    from pydoctorsender import DoctorSenderPool, HedgingPolicy
+    from pydoctorsender.hedging import HedgingPolicy as hedging_policy
+    from pydoctorsender.pool import DoctorSenderPool as pool
+
+    assert DoctorSenderPool is pool and HedgingPolicy is hedging_policy
+    assert hasattr(pydoctorsender, 'DoctorSenderPool')
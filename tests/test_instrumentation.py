@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+
+from pydoctorsender import DoctorSenderClient, Hook, MetricsCollector
+from pydoctorsender.errors import DrsResponseTooLargeError
+from pydoctorsender.instrumentation import LatencyHistogram
+from pydoctorsender.limits import ResponseLimits
+
+
+class BrokenHook(Hook):
+    def on_request_start(self, event):
+        raise RuntimeError('start')
+
+    def on_request_end(self, event):
+        raise RuntimeError('end')
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+    assert histogram.count == 1000
+    for p in (50, 90, 99):
+        assert histogram.percentile(p) == pytest.approx(p / 100, rel=1 / 64)
+    assert histogram.percentile(100) == 1.0
+    summary = histogram.to_dict()
+    assert summary['min'] == 0.001 and summary['max'] == 1.0
+    assert summary['mean'] == pytest.approx(0.5005)
+    assert LatencyHistogram().to_dict() == {'count': 0}
+    assert LatencyHistogram().percentile(99) == 0.0
+
+
+def test_histogram_buckets_round_trip():
+    for value in (0, 1, 127, 128, 129, 1000, 65535, 10 ** 6, 10 ** 9):
+        index = LatencyHistogram._index(value)
+        assert LatencyHistogram._highest_value(index) >= value
+        assert LatencyHistogram._index(LatencyHistogram._highest_value(index)) == index
+
+
+def test_collector(server):
+    metrics = MetricsCollector()
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, hooks=[metrics])
+    client.lists()
+    client.lists()
+    dump = metrics.dump()
+    assert dump['dsUsersListGetAll']['total']['count'] == 2
+    assert dump['dsUsersListGetAll']['outcomes'] == {'ok': 2}
+    assert dump['dsUsersListGetAll']['response_bytes'] > 0
+    assert metrics.histogram('dsUsersListGetAll').count == 2
+    assert 'pydoctorsender_requests_total{method="dsUsersListGetAll",outcome="ok"} 2' in metrics.render()
+
+
+def test_histogram_of_unknown_method():
+    metrics = MetricsCollector()
+    assert metrics.histogram('dsCampaignGet').count == 0
+    assert metrics.dump() == {}
+
+
+def test_broken_hook_is_logged(server, caplog):
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, hooks=[BrokenHook()])
+    with caplog.at_level(logging.ERROR, logger='pydoctorsender.doctorsender'):
+        assert client.lists()
+    assert [record.exc_info[1].args[0] for record in caplog.records][-2:] == ['start', 'end']
+
+
+def test_broken_hook_keeps_the_error(server):
+    metrics = MetricsCollector()
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, hooks=[BrokenHook(), metrics],
+                                response_limits=ResponseLimits(methods={'dsUsersListGetAll': (10, None)}))
+    with pytest.raises(DrsResponseTooLargeError):
+        client.lists()
+    # Hooks after the broken one are still called
+    assert metrics.dump()['dsUsersListGetAll']['outcomes'] == {'aborted': 1}
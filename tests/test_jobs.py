@@ -0,0 +1,137 @@
+import pytest
+
+from pydoctorsender.errors import DrsJobError
+from pydoctorsender.jobs import DONE, FAILED, PENDING, RUNNING, JobQueue
+
+
+class FakeClient:
+    def __init__(self, segments=None):
+        self.segment_list = dict(segments or {})
+        self.created = []
+        self.deleted = []
+
+    def segments(self, list_name):
+        return dict(self.segment_list)
+
+    def create_segment(self, list_name, segment_name):
+        segment_id = max(self.segment_list, default=0) + 1
+        self.segment_list[segment_id] = segment_name
+        self.created.append(segment_id)
+        return segment_id
+
+    def delete_segment(self, segment_id):
+        self.deleted.append(segment_id)
+
+    def campaigns(self, campaign_ids):
+        return {campaign_id: {'status': 'finished', 'ids': (campaign_id, 'de')} for campaign_id in campaign_ids}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(str(tmp_path / 'jobs.sqlite')) as queue:
+        yield queue
+
+
+def test_none_results_are_stored(queue):
+    client = FakeClient()
+    queue.add('delete', 'delete_segment', 4711)
+
+    assert queue.run(client) == {'delete': None}
+    assert queue.results() == {'delete': None}
+    # Resuming a finished queue runs nothing and still reads the results
+    assert queue.run(client) == {'delete': None}
+    assert client.deleted == [4711]
+
+
+def test_results_keep_their_keys(queue):
+    client = FakeClient()
+    queue.add('campaigns', 'campaigns', [4711])
+    queue.add('plain', 'campaigns', [])
+    fresh = queue.run(client)
+    assert fresh == {'campaigns': {4711: {'status': 'finished', 'ids': (4711, 'de')}}, 'plain': {}}
+    # Read back from the file the keys are still ints, only the tuple became a list
+    assert queue.results() == {'campaigns': {4711: {'status': 'finished', 'ids': [4711, 'de']}}, 'plain': {}}
+    assert queue.run(client) == queue.results()
+
+
+def test_references_are_resolved(queue):
+    client = FakeClient()
+    segment = queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    queue.add('delete', 'delete_segment', segment)
+
+    assert queue.run(client) == {'segment': 1, 'delete': None}
+    assert client.deleted == [1]
+
+
+def test_marker_is_recorded_before_creation(queue):
+    client = FakeClient({5: 'Germany'})
+    queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    queue.run(client)
+
+    assert queue._db.execute("SELECT marker FROM jobs WHERE key = 'segment'").fetchone() == (5,)
+
+
+def _interrupt(queue, key, marker):
+    """The state a crash leaves behind: marked as running, the call may or may not have been sent"""
+    queue._set(key, RUNNING, marker=marker)
+
+
+def test_recover_ignores_segments_that_existed_before(queue):
+    client = FakeClient({5: 'Germany'})
+    queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    _interrupt(queue, 'segment', 5)
+
+    # The existing segment 5 is not taken, the creation is sent again
+    assert queue.run(client) == {'segment': 6}
+    assert client.created == [6]
+
+
+def test_recover_adopts_segment_created_by_the_job(queue):
+    client = FakeClient({5: 'Germany', 7: 'Germany'})
+    queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    _interrupt(queue, 'segment', 5)
+
+    assert queue.run(client) == {'segment': 7}
+    assert client.created == []
+
+
+def test_recover_without_marker_fails(queue):
+    client = FakeClient({5: 'Germany'})
+    queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    _interrupt(queue, 'segment', None)
+
+    with pytest.raises(DrsJobError):
+        queue.run(client)
+    assert queue.status() == {FAILED: 1}
+
+    queue.retry()
+    assert queue.status() == {PENDING: 1}
+    assert queue.run(client) == {'segment': 6}
+    assert queue.status() == {DONE: 1}
+
+
+def test_blocked_jobs(queue):
+    class Failing(FakeClient):
+        def create_segment(self, list_name, segment_name):
+            raise ValueError('boom')
+
+    segment = queue.add('segment', 'create_segment', 'example_list', 'Germany')
+    queue.add('delete', 'delete_segment', segment)
+
+    results = queue.run(Failing(), return_exceptions=True)
+    assert isinstance(results['segment'], ValueError)
+    assert isinstance(results['delete'], DrsJobError)
+
+
+def test_claim_and_retry_of_a_run(queue):
+    for key in ('a', 'b', 'c'):
+        queue.add(key, 'delete_segment', 1)
+    queue.assign(['a', 'b'], 'run')
+    assert [key for key, *_ in queue.claim(10, 'run')] == ['a', 'b']
+    assert queue.claim(10, 'run') == []
+    queue.checkpoint('a', error=ValueError('boom'))
+
+    # Only failed or interrupted jobs among the keys are set back: b is running but not among them
+    queue.retry(['a', 'c'], interrupted=True)
+    assert queue.status() == {PENDING: 2, RUNNING: 1}
+    assert [key for key, *_ in queue.claim(10)] == ['a', 'c']
@@ -0,0 +1,74 @@
+import pytest
+
+from pydoctorsender import DoctorSenderClient, MetricsCollector
+from pydoctorsender.errors import DrsResponseTooLargeError
+from pydoctorsender.limits import DEFAULT_HINT, HINTS, ResponseLimits
+
+
+class Streamed:
+    """Stands in for a streamed requests Response"""
+
+    def __init__(self, body: bytes, content_length: bool = False):
+        self.body = body
+        self.headers = {'Content-Length': str(len(body))} if content_length else {}
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            self.read += chunk_size
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+def test_limits_of_method():
+    limits = ResponseLimits(max_bytes=100, methods={'dsCampaignGetAll': (10, 5)})
+    assert limits.limits('dsCampaignGetAll') == (10, 5)
+    assert limits.limits('dsCampaignGet') == (100, None)
+
+
+def test_reads_within_limits():
+    body = b'<item>1</item>' * 10
+    assert ResponseLimits(max_bytes=len(body), max_items=10, chunk_size=7).read('dsCampaignGetAll',
+                                                                                Streamed(body)) == body
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 5, 64])
+def test_items_split_between_chunks(chunk_size):
+    response = Streamed(b'<item>1</item>' * 4)
+    with pytest.raises(DrsResponseTooLargeError) as error:
+        ResponseLimits(max_items=3, chunk_size=chunk_size).read('dsCampaignGetAll', response)
+    assert (error.value.limit, error.value.unit, error.value.hint) == (3, 'items', HINTS['dsCampaignGetAll'])
+    assert response.closed
+
+
+def test_aborts_before_reading_everything():
+    response = Streamed(b'x' * 1000)
+    with pytest.raises(DrsResponseTooLargeError) as error:
+        ResponseLimits(max_bytes=100, chunk_size=10).read('dsCampaignGet', response)
+    assert (error.value.unit, error.value.hint) == ('bytes', DEFAULT_HINT)
+    assert response.read == 110 and response.closed
+
+
+def test_content_length_aborts_right_away():
+    response = Streamed(b'x' * 1000, content_length=True)
+    with pytest.raises(DrsResponseTooLargeError):
+        ResponseLimits(max_bytes=100).read('dsCampaignGet', response)
+    assert response.read == 0
+
+
+def test_client(server):
+    server.configure(campaigns=50)
+    metrics = MetricsCollector()
+    # A campaign has about 30 items
+    limits = ResponseLimits(methods={'dsCampaignGetAll': (None, 100)})
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, hooks=[metrics], response_limits=limits)
+    with pytest.raises(DrsResponseTooLargeError, match='narrow sql_where'):
+        client.list_campaigns('id > 0', ['name'])
+    assert metrics.dump()['dsCampaignGetAll']['outcomes'] == {'aborted': 1}
+    # Other methods have no limits, and the connection pool still works after the aborted call
+    assert client.lists()
+    server.configure(campaigns=3)
+    assert len(client.list_campaigns('id > 0', ['name'])) == 3
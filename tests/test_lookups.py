@@ -0,0 +1,53 @@
+import pytest
+
+from pydoctorsender import Categories, Countries, Languages
+
+
+def test_lookup():
+    languages = Languages.default()
+    assert languages[3] == languages['3'] == 'English'
+    assert languages.id('english') == 3
+    assert 3 in languages and 'x' not in languages
+    with pytest.raises(KeyError):
+        languages['x']
+    with pytest.raises(KeyError):
+        languages.id('Klingon')
+
+    assert len(Categories.default().ids('shopping')) == 2
+    assert Countries.default().search('united kingdom') == {'GBR': 'United Kingdom'}
+
+
+def test_countries_are_case_insensitive():
+    countries = Countries.default()
+    assert countries['deu'] == countries['DEU']
+    assert 'deu' in countries and 3 not in countries
+
+
+def test_immutable():
+    with pytest.raises(AttributeError):
+        Languages.default()._by_id = {}
+
+
+def test_dump_and_load(tmp_path):
+    path = str(tmp_path / 'countries.json')
+    Countries.default().dump(path)
+    assert dict(Countries.load(path)) == dict(Countries.default())
+
+
+def test_refresh(client):
+    try:
+        table = Languages.refresh(client)
+        assert Languages.default() is table
+        assert table == Languages(client.languages())
+    finally:
+        Languages.set_default(None)
+
+
+def test_create_campaign_sends_upper_case_country(server, client, monkeypatch):
+    bodies = []
+    respond = server.respond
+    monkeypatch.setattr(server, 'respond', lambda body: bodies.append(body) or respond(body))
+
+    client.create_campaign('name', 'subject', 'Example', 'news@example.com', 'reply@example.com', '<p>Hi</p>', 'Hi',
+                           template_id=1, country='deu')
+    assert b'<item xsi:type="xsd:str">DEU</item>' in bodies[-1]
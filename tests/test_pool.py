@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from pydoctorsender import DoctorSenderPool
+from pydoctorsender.errors import DrsReturnError
+
+
+@pytest.fixture
+def pool(server):
+    accounts = {'shop_de': ('de@example.com', 'token'), 'shop_fr': ('fr@example.com', 'token')}
+    with DoctorSenderPool(accounts, max_workers=2, per_account_limit=1, url=server.url) as pool:
+        yield pool
+
+
+def test_fan_out(pool):
+    assert pool.fan_out('segment_count', {'shop_de': [1, 2], 'shop_fr': [3]}) == {
+        'shop_de': {1: 123456, 2: 123456}, 'shop_fr': {3: 123456}}
+    assert pool.fan_out('segment_count', [7], accounts=['shop_fr']) == {'shop_fr': {7: 123456}}
+    assert set(pool.fan_out('lists')) == {'shop_de', 'shop_fr'}
+
+
+def test_fan_out_unhashable_argument(pool):
+    with pytest.raises(TypeError):
+        pool.fan_out('campaigns', [[1, 2]])
+
+
+def test_fan_out_errors(pool, server, monkeypatch):
+    def fail(*args, **kwargs):
+        raise DrsReturnError('boom')
+
+    monkeypatch.setattr(pool['shop_fr'], 'segment_count', fail)
+    results = pool.fan_out('segment_count', [1], return_exceptions=True)
+    assert results['shop_de'] == {1: 123456}
+    assert isinstance(results['shop_fr'][1], DrsReturnError)
+    with pytest.raises(DrsReturnError):
+        pool.fan_out('segment_count', [1])
+
+
+def test_busy_account_does_not_block_workers(pool, server):
+    server.latency = 0.1
+    busy = [pool.submit('shop_de', 'segment_count', i) for i in range(4)]
+    start = time.perf_counter()
+    pool.submit('shop_fr', 'segment_count', 1).result()
+
+    # The waiting calls of shop_de don't hold the second worker, shop_fr gets it right away
+    assert time.perf_counter() - start < 0.25
+    assert [future.result() for future in busy] == [123456] * 4
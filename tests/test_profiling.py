@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from pydoctorsender import DoctorSenderClient
+from pydoctorsender.hedging import HedgingPolicy
+from pydoctorsender.profiling import Profiler
+
+
+def profiled(server, profiler, **kwargs):
+    return DoctorSenderClient('user@example.com', 'token', url=server.url, profiler=profiler, **kwargs)
+
+
+def stages(profiler):
+    return [(method, stage) for method, stage, _, _, _ in profiler.records]
+
+
+def test_sampled_call(server, tmp_path):
+    profiler = Profiler(str(tmp_path), sample_rate=1.0, methods=['dsUsersListGetAll'])
+    profiled(server, profiler).lists()
+    assert stages(profiler) == [('dsUsersListGetAll', 'build'), ('dsUsersListGetAll', 'network'),
+                                ('dsUsersListGetAll', 'parse')]
+    for _, _, seconds, peak, files in profiler.records:
+        assert seconds > 0 and peak > 0
+        assert sorted(os.path.splitext(f)[1] for f in files) == ['.mem', '.prof']
+        assert all(os.path.exists(f) for f in files)
+    summary = profiler.report()['dsUsersListGetAll']['parse']
+    assert summary['calls'] == 1 and summary['top']
+    assert profiler.stats('dsUsersListGetAll', 'parse') is not None
+    assert profiler.stats('dsCampaignGet', 'parse') is None
+
+
+def test_nothing_captured_without_triggers(server, tmp_path):
+    profiler = Profiler(str(tmp_path))
+    assert profiler.call('dsUsersListGetAll') is None
+    profiled(server, profiler).lists()
+    assert profiler.records == []
+
+
+def test_size_threshold_captures_parse(server, tmp_path):
+    profiler = Profiler(str(tmp_path), size_threshold=1, cpu=False)
+    profiled(server, profiler, validate=False).lists()
+    assert stages(profiler) == [('dsUsersListGetAll', 'parse')]
+    assert profiler.report()['dsUsersListGetAll']['parse']['top'] == []
+
+
+def test_latency_threshold_arms_next_call(server, tmp_path):
+    profiler = Profiler(str(tmp_path), latency_threshold=0.05, memory=False)
+    client = profiled(server, profiler, validate=False)
+    server.latency = 0.1
+    client.lists()
+    assert profiler.records == []
+    server.latency = 0.0
+    client.lists()
+    assert stages(profiler) == [('dsUsersListGetAll', 'build'), ('dsUsersListGetAll', 'network'),
+                                ('dsUsersListGetAll', 'parse')]
+    assert profiler.report()['dsUsersListGetAll']['parse']['peak_memory'] is None
+    client.lists()
+    assert len(profiler.records) == 3
+
+
+def test_max_calls(server, tmp_path):
+    profiler = Profiler(str(tmp_path), sample_rate=1.0, max_calls=1, memory=False)
+    client = profiled(server, profiler, validate=False)
+    client.lists()
+    client.lists()
+    assert len(profiler.records) == 3
+
+
+def test_profile_own_code(tmp_path):
+    profiler = Profiler(str(tmp_path), memory=False)
+    with profiler.profile('dsCampaignGetAll'):
+        sorted(range(10000), key=lambda i: -i)
+    assert stages(profiler) == [('dsCampaignGetAll', 'process')]
+    assert profiler.report()['dsCampaignGetAll']['process']['top']
+
+
+def test_hedged_call_network_stage_waits_for_the_first_response(server, tmp_path):
+    server.slow_every = 1
+    server.slow_latency = 0.3
+    profiler = Profiler(str(tmp_path), sample_rate=1.0, methods=['dsGetSegmentCount'], cpu=False, memory=False)
+    hedging = HedgingPolicy(budget=1.0, min_samples=1000, initial_delay=0.2)
+    client = profiled(server, profiler, validate=False, hedging=hedging)
+    client.segment_count(1)
+    network = [seconds for _, stage, seconds, _, _ in profiler.records if stage == 'network']
+    # The hedge is sent after 0.2s and is slow as well, the first request answers first (the hedge would take 0.5s)
+    assert network == [pytest.approx(0.3, abs=0.1)]
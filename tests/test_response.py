@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from pydoctorsender import DoctorSenderClient
+from pydoctorsender.errors import DrsReturnError
+from pydoctorsender.response import DrsResponse, decode
+
+FAULT = (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+         b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"><SOAP-ENV:Body><SOAP-ENV:Fault>'
+         b'<faultcode>SOAP-ENV:Server</faultcode><faultstring>Invalid token</faultstring>'
+         b'</SOAP-ENV:Fault></SOAP-ENV:Body></SOAP-ENV:Envelope>')
+
+
+@pytest.fixture(scope='module')
+def parse_executor():
+    with ProcessPoolExecutor(1) as executor:
+        yield executor
+
+
+def test_decode_returns_content_and_error(client):
+    xml = client._post_request('dsGetSegmentCount', '<item xsi:type="xsd:int">1</item>').xml
+    assert decode(xml) == ('123456', None)
+
+    content, error = decode(FAULT)
+    assert content is None and isinstance(error, DrsReturnError)
+
+
+@pytest.mark.parametrize('campaigns', [0, 1, 3])
+def test_list_campaigns(server, client, parse_executor, campaigns):
+    server.configure(campaigns=campaigns)
+    inline = client.list_campaigns('id > 0', ['name', 'subject'])
+    pooled = DoctorSenderClient('user@example.com', 'token', url=server.url, parse_executor=parse_executor,
+                                parse_threshold=0).list_campaigns('id > 0', ['name', 'subject'])
+    assert pooled == inline
+    assert [campaign['id'] for campaign in inline] == [str(i) for i in range(1, campaigns + 1)]
+    if campaigns:
+        assert inline[0]['name'] == 'Campaign 1 - weekly newsletter'
+
+
+def test_decoded_response_keeps_no_dict(server, parse_executor):
+    client = DoctorSenderClient('user@example.com', 'token', url=server.url, parse_executor=parse_executor,
+                                parse_threshold=0)
+    response = client._post_request('dsGetSegmentCount', '<item xsi:type="xsd:int">1</item>')
+    assert response.dict is None
+    assert response.content == '123456'
+
+    response = DrsResponse(type('Response', (), {'content': FAULT}), decoded=decode(FAULT))
+    with pytest.raises(DrsReturnError):
+        response.content
@@ -0,0 +1,117 @@
+import datetime as dt
+import os
+import time
+
+import pytest
+
+from pydoctorsender.errors import DrsScheduleError
+from pydoctorsender.scheduler import PendingSend, SendScheduler
+
+MORNING = dt.datetime(2030, 1, 7, 8)
+
+
+@pytest.fixture
+def scheduler(client):
+    return SendScheduler(client, capacity={'default': 200})
+
+
+@pytest.fixture
+def utc_host():
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = 'UTC'
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+
+def _send(campaign_id, hours, audience, **kwargs):
+    return PendingSend(campaign_id, 'example_list', start=MORNING, deadline=MORNING + dt.timedelta(hours=hours),
+                       audience=audience, **kwargs)
+
+
+def test_lowest_speed_meeting_the_deadline(scheduler):
+    scheduled, = scheduler.plan([_send(1, 2, 720000)])
+
+    assert scheduled.speed == 100
+    assert scheduled.dates == [MORNING]
+    assert scheduled.finish <= MORNING + dt.timedelta(hours=2)
+
+
+def test_sends_share_the_capacity(scheduler):
+    plan = scheduler.plan([_send(1, 4, 1000000), _send(2, 2, 1000000)])
+
+    # Earliest deadline first
+    assert [scheduled.campaign_id for scheduled in plan] == [2, 1]
+    assert all(scheduled.finish <= scheduled.send.deadline for scheduled in plan)
+    assert scheduler.free('default', MORNING) >= 0
+    assert scheduler.free('default', MORNING + dt.timedelta(hours=3)) >= 0
+
+
+def test_multidate_split_around_reserved_capacity(scheduler):
+    scheduler.reserve('default', MORNING + dt.timedelta(hours=1), MORNING + dt.timedelta(hours=2), 190)
+    scheduler.reserve('default', MORNING + dt.timedelta(hours=3), MORNING + dt.timedelta(hours=4), 190)
+
+    scheduled, = scheduler.plan([_send(1, 4, 1300000)])
+
+    assert scheduled.dates == [MORNING, MORNING + dt.timedelta(hours=2)]
+    assert scheduled.kwargs()['multidate'] == scheduled.dates
+
+
+def test_dates_are_in_the_time_zone_of_the_send(client, utc_host):
+    scheduler = SendScheduler(client, capacity={'default': 200})
+    madrid, = scheduler.plan([_send(1, 2, 1000)])
+    new_york, = scheduler.plan([_send(2, 2, 1000, time_zone='America/New_York')])
+
+    assert madrid.dates == [MORNING] and madrid.kwargs()['time_zone'] == 'Europe/Madrid'
+    assert new_york.dates == [MORNING] and new_york.kwargs()['time_zone'] == 'America/New_York'
+    # 08:00 in Madrid and 08:00 in New York are 6 hours apart, they don't share capacity
+    assert scheduler.free('default', MORNING) == 200 - madrid.speed
+    assert scheduler.free('default', MORNING, time_zone='America/New_York') == 200 - new_york.speed
+
+
+def test_failed_plan_releases_capacity(scheduler):
+    with pytest.raises(DrsScheduleError):
+        scheduler.plan([_send(1, 2, 1000000), _send(2, 3, 2000000)])
+    assert scheduler.free('default', MORNING) == 200
+
+    plan = scheduler.plan([_send(1, 2, 1000000), _send(2, 3, 2000000)], return_exceptions=True)
+    assert isinstance(plan[1], DrsScheduleError)
+    scheduler.release(plan[0])
+    assert scheduler.free('default', MORNING) == 200
+
+
+def test_apply_calls_send_campaign_list(scheduler, server):
+    plan = scheduler.plan([_send(1, 2, None, segment_id=5)])
+
+    assert plan[0].send.audience == 123456
+    assert scheduler.apply(plan) == [True]
+    assert server.calls['dsCampaignSendList'] == 1
+
+
+def test_default_deadline_is_not_written_to_the_send(scheduler):
+    send = PendingSend(1, 'example_list', audience=1000)
+    scheduled, = scheduler.plan([send])
+    assert send.deadline is None
+    assert scheduled.finish < dt.datetime.now() + dt.timedelta(days=2)
+
+
+def test_failed_sends_release_their_capacity(scheduler, monkeypatch):
+    send_campaign_list = scheduler.client.send_campaign_list
+
+    def failing(**kwargs):
+        if kwargs['campaign_id'] == 1:
+            raise ValueError('boom')
+        return send_campaign_list(**kwargs)
+
+    monkeypatch.setattr(scheduler.client, 'send_campaign_list', failing)
+    # 50 emails per second each, over the two hours
+    plan = scheduler.plan([_send(1, 2, 360000), _send(2, 2, 360000)])
+    assert scheduler.free('default', MORNING) == 100
+    results = scheduler.apply(plan, return_exceptions=True)
+    assert isinstance(results[0], ValueError) and results[1] is True
+    # Only the capacity of the programmed send stays reserved
+    assert scheduler.free('default', MORNING) == 150
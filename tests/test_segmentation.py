@@ -0,0 +1,69 @@
+import warnings
+
+import pytest
+
+from pydoctorsender.errors import DrsSegmentError
+from pydoctorsender.segmentation import check_condition
+
+FIELDS = {'email': 'varchar(255)', 'age': 'int', 'birthday': 'date'}
+
+
+@pytest.mark.parametrize('condition', [
+    ('email', '~', 'x', False),
+    ('country', '==', 'DEU', False),
+    ('email', '==', 'a@example.com', False),
+    ('birthday', '==', '2020-01-01', False),
+    ('age', '==', 30, True),
+    ('age', 'like', '3%', False),
+    ('email', '<', 'b', False),
+    ('age', 'in', '18,x', False),
+])
+def test_rejected_conditions(condition):
+    field_name, comparator, value, is_date = condition
+    with pytest.raises(DrsSegmentError):
+        check_condition(FIELDS, {'email': ('like', '%@example.com')}, field_name, comparator, value, is_date)
+
+
+@pytest.mark.parametrize('condition', [
+    ('email', 'like', '%@example.com', False),
+    ('age', 'in', '18,19', False),
+    ('age', '>=', 18, False),
+    ('birthday', '<', '2000-01-01', True),
+    ('anything', 'segment', 12, False),
+])
+def test_accepted_conditions(condition):
+    field_name, comparator, value, is_date = condition
+    check_condition(FIELDS, {}, field_name, comparator, value, is_date)
+
+
+def test_created_segment(client):
+    segment_id = client.create_segment('example_list', 'Germany')
+    assert client.segment_validator.conditions(segment_id) == {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        client.segment_add_condition(segment_id, 'field_1', '>', 3)
+    with pytest.raises(DrsSegmentError):
+        client.segment_add_condition(segment_id, 'field_1', '<', 10)
+    with pytest.raises(DrsSegmentError):
+        client.segment_add_condition(segment_id, 'missing', '==', 'x')
+
+    client.segment_del_condition(segment_id, 'field_1')
+    client.segment_add_condition(segment_id, 'field_1', '<', 10)
+    assert client.segment_validator.conditions(segment_id) == {'field_1': ('<', 10)}
+
+
+def test_segment_of_list_name_has_unknown_conditions(client):
+    with pytest.warns(UserWarning, match='earlier conditions are unknown'):
+        client.segment_add_condition(4711, 'field_1', '>', 3, list_name='example_list')
+    assert client.segment_validator.conditions(4711) is None
+    # Conditions added through the client are still known
+    with pytest.raises(DrsSegmentError):
+        client.segment_add_condition(4711, 'field_1', '<', 10)
+    with pytest.raises(DrsSegmentError):
+        client.segment_add_condition(4711, 'field_2', '==', '2020-01-01')
+
+
+def test_unknown_segment_checks_comparator_only(client):
+    client.segment_add_condition(4712, 'missing', '==', 'x')
+    with pytest.raises(DrsSegmentError):
+        client.segment_add_condition(4712, 'missing', '~', 'x')
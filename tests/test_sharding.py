@@ -0,0 +1,51 @@
+import pytest
+
+from pydoctorsender.jobs import FAILED, PENDING, RUNNING, JobQueue
+from pydoctorsender.sharding import ShardedRunner
+
+
+@pytest.fixture
+def runner(server, tmp_path):
+    return ShardedRunner('user@example.com', 'token', processes=2, threads=2, path=str(tmp_path / 'jobs.sqlite'),
+                         url=server.url)
+
+
+def _ids(results):
+    return [[int(campaign_id) for campaign_id in result] for result in results]
+
+
+def test_map_keeps_order(runner):
+    assert _ids(runner.map('campaigns', [[3], [1], [2]])) == [[3], [1], [2]]
+
+
+def test_resume_only_runs_what_is_left(runner, server):
+    runner.map('campaigns', [[1], [2]])
+    server.calls.clear()
+
+    assert _ids(runner.map('campaigns', [[1], [2], [3]])) == [[1], [2], [3]]
+    assert server.calls == {'dsCampaignGetAll': 1}
+
+
+def test_different_work_list_on_same_path(runner):
+    runner.map('campaigns', [[1], [2]])
+
+    # Same positions, different arguments: nothing of the earlier run may be returned
+    assert _ids(runner.map('campaigns', [[3], [4]])) == [[3], [4]]
+    assert _ids(runner.map('campaigns', [[1]], get_statistics=False)) == [[1]]
+
+
+def test_other_work_lists_are_left_alone(runner, server):
+    runner.map('campaigns', [[1]])
+    with JobQueue(runner.path) as queue:
+        # Jobs of another work list: one still pending, one failed and one cut off by a crash
+        queue.add('other:pending', 'campaigns', [5])
+        for key, status in (('other:failed', FAILED), ('other:running', RUNNING)):
+            queue.add(key, 'campaigns', [6])
+            queue._set(key, status)
+    server.calls.clear()
+
+    assert _ids(runner.map('campaigns', [[2], [3]])) == [[2], [3]]
+    assert server.calls == {'dsCampaignGetAll': 2}
+    with JobQueue(runner.path) as queue:
+        statuses = dict(queue._db.execute("SELECT key, status FROM jobs WHERE key LIKE 'other:%'"))
+    assert statuses == {'other:pending': PENDING, 'other:failed': FAILED, 'other:running': RUNNING}
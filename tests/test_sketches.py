@@ -0,0 +1,72 @@
+import pytest
+
+from pydoctorsender.sketches import AudienceSketch, SketchStore
+
+
+def emails(start, stop):
+    return [f'user{i}@example.com' for i in range(start, stop)]
+
+
+def test_small_sets_are_exact():
+    sketch = AudienceSketch.from_emails(emails(0, 100) + ['USER1@example.com ', 'user2@example.com'])
+    assert sketch.cardinality() == 100
+    other = AudienceSketch.from_emails(emails(50, 120))
+    assert sketch.overlap(other) == 50
+    assert sketch.jaccard(other) == pytest.approx(50 / 120)
+    assert AudienceSketch.from_emails([]).cardinality() == 0
+
+
+def test_estimates():
+    a = AudienceSketch.from_emails(emails(0, 60000))
+    b = AudienceSketch.from_emails(emails(40000, 100000))
+    assert a.cardinality() == pytest.approx(60000, rel=0.05)
+    assert a.union(b).cardinality() == pytest.approx(100000, rel=0.05)
+    # 1 / sqrt(256) is the standard error of the Jaccard estimate, three of them are enough to never flake
+    assert a.jaccard(b) == pytest.approx(0.2, abs=3 / 16)
+    assert a.overlap(b) == pytest.approx(20000, rel=0.5)
+    assert a.overlap(AudienceSketch.from_emails(emails(200000, 260000))) < 2000
+
+
+def test_store_round_trip(tmp_path):
+    store = SketchStore(p=10, k=64)
+    store.add(1, emails(0, 10))
+    store.add(2, emails(0, 5000))
+    path = str(tmp_path / 'sketches.bin')
+    store.save(path)
+    loaded = SketchStore.load(path)
+    assert (loaded.p, loaded.k, len(loaded)) == (10, 64, 2)
+    for campaign_id in (1, 2):
+        assert loaded[campaign_id].to_bytes() == store[campaign_id].to_bytes()
+        assert loaded[campaign_id].cardinality() == store[campaign_id].cardinality()
+
+
+def test_not_a_sketch_file(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'something else')
+    with pytest.raises(ValueError):
+        SketchStore.load(str(path))
+
+
+def test_suggest_exclusions():
+    store = SketchStore()
+    store.add(1, emails(0, 100))
+    store.add(2, emails(0, 30))
+    store.add(3, emails(1000, 1100))
+    store.add(4, emails(99, 101))
+    audience = AudienceSketch.from_emails(emails(0, 200))
+    assert store.overlaps(audience) == {1: 100, 2: 30, 3: 0, 4: 2}
+    assert store.suggest_exclusions(audience, min_share=0.05) == [1, 2]
+    assert store.suggest_exclusions(audience, min_share=0.0, max_campaigns=3) == [1, 2, 4]
+    assert store.suggest_exclusions(audience, campaign_ids=[2, 3]) == [2]
+
+
+def test_fetch(server, client):
+    server.configure(user_statistics=300)
+    store = SketchStore()
+    store.fetch(client, [1, '2'])
+    assert server.calls['dsCampaignGetUserStatistics'] == 2
+    assert store[1].cardinality() == pytest.approx(300, rel=0.1)
+    assert store[1].jaccard(store[2]) == 1.0
+    # Audiences don't change after the send, campaigns in the store are not fetched again
+    store.fetch(client, [1, 2, 3])
+    assert server.calls['dsCampaignGetUserStatistics'] == 3
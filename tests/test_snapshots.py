@@ -0,0 +1,39 @@
+import pytest
+
+from pydoctorsender.snapshots import ADDED, MODIFIED, REMOVED, ListSnapshot, diff
+
+
+def snapshot(tmp_path, name, lines, **kwargs):
+    return ListSnapshot.create(lines, str(tmp_path / name), **kwargs)
+
+
+@pytest.mark.parametrize('run_size', [1, 2, 1000])
+def test_first_row_wins(tmp_path, run_size):
+    lines = ['email,name', 'b@example.com,Bea', 'a@example.com,Ann', 'B@example.com,Other', 'b@example.com,Third']
+    duplicates = snapshot(tmp_path, 'duplicates.snap', lines, run_size=run_size)
+    first = snapshot(tmp_path, 'first.snap', lines[:3])
+    assert list(duplicates) == list(first)
+    assert [email for email, _ in duplicates] == ['a@example.com', 'b@example.com']
+
+
+@pytest.mark.parametrize('run_size', [1, 1000])
+def test_diff(tmp_path, run_size):
+    old = snapshot(tmp_path, 'old.snap', ['email;name', 'a@example.com;Ann', 'b@example.com;Bea', 'c@example.com;Cy'],
+                   run_size=run_size)
+    new = snapshot(tmp_path, 'new.snap', ['email;name', 'd@example.com;Dee', 'b@example.com;Bee', 'a@example.com;Ann'],
+                   run_size=run_size)
+    assert list(diff(old, new.path)) == [(MODIFIED, 'b@example.com'), (REMOVED, 'c@example.com'),
+                                         (ADDED, 'd@example.com')]
+
+
+def test_column_order_does_not_modify(tmp_path):
+    old = snapshot(tmp_path, 'old.snap', ['email,name,city', 'a@example.com,Ann,Berlin'])
+    new = snapshot(tmp_path, 'new.snap', ['city,email,name', 'Berlin,a@example.com,Ann'])
+    assert list(diff(old, new)) == []
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'something else')
+    with pytest.raises(ValueError):
+        list(ListSnapshot(str(path)))
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from pydoctorsender import DoctorSenderClient
+from pydoctorsender.watcher import CampaignWatcher
+
+
+class Client:
+    """Stands in for DoctorSenderClient, campaigns() answers from a dict the test changes"""
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.batches = []
+
+    def campaigns(self, campaign_ids, **kwargs):
+        self.batches.append(list(campaign_ids))
+        return {campaign_id: dict(self.data[campaign_id]) for campaign_id in campaign_ids
+                if campaign_id in self.data}
+
+
+@pytest.fixture
+def client():
+    return Client({1: {'status': 'sending', 'amount': '1000', 'deliveries': '0'},
+                   2: {'status': 'finished', 'amount': '50', 'deliveries': '50'}})
+
+
+def test_changes(client):
+    seen = []
+    watcher = CampaignWatcher(client, on_change=seen.append, min_interval=0, batch_size=2)
+    watcher.watch([1, 2, 3])
+    changes = watcher.poll_once()
+    assert seen == changes
+    assert client.batches == [[1, 2], [3]] and watcher.calls == 2
+    assert [(c.campaign_id, c.finished) for c in changes] == [(1, False), (2, True)]
+    assert changes[0].changes['status'] == (None, 'sending')
+    # Finished campaigns are no longer watched, missing ones are until they report a final status
+    assert len(watcher) == 2
+    watcher.unwatch([3])
+
+    assert watcher.poll_once() == []
+    client.data[1].update(status='finished', deliveries='1000')
+    change, = watcher.poll_once()
+    assert change.finished and change.changes == {'status': ('sending', 'finished'),
+                                                   'deliveries': ('0', '1000')}
+    assert watcher.next_poll_in() is None
+
+
+def test_intervals(client):
+    watcher = CampaignWatcher(client, min_interval=10, max_interval=900, backoff=2)
+    watcher.watch([1])
+    campaign = client.data[1]
+    watcher._update(1, campaign, 0.0)
+    # Changed (first poll), the interval shrinks down to min_interval
+    assert watcher.interval(1) == 10
+    watcher._update(1, campaign, 10.0)
+    watcher._update(1, campaign, 30.0)
+    assert watcher.interval(1) == 40
+    # Sending at 1 delivery per second, 900 to go: polled again halfway, in 450 seconds
+    watcher._update(1, dict(campaign, deliveries='100'), 130.0)
+    assert watcher.interval(1) == 450
+    watcher._update(1, dict(campaign, deliveries='100'), 580.0)
+    watcher._update(1, dict(campaign, deliveries='100'), 1480.0)
+    assert watcher.interval(1) == 900
+
+
+def test_missing_campaign_is_watched_until_final_status(client):
+    watcher = CampaignWatcher(client, min_interval=10, max_interval=900, backoff=2)
+    watcher.watch([3])
+    assert watcher.poll_once() == []
+    assert len(watcher) == 1 and watcher.interval(3) == 20
+    client.data[3] = {'status': 'cancelled', 'amount': '10', 'deliveries': '0'}
+    watcher._campaigns[3].next_poll = 0.0
+    change, = watcher.poll_once()
+    assert change.finished and len(watcher) == 0
+
+
+class FlakyClient(Client):
+    def __init__(self, data: dict, failures: int):
+        super().__init__(data)
+        self.failures = failures
+
+    def campaigns(self, campaign_ids, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Doctorsender unreachable')
+        return super().campaigns(campaign_ids, **kwargs)
+
+
+def test_failed_polls_back_off(client, caplog):
+    flaky = FlakyClient(client.data, failures=2)
+    watcher = CampaignWatcher(flaky, min_interval=0.01, backoff=2)
+    watcher.watch([1, 2])
+    assert watcher.poll_once() == []
+    assert watcher.errors == 1 and watcher.interval(1) == 0.02 and len(watcher) == 2
+    assert 'Polling 2 campaigns failed' in caplog.text
+    client.data[1]['status'] = 'finished'
+    # The watcher keeps running through the second failure
+    watcher.run()
+    assert (watcher.errors, watcher.calls, len(watcher)) == (2, 1, 0)
+
+
+def test_run(client):
+    watcher = CampaignWatcher(client, min_interval=0.01)
+    client.data[1]['status'] = 'finished'
+    watcher.watch([1, 2])
+    watcher.run()
+    assert len(watcher) == 0 and watcher.calls == 1
+
+
+def test_async_changes(client):
+    async def collect():
+        watcher = CampaignWatcher(client, min_interval=0.01)
+        watcher.watch([1, 2])
+        changes = []
+        async for change in watcher.changes():
+            changes.append(change.campaign_id)
+            client.data[1]['status'] = 'cancelled'
+        return changes
+
+    assert sorted(asyncio.run(collect())) == [1, 1, 2]
+
+
+def test_stub_server(server):
+    watcher = CampaignWatcher(DoctorSenderClient('user@example.com', 'token', url=server.url))
+    watcher.watch([1, 2, 3])
+    assert {c.campaign_id for c in watcher.poll_once() if c.finished} == {1, 2, 3}